@@ -0,0 +1,1869 @@
+"""
+MODULE: space_switch_backend
+
+Scene backends of the switch pipeline. space_switch_engine only talks to the
+scene through the maya.cmds commands listed in COMMANDS, called with the same
+flags and returning the same values, so any object providing them can stand
+in for maya.cmds:
+
+    maya: maya.cmds and OpenMaya 2.0, the real scene.
+    memory: a MemoryScene, an in-memory scene of transforms, anim curves,
+            constraints and two-bone ik chains, so the pipeline runs and can
+            be benchmarked without Maya, e.g.
+
+        scene = switch_backend.use_memory()
+        ctl = scene.group(empty=True, name="arm_ctl")
+        scene.setKeyframe(ctl, attribute="translateX", time=1, value=2.0)
+        engine.execute_plans(jobs)
+
+A MemoryScene opens and saves its own scenes, JSON files of its state, with
+cmds.file. It cannot open Maya scene files.
+
+The engine skips its OpenMaya fast paths when running on a backend without
+the API: preset nodes are found with cmds.ls, matrices are sampled with
+cmds.getAttr(time=), and the MatrixCache is told about changes by the
+backend's add_change_callback if it has one instead of OpenMaya messages.
+
+The engine is only imported once a backend is set, so a backend can be picked
+before maya.standalone is initialized.
+
+FUNCTIONS:
+    check_backend: lists the commands a backend is missing.
+    get_backend: backend the engine currently runs on.
+    set_backend: makes the engine run on a backend.
+    use_maya: makes the engine run on maya.cmds.
+    use_memory: makes the engine run on a MemoryScene.
+
+CLASSES:
+    MemoryScene: in-memory stand-in for maya.cmds.
+"""
+
+__author__ = "Te Ling (Danny) Hsu"
+__copyright__ = "Copyright (c) 2020 Te Ling (Danny) Hsu"
+__license__ = "MIT License"
+__version__ = "1.0.0"
+
+import copy
+import json
+import math
+import uuid
+import bisect
+import logging
+import operator
+
+import space_switch_math as switch_math
+
+
+LOGGER = logging.getLogger(__name__)
+
+try:
+    STRING_TYPES = (basestring,)
+except NameError: # python 3
+    STRING_TYPES = (str,)
+
+MAYA_BACKEND = "maya"
+MEMORY_BACKEND = "memory"
+BACKENDS = (MAYA_BACKEND, MEMORY_BACKEND)
+
+# marks the files written by MemoryScene.file(save=True)
+MEMORY_SCENE = "memory scene"
+
+# maya.cmds commands called by space_switch_engine
+COMMANDS = ("about", "attributeQuery", "autoKeyframe", "bakeResults",
+            "currentTime", "delete", "evaluationManager", "getAttr",
+            "keyframe", "listConnections", "ls", "objExists", "ogs",
+            "parentConstraint", "refresh", "setAttr", "setKeyframe",
+            "spaceLocator", "xform")
+
+IDENTITY = [1.0, 0.0, 0.0, 0.0,
+            0.0, 1.0, 0.0, 0.0,
+            0.0, 0.0, 1.0, 0.0,
+            0.0, 0.0, 0.0, 1.0]
+
+# compound attributes of the memory scene and their children
+COMPOUNDS = dict((attr, tuple(attr + axis for axis in "XYZ")) for attr in (
+    "translate", "rotate", "scale", "rotateAxis", "jointOrient",
+    "rotatePivot", "rotatePivotTranslate", "scalePivot",
+    "scalePivotTranslate"
+))
+COMPOUNDS["shear"] = ("shearXY", "shearXZ", "shearYZ")
+
+# short attribute names accepted by the memory scene
+ALIASES = {"t": "translate", "r": "rotate", "s": "scale", "ro": "rotateOrder",
+           "v": "visibility", "ktv": "keyTimeValue"}
+ALIASES.update(("{}{}".format(short, axis), "{}{}".format(attr, axis.upper()))
+               for short, attr in (("t", "translate"), ("r", "rotate"),
+                                   ("s", "scale"))
+               for axis in "xyz")
+
+KEYABLE_CHANNELS = (COMPOUNDS["translate"] + COMPOUNDS["rotate"]
+                    + COMPOUNDS["scale"] + ("visibility",))
+
+_TRANSFORM_TYPES = ("transform", "joint", "ikHandle", "ikEffector")
+_CONSTRAINT_TYPES = ("parentConstraint", "pointConstraint",
+                     "orientConstraint", "poleVectorConstraint")
+_MATRIX_ATTRS = ("matrix", "inverseMatrix", "worldMatrix",
+                 "worldInverseMatrix", "parentMatrix", "parentInverseMatrix")
+_MULTI_ATTRS = ("worldMatrix", "worldInverseMatrix", "parentMatrix",
+                "parentInverseMatrix")
+_CONSTRAINT_OUTPUTS = ("constraintTranslateX", "constraintTranslateY",
+                       "constraintTranslateZ", "constraintRotateX",
+                       "constraintRotateY", "constraintRotateZ")
+_POLE_VECTOR = ("poleVectorX", "poleVectorY", "poleVectorZ")
+
+# default attributes and read-only outputs of the utility nodes
+_UTILITY_ATTRS = {
+    "condition": {"firstTerm": 0.0, "secondTerm": 0.0, "operation": 0,
+                  "colorIfTrueR": 0.0, "colorIfTrueG": 0.0,
+                  "colorIfTrueB": 0.0, "colorIfFalseR": 1.0,
+                  "colorIfFalseG": 1.0, "colorIfFalseB": 1.0},
+    "reverse": {"inputX": 0.0, "inputY": 0.0, "inputZ": 0.0},
+    "time": {}
+}
+_UTILITY_OUTPUTS = {"condition": ("outColorR", "outColorG", "outColorB"),
+                    "reverse": ("outputX", "outputY", "outputZ"),
+                    "time": ("outTime",)}
+
+# operations of the condition node, in the order of its enum
+_CONDITIONS = (operator.eq, operator.ne, operator.gt, operator.ge,
+               operator.lt, operator.le)
+
+# scene state saved for undo, see MemoryScene.undoInfo
+_SCENE_STATE = ("_nodes", "_uuids", "_inputs", "_overrides", "_time",
+                "_playback", "_selection")
+
+
+def _flatten(objects):
+    """Returns the names found in nested lists of names.
+    """
+    names = []
+    for obj in objects:
+        if isinstance(obj, STRING_TYPES):
+            names.append(obj)
+        elif obj is not None:
+            names.extend(_flatten(obj))
+
+    return names
+
+
+def _is_curve(node_type):
+    """Checks if a node type is an anim curve.
+    """
+    return node_type.startswith("animCurve")
+
+
+def _subtract(a, b):
+    """Returns the vector from b to a.
+    """
+    return [value - other for value, other in zip(a, b)]
+
+
+def _cross(a, b):
+    """Returns the cross product of two vectors.
+    """
+    return [a[1] * b[2] - a[2] * b[1],
+            a[2] * b[0] - a[0] * b[2],
+            a[0] * b[1] - a[1] * b[0]]
+
+
+def _normalize(vector):
+    """Returns a vector scaled to a length of 1, None if it has no length.
+    """
+    length = math.sqrt(sum(value * value for value in vector))
+    if length < switch_math.EPSILON:
+        return None
+
+    return [value / length for value in vector]
+
+
+def _transform_vector(vector, matrix):
+    """Returns a direction multiplied by the 3x3 part of a matrix.
+    """
+    return [sum(vector[row] * matrix[row * 4 + col] for row in range(3))
+            for col in range(3)]
+
+
+def _frame_rows(axes, vectors):
+    """Returns the three axes, as rows, of a frame whose axes of the given
+    indices point along the given vectors. The second vector is made
+    perpendicular to the first one, the last axis completes a right-handed
+    frame.
+    """
+    first, second = axes
+    rows = [None] * 3
+    rows[first] = _normalize(vectors[0])
+    side = [value - other * sum(a * b for a, b in zip(vectors[1],
+                                                       rows[first]))
+            for value, other in zip(vectors[1], rows[first])]
+    rows[second] = _normalize(side)
+    if (second - first) % 3 == 1:
+        rows[3 - first - second] = _cross(rows[first], rows[second])
+    else:
+        rows[3 - first - second] = _cross(rows[second], rows[first])
+
+    return rows
+
+
+def check_backend(backend):
+    """Lists the commands of COMMANDS a backend does not provide.
+
+    Args:
+        backend (object): maya.cmds or a stand-in.
+
+    Returns:
+        list: names of the missing commands, empty if none is missing.
+    """
+    return [name for name in COMMANDS
+            if not callable(getattr(backend, name, None))]
+
+
+def get_backend():
+    """Returns the backend space_switch_engine currently runs on.
+
+    Returns:
+        object: maya.cmds, a stand-in, or None outside of Maya if none was
+                set.
+    """
+    import space_switch_engine as engine
+
+    return engine.cmds
+
+
+def set_backend(backend, api=None):
+    """Makes space_switch_engine run on the given backend. Everything the
+    engine cached about the previous scene is forgotten. Set the backend
+    before enabling space_switch_profile, which wraps the one it finds.
+
+    Args:
+        backend (object): maya.cmds or a stand-in providing COMMANDS.
+        api (module|None): maya.api.OpenMaya, used by the engine's fast
+                           paths, None if the backend has no API.
+
+    Raises:
+        ValueError: if the backend is missing any command.
+    """
+    import space_switch_engine as engine
+
+    missing = check_backend(backend)
+    if missing:
+        raise ValueError("The backend is missing: {}".format(
+            ", ".join(missing)
+        ))
+
+    engine.clear_caches() # callbacks are removed with the previous api
+    engine.cmds = backend
+    engine.om = api
+
+
+def use_maya():
+    """Makes space_switch_engine run on maya.cmds, the default in Maya.
+
+    Returns:
+        module: maya.cmds.
+
+    Raises:
+        ImportError: outside of Maya.
+    """
+    import maya.cmds as cmds
+    import maya.api.OpenMaya as om
+
+    set_backend(cmds, om)
+
+    return cmds
+
+
+def use_memory(scene=None):
+    """Makes space_switch_engine run on an in-memory scene.
+
+    Args:
+        scene (MemoryScene|None): scene to run on, a new empty one if None
+                                  given.
+
+    Returns:
+        MemoryScene: the scene.
+    """
+    if scene is None:
+        scene = MemoryScene()
+    set_backend(scene)
+
+    return scene
+
+
+class MemoryScene(object):
+    """In-memory stand-in for the subset of maya.cmds used by the switch
+    pipeline and the benchmark rigs, with the same command names, flags and
+    return values.
+
+    The scene holds transforms and joints in a hierarchy, their translate,
+    rotate, scale, rotate order, rotate axis and joint orient, dynamic
+    attributes, anim curves, parent/point/orient constraints blending their
+    targets by weight, condition and reverse nodes, and ik handles posing
+    two-bone chains with an analytic rotate plane solver, blended with the
+    fk pose by ikBlend and aimed by pole vector constraints. Values are
+    pulled through the connections on demand and cached until the scene
+    changes.
+
+    Unlike maya.cmds, it also reports its changes to the functions given to
+    add_change_callback.
+
+    Not modeled: pivots and shear (stored but ignored), scale compensation,
+    other ik solvers, longer chains and the handle's twist, anim layers and
+    tangents. Anim curves are linear, stepped on enum and bool attributes.
+    Only whole undo chunks can be undone.
+    """
+    def __init__(self):
+        """Initializes an empty scene.
+        """
+        self._memo = {} # evaluated values, emptied on every change
+        self._callbacks = {} # {callback id: callable}, see _changed
+        self._last_callback_id = 0
+        self._undo = [] # scene states before each undo chunk
+        self._undo_enabled = True
+        self._chunks = 0
+        self._autokey = False
+        self._evaluation = "parallel"
+        self._paused = False
+        self._reset()
+
+    def _reset(self):
+        """Empties the scene.
+        """
+        self._nodes = {} # {name: node}
+        self._uuids = {} # {uuid: name}
+        self._inputs = {} # {destination plug: source plug}
+        self._overrides = {} # unkeyed values set on animated plugs
+        self._time = 1.0
+        self._playback = [1.0, 120.0]
+        self._selection = []
+        self._scene_name = ""
+        self._changed()
+        self._add_node("time", "time1")
+
+    # nodes and plugs
+
+    def _unique_name(self, name):
+        """Returns the name, or the name with the next free number. A leading
+        colon stands for the root namespace.
+        """
+        name = name.split("|")[-1].lstrip(":")
+        if name not in self._nodes:
+            return name
+
+        base = name.rstrip("0123456789")
+        index = 1
+        while "{}{}".format(base, index) in self._nodes:
+            index += 1
+
+        return "{}{}".format(base, index)
+
+    def _add_node(self, node_type, name=None, parent=None):
+        """Creates a node with its default attributes.
+        """
+        name = self._unique_name(name or "{}1".format(node_type))
+        node = {"type": node_type, "parent": parent,
+                "uuid": str(uuid.uuid4()).upper(), "attrs": {}, "types": {},
+                "keyable": set(), "locked": set()}
+        if node_type in _TRANSFORM_TYPES:
+            compounds = ["translate", "rotate", "scale", "rotateAxis",
+                         "rotatePivot", "rotatePivotTranslate", "scalePivot",
+                         "scalePivotTranslate", "shear"]
+            if node_type == "joint":
+                compounds.append("jointOrient")
+            for compound in compounds:
+                for child in COMPOUNDS[compound]:
+                    node["attrs"][child] = 1.0 if compound == "scale" else 0.0
+            node["attrs"]["rotateOrder"] = 0
+            node["types"]["rotateOrder"] = "enum"
+            node["attrs"]["visibility"] = True
+            node["types"]["visibility"] = "bool"
+            node["keyable"].update(KEYABLE_CHANNELS)
+            if node_type == "ikHandle":
+                node["attrs"]["ikBlend"] = 1.0
+                node["attrs"].update((child, 0.0) for child in _POLE_VECTOR)
+                node["keyable"].update(("ikBlend",) + _POLE_VECTOR)
+                node["chain"] = [] # start, middle and end joints
+                node["normals"] = [] # see ikHandle
+                node["effector"] = None
+        elif node_type in _UTILITY_ATTRS:
+            node["attrs"].update(_UTILITY_ATTRS[node_type])
+            node["types"]["operation"] = "enum"
+        elif _is_curve(node_type):
+            node["times"] = []
+            node["values"] = []
+            node["step"] = False
+        elif node_type in _CONSTRAINT_TYPES:
+            node["targets"] = [] # [target, weight attribute, offset]
+            node["driven"] = None
+            node["displaced"] = {} # {driven plug: anim curve}
+
+        self._nodes[name] = node
+        self._uuids[node["uuid"]] = name
+        self._memo.clear()
+
+        return name
+
+    def _node(self, name):
+        """Returns the name a node is stored under, from any of its paths.
+        """
+        short = name.split("|")[-1]
+        if short not in self._nodes:
+            raise ValueError("No object matches name: {}".format(name))
+
+        return short
+
+    def _is_output(self, node_type, attr):
+        """Checks if an attribute is computed by its node.
+        """
+        if _is_curve(node_type):
+            return attr == "output"
+        if node_type in _CONSTRAINT_TYPES:
+            return attr in _CONSTRAINT_OUTPUTS
+
+        return attr in _UTILITY_OUTPUTS.get(node_type, ())
+
+    def _has_attr(self, name, attr):
+        """Checks if a node has an attribute.
+        """
+        node = self._nodes[name]
+        return (attr in node["attrs"]
+                or (attr in COMPOUNDS and COMPOUNDS[attr][0] in node["attrs"])
+                or self._is_output(node["type"], attr)
+                or (node["type"] in _TRANSFORM_TYPES
+                    and attr in _MATRIX_ATTRS)
+                or (_is_curve(node["type"]) and attr == "keyTimeValue"))
+
+    def _parse(self, plug):
+        """Splits a plug into node, attribute and index string.
+        """
+        node, _, attr = plug.partition(".")
+        name = self._node(node)
+        index = None
+        if attr.endswith("]"):
+            attr, _, index = attr[:-1].partition("[")
+        attr = ALIASES.get(attr, attr)
+        if not attr or not self._has_attr(name, attr):
+            raise ValueError("No object matches name: {}".format(plug))
+
+        return name, attr, index
+
+    def _expand_plugs(self, objects, attribute=None):
+        """Returns the (node, attribute) pairs of plugs and nodes, nodes give
+        their keyable attributes or the given ones.
+        """
+        attributes = None
+        if attribute:
+            attributes = _flatten([attribute])
+
+        pairs = []
+        for obj in _flatten(objects):
+            if "." in obj:
+                name, attr, index = self._parse(obj)
+                attrs = [attr]
+            else:
+                name = self._node(obj)
+                node = self._nodes[name]
+                attrs = attributes or sorted(node["keyable"])
+            for attr in attrs:
+                attr = ALIASES.get(attr, attr)
+                for child in COMPOUNDS.get(attr, (attr,)):
+                    if not self._has_attr(name, child):
+                        raise ValueError("No object matches name: {}.{}"
+                                         .format(name, child))
+                    pairs.append((name, child))
+
+        return pairs
+
+    def _coerce(self, name, attr, value):
+        """Casts a value to the type of its attribute.
+        """
+        attr_type = self._nodes[name]["types"].get(attr)
+        if attr_type in ("enum", "long"):
+            return int(round(value))
+        if attr_type == "bool":
+            return bool(round(value))
+
+        return float(value)
+
+    def _descendants(self, names):
+        """Returns the given nodes and everything parented under them.
+        """
+        children = {}
+        for name, node in self._nodes.items():
+            children.setdefault(node["parent"], []).append(name)
+
+        found = set()
+        pending = list(names)
+        while pending:
+            name = pending.pop()
+            if name not in found:
+                found.add(name)
+                pending.extend(children.get(name, []))
+
+        return found
+
+    def _path(self, name):
+        """Returns the long name of a node.
+        """
+        node = self._nodes[name]
+        if (node["type"] not in _TRANSFORM_TYPES
+                and node["type"] not in _CONSTRAINT_TYPES):
+            return name
+
+        path = [name]
+        while self._nodes[path[-1]]["parent"]:
+            path.append(self._nodes[path[-1]]["parent"])
+
+        return "|" + "|".join(reversed(path))
+
+    # evaluation
+
+    def _get(self, name, attr, time=None):
+        """Evaluates one attribute, time None is the current time with its
+        unkeyed values.
+        """
+        node = self._nodes[name]
+        if self._is_output(node["type"], attr):
+            return self._output(name, attr, time)
+
+        plug = "{}.{}".format(name, attr)
+        if time is None and plug in self._overrides:
+            return self._overrides[plug]
+        source = self._inputs.get(plug)
+        if source is not None:
+            source_name, source_attr = source.split(".", 1)
+            return self._get(source_name, source_attr, time)
+
+        return node["attrs"][attr]
+
+    def _output(self, name, attr, time):
+        """Computes an output attribute.
+        """
+        node_type = self._nodes[name]["type"]
+        if _is_curve(node_type):
+            return self._curve_value(name, time)
+
+        if node_type == "condition":
+            condition = _CONDITIONS[int(self._get(name, "operation", time))]
+            prefix = "colorIfTrue" if condition(
+                self._get(name, "firstTerm", time),
+                self._get(name, "secondTerm", time)
+            ) else "colorIfFalse"
+            return self._get(name, prefix + attr[-1], time)
+
+        if node_type == "reverse":
+            return 1.0 - self._get(name, "input" + attr[-1], time)
+
+        if node_type == "time":
+            return self._time if time is None else float(time)
+
+        return self._constraint_values(name, time)[attr]
+
+    def _curve_value(self, name, time):
+        """Evaluates an anim curve.
+        """
+        curve = self._nodes[name]
+        times = curve["times"]
+        values = curve["values"]
+        if not times:
+            return 0.0
+
+        time = self._time if time is None else float(time)
+        index = bisect.bisect_right(times, time)
+        if index == 0:
+            return values[0]
+        if index == len(times) or curve["step"]:
+            return values[index - 1]
+
+        weight = (time - times[index - 1]) / (times[index] - times[index - 1])
+        return values[index - 1] + (values[index] - values[index - 1]) * weight
+
+    def _local_matrix(self, name, time=None):
+        """Computes the local matrix of a transform, pivots and shear are
+        ignored.
+        """
+        key = ("local", name, time)
+        matrix = self._memo.get(key)
+        if matrix is not None:
+            return matrix
+
+        def get_vector(compound):
+            return [self._get(name, child, time)
+                    for child in COMPOUNDS[compound]]
+
+        matrix = switch_math.euler_to_matrix(
+            get_vector("rotate"), int(self._get(name, "rotateOrder", time))
+        )
+        rotate_axis = get_vector("rotateAxis")
+        if any(rotate_axis):
+            matrix = switch_math.multiply_matrices(
+                switch_math.euler_to_matrix(rotate_axis), matrix
+            )
+        if self._nodes[name]["type"] == "joint":
+            joint_orient = get_vector("jointOrient")
+            if any(joint_orient):
+                matrix = switch_math.multiply_matrices(
+                    matrix, switch_math.euler_to_matrix(joint_orient)
+                )
+        for row, scale in enumerate(get_vector("scale")):
+            if scale != 1.0:
+                matrix[row * 4:row * 4 + 3] = [value * scale for value
+                                               in matrix[row * 4:row * 4 + 3]]
+        matrix[12:15] = get_vector("translate")
+
+        handle = self._nodes[name].get("ik")
+        if handle is not None:
+            blend = min(self._get(handle, "ikBlend", time), 1.0)
+            if blend > 0.0:
+                index = self._nodes[handle]["chain"].index(name)
+                solved = self._ik_local_matrices(handle, time)[index]
+                matrix = [value + (other - value) * blend
+                          for value, other in zip(matrix, solved)]
+
+        self._memo[key] = matrix
+        return matrix
+
+    def _joint_position(self, name, time=None):
+        """Computes the world position of a transform from its translate and
+        parent, without its own rotation.
+        """
+        position = [self._get(name, child, time)
+                    for child in COMPOUNDS["translate"]]
+        parent = self._nodes[name]["parent"]
+        if not parent:
+            return position
+
+        return switch_math.multiply_matrices(
+            IDENTITY[:12] + position + [1.0], self._world_matrix(parent, time)
+        )[12:15]
+
+    def _ik_local_matrices(self, handle, time=None):
+        """Solves the two-bone chain of an ik handle analytically, returns
+        the local matrices of its start and middle joints. The middle joint
+        goes on the plane of the start joint, the handle and the pole vector,
+        on the side of the pole, and both joints keep the normal of their
+        plane they had when the handle was created. Twist, stretch and
+        preferred angles are not modeled.
+        """
+        key = ("ik", handle, time)
+        matrices = self._memo.get(key)
+        if matrices is not None:
+            return matrices
+
+        get = self._get
+        node = self._nodes[handle]
+        start, middle, end = node["chain"]
+        start_normal, middle_normal = node["normals"]
+        upper = [get(middle, child, time) for child in COMPOUNDS["translate"]]
+        lower = [get(end, child, time) for child in COMPOUNDS["translate"]]
+        upper_length = math.sqrt(sum(value * value for value in upper))
+        lower_length = math.sqrt(sum(value * value for value in lower))
+
+        parent_matrix = list(IDENTITY)
+        if self._nodes[start]["parent"]:
+            parent_matrix = self._world_matrix(self._nodes[start]["parent"],
+                                               time)
+        origin = self._joint_position(start, time)
+        goal = _subtract(self._world_matrix(handle, time)[12:15], origin)
+        distance = math.sqrt(sum(value * value for value in goal))
+        aim = _normalize(goal) or [1.0, 0.0, 0.0] # handle on the joint
+        distance = min(max(distance, abs(upper_length - lower_length)),
+                       upper_length + lower_length)
+
+        # the pole vector is relative to the start joint
+        pole = [get(handle, child, time) for child in _POLE_VECTOR]
+        along = sum(value * other for value, other in zip(pole, aim))
+        side = _normalize([value - other * along
+                           for value, other in zip(pole, aim)])
+        if side is None: # pole on the aim axis, any plane will do
+            side = (_normalize(_cross(aim, [0.0, 1.0, 0.0]))
+                    or _normalize(_cross(aim, [0.0, 0.0, 1.0])))
+        normal = _normalize(_cross(side, aim))
+
+        cosine = 1.0
+        if upper_length > switch_math.EPSILON and distance > 0.0:
+            cosine = ((upper_length ** 2 + distance ** 2 - lower_length ** 2)
+                      / (2.0 * upper_length * distance))
+            cosine = min(max(cosine, -1.0), 1.0)
+        sine = math.sqrt(1.0 - cosine ** 2)
+        upper_aim = [a * cosine + b * sine for a, b in zip(aim, side)]
+        elbow = [value * upper_length for value in upper_aim]
+        lower_aim = _subtract([value * distance for value in aim], elbow)
+
+        matrices = []
+        for local_aim, local_normal, world_aim, position in (
+                (upper, start_normal, upper_aim, origin),
+                (lower, middle_normal, lower_aim,
+                 [a + b for a, b in zip(origin, elbow)])):
+            local_rows = _frame_rows((0, 1), (local_aim, local_normal))
+            world_rows = _frame_rows((0, 1), (world_aim, normal))
+            # the rotation taking the local frame onto the world one
+            rows = [[sum(local_rows[axis][row] * world_rows[axis][col]
+                         for axis in range(3)) for col in range(3)]
+                    for row in range(3)]
+            world_matrix = (rows[0] + [0.0] + rows[1] + [0.0] + rows[2]
+                            + [0.0] + position + [1.0])
+            matrices.append(switch_math.multiply_matrices(
+                world_matrix, switch_math.invert_matrix(parent_matrix)
+            ))
+            parent_matrix = world_matrix
+
+        self._memo[key] = matrices
+        return matrices
+
+    def _world_matrix(self, name, time=None):
+        """Computes the world matrix of a transform.
+        """
+        key = ("world", name, time)
+        matrix = self._memo.get(key)
+        if matrix is not None:
+            return matrix
+
+        matrix = self._local_matrix(name, time)
+        parent = self._nodes[name]["parent"]
+        if parent:
+            matrix = switch_math.multiply_matrices(
+                matrix, self._world_matrix(parent, time)
+            )
+
+        self._memo[key] = matrix
+        return matrix
+
+    def _parent_inverse_matrix(self, name, time=None):
+        """Computes the parent inverse matrix of a transform.
+        """
+        parent = self._nodes[name]["parent"]
+        if not parent:
+            return list(IDENTITY)
+
+        key = ("parent inverse", name, time)
+        matrix = self._memo.get(key)
+        if matrix is None:
+            matrix = switch_math.invert_matrix(
+                self._world_matrix(parent, time)
+            )
+            self._memo[key] = matrix
+
+        return matrix
+
+    def _solve_local(self, name, world_matrix, time=None, reference=None):
+        """Returns the local translate and rotate that put a transform at a
+        world matrix.
+        """
+        get = self._get
+        joint_orient = None
+        if self._nodes[name]["type"] == "joint":
+            joint_orient = [get(name, child, time)
+                            for child in COMPOUNDS["jointOrient"]]
+
+        return switch_math.solve_local_transforms(
+            [world_matrix], [self._parent_inverse_matrix(name, time)],
+            int(get(name, "rotateOrder", time)),
+            [get(name, child, time) for child in COMPOUNDS["rotateAxis"]],
+            joint_orient, reference
+        )[0]
+
+    def _constraint_values(self, name, time=None):
+        """Computes the outputs of a constraint, its targets are blended by
+        weight, which is exact for weights of 0 and 1.
+        """
+        key = ("constraint", name, time)
+        values = self._memo.get(key)
+        if values is not None:
+            return values
+
+        constraint = self._nodes[name]
+        driven = constraint["driven"]
+        total = 0.0
+        blended = [0.0] * 16
+        for target, weight_attr, offset in constraint["targets"]:
+            weight = self._get(name, weight_attr, time)
+            if weight <= 0.0:
+                continue
+            matrix = self._world_matrix(target, time)
+            if constraint["type"] in ("pointConstraint",
+                                      "poleVectorConstraint"):
+                position = [value + delta for value, delta
+                            in zip(matrix[12:15], offset)]
+                matrix = IDENTITY[:12] + position + [1.0]
+            else:
+                matrix = switch_math.constrain_matrix(matrix, offset)
+            blended = [value + other * weight
+                       for value, other in zip(blended, matrix)]
+            total += weight
+
+        driven_attrs = self._nodes[driven]["attrs"]
+        if constraint["type"] == "poleVectorConstraint":
+            # the pole vector of an ik handle is relative to its start joint
+            if total > switch_math.EPSILON:
+                start = self._nodes[driven]["chain"][0]
+                pole = _subtract([value / total for value in blended[12:15]],
+                                 self._joint_position(start, time))
+            else:
+                pole = [driven_attrs[child] for child in _POLE_VECTOR]
+            values = dict(zip(_CONSTRAINT_OUTPUTS, pole + [0.0] * 3))
+        elif total > switch_math.EPSILON:
+            translate, rotate = self._solve_local(
+                driven, [value / total for value in blended], time
+            )
+            values = dict(zip(_CONSTRAINT_OUTPUTS,
+                              list(translate) + list(rotate)))
+        else: # no weight, the driven node keeps its own values
+            values = dict(zip(_CONSTRAINT_OUTPUTS, [
+                driven_attrs[channel] for channel
+                in COMPOUNDS["translate"] + COMPOUNDS["rotate"]
+            ]))
+
+        self._memo[key] = values
+        return values
+
+    def _set(self, name, attr, value):
+        """Sets one attribute, on animated ones the value holds until the
+        time changes.
+        """
+        node = self._nodes[name]
+        plug = "{}.{}".format(name, attr)
+        if attr in node["locked"]:
+            raise RuntimeError("The attribute '{}' is locked and cannot be "
+                               "modified.".format(plug))
+        if self._is_output(node["type"], attr) or attr in _MATRIX_ATTRS:
+            raise RuntimeError("The attribute '{}' is read-only.".format(plug))
+
+        value = self._coerce(name, attr, value)
+        source = self._inputs.get(plug)
+        if source is None:
+            node["attrs"][attr] = value
+        elif _is_curve(self._nodes[source.split(".")[0]]["type"]):
+            self._overrides[plug] = value
+        else:
+            raise RuntimeError("The attribute '{}' is connected and cannot be "
+                               "modified.".format(plug))
+        self._changed([name])
+
+    def _create_curve(self, name, attr):
+        """Creates an anim curve for one attribute, not connected.
+        """
+        if attr in COMPOUNDS["translate"]:
+            curve_type = "animCurveTL"
+        elif attr in COMPOUNDS["rotate"]:
+            curve_type = "animCurveTA"
+        else:
+            curve_type = "animCurveTU"
+        curve = self._add_node(curve_type, "{}_{}".format(name, attr))
+        self._nodes[curve]["step"] = (self._nodes[name]["types"].get(attr)
+                                      in ("enum", "bool"))
+
+        return curve
+
+    def _key_curve(self, name, attr):
+        """Returns the anim curve keys of an attribute go to, created on
+        first use. Constrained attributes are keyed on the curve the
+        constraint displaced, which drives them again once it is deleted.
+        """
+        plug = "{}.{}".format(name, attr)
+        if attr in self._nodes[name]["locked"]:
+            raise RuntimeError("The attribute '{}' is locked and cannot be "
+                               "keyed.".format(plug))
+
+        source = self._inputs.get(plug)
+        if source is None:
+            curve = self._create_curve(name, attr)
+            self._inputs[plug] = "{}.output".format(curve)
+            self._changed()
+            return curve
+
+        source_name = source.split(".")[0]
+        source_node = self._nodes[source_name]
+        if _is_curve(source_node["type"]):
+            return source_name
+        if source_node["type"] in _CONSTRAINT_TYPES:
+            displaced = source_node["displaced"]
+            if plug not in displaced:
+                displaced[plug] = self._create_curve(name, attr)
+            return displaced[plug]
+
+        raise RuntimeError("The attribute '{}' is connected and cannot be "
+                           "keyed.".format(plug))
+
+    def _add_key(self, curve, time, value):
+        """Adds a key to a curve, or replaces the one on the same time.
+        """
+        node = self._nodes[curve]
+        index = bisect.bisect_left(node["times"], time)
+        if (index < len(node["times"])
+                and abs(node["times"][index] - time) < 1e-6):
+            node["values"][index] = value
+        else:
+            node["times"].insert(index, time)
+            node["values"].insert(index, value)
+
+    def _set_curve_keys(self, curve, keys):
+        """Replaces every key of a curve by the given (time, value) pairs.
+        """
+        keys = sorted(keys)
+        self._nodes[curve]["times"] = [float(time) for time, value in keys]
+        self._nodes[curve]["values"] = [float(value) for time, value in keys]
+
+    def _curves(self, objects, attribute=None):
+        """Returns the anim curves of curves, plugs and nodes.
+        """
+        curves = []
+        for obj in _flatten(objects):
+            if "." not in obj and _is_curve(self._nodes[self._node(obj)]
+                                           ["type"]):
+                curves.append(self._node(obj))
+                continue
+            for name, attr in self._expand_plugs([obj], attribute):
+                source = self._inputs.get("{}.{}".format(name, attr))
+                if (source is not None and _is_curve(
+                        self._nodes[source.split(".")[0]]["type"])):
+                    curves.append(source.split(".")[0])
+
+        return curves
+
+    def _changed(self, names=None):
+        """Empties the evaluated values and reports a change to the change
+        callbacks, with the long names of the nodes that changed, or None if
+        the graph itself changed.
+        """
+        self._memo.clear()
+        if not self._callbacks:
+            return
+
+        nodes = None
+        if names is not None:
+            nodes = [self._path(name) for name in names]
+        for callback in list(self._callbacks.values()):
+            callback(nodes)
+
+    # change callbacks, not part of maya.cmds
+
+    def add_change_callback(self, callback):
+        """Calls a function on every change, the way OpenMaya messages report
+        them in Maya, see space_switch_engine.MatrixCache. It is given the
+        long names of the nodes whose attributes were set or whose keys were
+        edited, or None if nodes were connected, parented or deleted, or the
+        scene was undone or emptied.
+
+        Args:
+            callback (callable): takes a list of node names or None.
+
+        Returns:
+            int: callback id, see remove_change_callback.
+        """
+        self._last_callback_id += 1
+        self._callbacks[self._last_callback_id] = callback
+
+        return self._last_callback_id
+
+    def remove_change_callback(self, callback_id):
+        """Stops calling a function added by add_change_callback.
+
+        Args:
+            callback_id (int): callback id.
+        """
+        self._callbacks.pop(callback_id, None)
+
+    # scene
+
+    def about(self, **kwargs):
+        """Same as cmds.about, reports a batch session.
+        """
+        if kwargs.get("batch"):
+            return True
+        if kwargs.get("version"):
+            return MEMORY_BACKEND
+
+        return ""
+
+    def file(self, *args, **kwargs):
+        """Same as cmds.file for new scenes, scene name queries, renames,
+        and opening and saving memory scenes: JSON files of the scene state
+        written by this command. Maya scene files cannot be opened, and the
+        type flag is ignored, memory scenes are always saved as JSON.
+        """
+        if kwargs.get("new"):
+            self._reset()
+            return ""
+        if kwargs.get("query"):
+            return self._scene_name
+        if kwargs.get("rename"):
+            self._scene_name = kwargs["rename"]
+            return self._scene_name
+
+        if kwargs.get("open"):
+            try:
+                with open(args[0]) as in_file:
+                    state = json.load(in_file)
+            except ValueError:
+                state = None
+            if not isinstance(state, dict) or MEMORY_SCENE not in state:
+                raise RuntimeError("{} is not a memory scene!".format(
+                    args[0]
+                ))
+            for node in state["_nodes"].values():
+                node["keyable"] = set(node["keyable"])
+                node["locked"] = set(node["locked"])
+            for attr in _SCENE_STATE:
+                setattr(self, attr, state[attr])
+            del self._undo[:]
+            self._scene_name = args[0]
+            self._changed()
+            return self._scene_name
+
+        if kwargs.get("save"):
+            if not self._scene_name:
+                raise RuntimeError("The scene has no name, rename it first!")
+            state = dict((attr, getattr(self, attr)) for attr in _SCENE_STATE)
+            state["_nodes"] = dict(
+                (name, dict(node, keyable=sorted(node["keyable"]),
+                            locked=sorted(node["locked"])))
+                for name, node in self._nodes.items()
+            )
+            state[MEMORY_SCENE] = 1 # version of the format
+            with open(self._scene_name, "w") as out_file:
+                json.dump(state, out_file)
+            return self._scene_name
+
+        raise RuntimeError("Nothing to do.")
+
+    def autoKeyframe(self, query=False, state=None, **kwargs):
+        """Same as cmds.autoKeyframe, the memory scene never autokeys.
+        """
+        if query:
+            return self._autokey
+        if state is not None:
+            self._autokey = bool(state)
+
+    def evaluationManager(self, query=False, mode=None, **kwargs):
+        """Same as cmds.evaluationManager, the mode is only stored.
+        """
+        if query:
+            return [self._evaluation]
+        if mode is not None:
+            self._evaluation = mode
+
+    def ogs(self, query=False, pause=False, **kwargs):
+        """Same as cmds.ogs, the pause flag toggles.
+        """
+        if query:
+            return self._paused
+        if pause:
+            self._paused = not self._paused
+
+    def refresh(self, **kwargs):
+        """Same as cmds.refresh, nothing to refresh.
+        """
+        return None
+
+    def undoInfo(self, query=False, state=None, openChunk=False,
+                 closeChunk=False, **kwargs):
+        """Same as cmds.undoInfo. The scene is saved when the outermost
+        chunk opens, commands run outside of chunks cannot be undone.
+        """
+        if query:
+            return self._undo_enabled
+        if state is not None:
+            self._undo_enabled = bool(state)
+            if not state:
+                del self._undo[:]
+        if openChunk:
+            if self._chunks == 0 and self._undo_enabled:
+                self._undo.append(copy.deepcopy(dict(
+                    (attr, getattr(self, attr)) for attr in _SCENE_STATE
+                )))
+            self._chunks += 1
+        if closeChunk:
+            self._chunks = max(0, self._chunks - 1)
+
+    def undo(self, **kwargs):
+        """Same as cmds.undo, puts the scene back as it was before the last
+        undo chunk.
+        """
+        if not self._undo:
+            LOGGER.warning("There are no more commands to undo.")
+            return
+
+        for attr, value in self._undo.pop().items():
+            setattr(self, attr, value)
+        self._changed()
+
+    def currentTime(self, *args, **kwargs):
+        """Same as cmds.currentTime, unkeyed values are dropped when the time
+        changes.
+        """
+        if kwargs.get("query"):
+            return self._time
+
+        time = float(args[0] if args else kwargs["time"])
+        if time != self._time:
+            self._time = time
+            self._overrides.clear()
+            self._memo.clear()
+
+        return self._time
+
+    def playbackOptions(self, query=False, minTime=None, maxTime=None,
+                        **kwargs):
+        """Same as cmds.playbackOptions, only the playback range.
+        """
+        if query:
+            return self._playback[0] if minTime else self._playback[1]
+        if minTime is not None:
+            self._playback[0] = float(minTime)
+        if maxTime is not None:
+            self._playback[1] = float(maxTime)
+
+    # nodes
+
+    def createNode(self, node_type, name=None, parent=None, **kwargs):
+        """Same as cmds.createNode, unknown types give plain nodes without
+        attributes.
+        """
+        if parent is not None:
+            parent = self._node(parent)
+
+        return self._add_node(node_type, name,
+                              parent if node_type in _TRANSFORM_TYPES
+                              else None)
+
+    def group(self, *objects, **kwargs):
+        """Same as cmds.group.
+        """
+        parent = kwargs.get("parent")
+        name = self._add_node("transform", kwargs.get("name") or "group1",
+                              self._node(parent) if parent else None)
+        if objects and not kwargs.get("empty"):
+            self.parent(objects, name)
+
+        return name
+
+    def spaceLocator(self, name=None, **kwargs):
+        """Same as cmds.spaceLocator, the locator has no shape.
+        """
+        return [self._add_node("transform", name or "locator1")]
+
+    def circle(self, name=None, **kwargs):
+        """Same as cmds.circle without construction history, the circle has
+        no shape.
+        """
+        return [self._add_node("transform", name or "nurbsCircle1")]
+
+    def parent(self, *objects, **kwargs):
+        """Same as cmds.parent, the children keep their world position and
+        rotation unless relative is set.
+        """
+        names = [self._node(name) for name in _flatten(objects)]
+        if kwargs.get("world"):
+            parent = None
+        else:
+            parent = names.pop()
+            if self._nodes[parent]["type"] not in _TRANSFORM_TYPES:
+                raise RuntimeError("{} cannot be a parent.".format(parent))
+
+        for name in names:
+            if parent in self._descendants([name]):
+                raise RuntimeError("Cannot parent {} under itself.".format(
+                    name
+                ))
+            world_matrix = self._world_matrix(name)
+            rotate = [self._get(name, child)
+                      for child in COMPOUNDS["rotate"]]
+            self._nodes[name]["parent"] = parent
+            self._changed()
+            if not kwargs.get("relative"):
+                translate, rotate = self._solve_local(name, world_matrix,
+                                                      reference=rotate)
+                for channels, values in [[COMPOUNDS["translate"], translate],
+                                         [COMPOUNDS["rotate"], rotate]]:
+                    for child, value in zip(channels, values):
+                        self._set(name, child, value)
+
+        return names
+
+    def delete(self, *objects, **kwargs):
+        """Same as cmds.delete, deleting nodes also deletes their children
+        and anim curves. Deleted constraints give the attributes they drove
+        back to the curves they displaced, the others keep their constrained
+        value.
+        """
+        doomed = self._descendants([self._node(name)
+                                    for name in _flatten(objects)])
+        # ik handles go with their joints, effectors with their handles
+        handles = [name for name, node in self._nodes.items()
+                   if node["type"] == "ikHandle"
+                   and (name in doomed or doomed.intersection(node["chain"]))]
+        doomed = self._descendants(
+            list(doomed) + handles
+            + [self._nodes[handle]["effector"] for handle in handles]
+        )
+        for plug, source in self._inputs.items():
+            source_name = source.split(".")[0]
+            if (plug.split(".")[0] in doomed
+                    and _is_curve(self._nodes[source_name]["type"])):
+                doomed.add(source_name)
+
+        restores = {}
+        for name in list(doomed):
+            for plug, curve in self._nodes[name].get("displaced",
+                                                     {}).items():
+                if plug.split(".")[0] in doomed:
+                    doomed.add(curve)
+                elif self._inputs.get(plug, "").split(".")[0] == name:
+                    restores[plug] = "{}.output".format(curve)
+        holds = {}
+        for plug, source in self._inputs.items():
+            name, attr = plug.split(".", 1)
+            source_name = source.split(".")[0]
+            if (name not in doomed and source_name in doomed
+                    and plug not in restores
+                    and self._nodes[source_name]["type"]
+                    in _CONSTRAINT_TYPES):
+                holds[(name, attr)] = self._get(name, attr)
+
+        self._inputs = dict((plug, source)
+                            for plug, source in self._inputs.items()
+                            if plug.split(".")[0] not in doomed
+                            and source.split(".")[0] not in doomed)
+        self._inputs.update(restores)
+        for (name, attr), value in holds.items():
+            self._nodes[name]["attrs"][attr] = value
+        self._overrides = dict((plug, value)
+                               for plug, value in self._overrides.items()
+                               if plug.split(".")[0] not in doomed)
+        for name in doomed:
+            node = self._nodes.pop(name)
+            del self._uuids[node["uuid"]]
+            for joint in node.get("chain", []):
+                if joint in self._nodes:
+                    self._nodes[joint].pop("ik", None)
+        self._selection = [name for name in self._selection
+                           if name not in doomed]
+        self._changed()
+
+    def select(self, *objects, **kwargs):
+        """Same as cmds.select.
+        """
+        names = [self._node(name) for name in _flatten(objects)]
+        if kwargs.get("clear"):
+            names = []
+        elif kwargs.get("add"):
+            names = self._selection + names
+        self._selection = names
+
+    def objExists(self, name):
+        """Same as cmds.objExists, for nodes and plugs.
+        """
+        try:
+            if "." in name:
+                self._parse(name)
+            else:
+                self._node(name)
+        except ValueError:
+            return False
+
+        return True
+
+    def nodeType(self, name, **kwargs):
+        """Same as cmds.nodeType.
+        """
+        return self._nodes[self._node(name)]["type"]
+
+    def ls(self, *objects, **kwargs):
+        """Same as cmds.ls, takes node names and uuids, missing ones are
+        skipped.
+        """
+        if kwargs.get("selection"):
+            names = list(self._selection)
+        elif objects:
+            names = []
+            for obj in _flatten(objects):
+                name = self._uuids.get(obj, obj.split("|")[-1])
+                if name in self._nodes and name not in names:
+                    names.append(name)
+        else:
+            names = sorted(self._nodes)
+
+        node_type = kwargs.get("type")
+        if node_type:
+            node_types = _flatten([node_type])
+            names = [name for name in names if any(
+                self._nodes[name]["type"] == other
+                or (other == "transform" and self._nodes[name]["type"]
+                    in _TRANSFORM_TYPES + _CONSTRAINT_TYPES)
+                or (other == "animCurve"
+                    and _is_curve(self._nodes[name]["type"]))
+                for other in node_types
+            )]
+
+        if kwargs.get("uuid"):
+            return [self._nodes[name]["uuid"] for name in names]
+        if kwargs.get("long"):
+            return [self._path(name) for name in names]
+
+        return names
+
+    # attributes
+
+    def addAttr(self, node, longName=None, attributeType="double",
+                defaultValue=0.0, keyable=False, **kwargs):
+        """Same as cmds.addAttr, for numeric, enum and bool attributes.
+        """
+        name = self._node(node)
+        attr = longName or kwargs["ln"]
+        if self._has_attr(name, attr):
+            raise RuntimeError("Found an attribute named {} on {}.".format(
+                attr, name
+            ))
+
+        self._nodes[name]["types"][attr] = attributeType
+        self._nodes[name]["attrs"][attr] = self._coerce(name, attr,
+                                                        defaultValue)
+        if keyable:
+            self._nodes[name]["keyable"].add(attr)
+
+    def attributeQuery(self, attr, node=None, exists=False, multi=False,
+                       keyable=False, **kwargs):
+        """Same as cmds.attributeQuery.
+        """
+        name = self._node(node)
+        attr = ALIASES.get(attr, attr)
+        if exists:
+            return self._has_attr(name, attr)
+        if not self._has_attr(name, attr):
+            raise RuntimeError("No attribute named {} on {}.".format(attr,
+                                                                     name))
+        if multi:
+            return attr in _MULTI_ATTRS
+        if keyable:
+            return attr in self._nodes[name]["keyable"]
+
+        return False
+
+    def getAttr(self, plug, time=None, settable=False, **kwargs):
+        """Same as cmds.getAttr, evaluates at the given time without changing
+        the current one.
+        """
+        name, attr, index = self._parse(plug)
+        node = self._nodes[name]
+        if settable:
+            for child in COMPOUNDS.get(attr, (attr,)):
+                source = self._inputs.get("{}.{}".format(name, child))
+                if (child in node["locked"]
+                        or self._is_output(node["type"], child)
+                        or child in _MATRIX_ATTRS
+                        or (source is not None and not _is_curve(
+                            self._nodes[source.split(".")[0]]["type"]))):
+                    return False
+            return True
+
+        if time is not None:
+            time = float(time)
+
+        if attr in _MATRIX_ATTRS:
+            if attr in ("matrix", "inverseMatrix"):
+                matrix = self._local_matrix(name, time)
+            elif attr in ("worldMatrix", "worldInverseMatrix"):
+                matrix = self._world_matrix(name, time)
+            elif node["parent"]:
+                matrix = self._world_matrix(node["parent"], time)
+            else:
+                matrix = IDENTITY
+            if "Inverse" in attr:
+                matrix = switch_math.invert_matrix(matrix)
+            return list(matrix)
+
+        if attr == "keyTimeValue":
+            return [(time, value) for time, value
+                    in zip(node["times"], node["values"])]
+
+        if attr in COMPOUNDS:
+            return [tuple(self._coerce(name, child,
+                                       self._get(name, child, time))
+                          for child in COMPOUNDS[attr])]
+
+        return self._coerce(name, attr, self._get(name, attr, time))
+
+    def setAttr(self, plug, *values, **kwargs):
+        """Same as cmds.setAttr, also sets the keys of an anim curve through
+        its keyTimeValue array, e.g. setAttr("curve.ktv[0:1]", 1, 0, 2, 5).
+        """
+        name, attr, index = self._parse(plug)
+        node = self._nodes[name]
+        children = COMPOUNDS.get(attr, (attr,))
+        if "lock" in kwargs:
+            for child in children:
+                if kwargs["lock"]:
+                    node["locked"].add(child)
+                else:
+                    node["locked"].discard(child)
+        if not values:
+            return
+
+        if attr == "keyTimeValue":
+            first, _, last = (index or "0").partition(":")
+            indices = range(int(first), int(last or first) + 1)
+            keys = list(zip(node["times"], node["values"]))
+            for key_index, time, value in zip(indices, values[::2],
+                                              values[1::2]):
+                keys[key_index] = (time, value)
+            self._set_curve_keys(name, keys)
+            self._changed([name])
+            return
+
+        if len(values) == 1 and isinstance(values[0], (list, tuple)):
+            values = values[0]
+        if len(values) != len(children):
+            raise RuntimeError("Wrong number of values for {}.".format(plug))
+        for child, value in zip(children, values):
+            self._set(name, child, value)
+
+    def connectAttr(self, source, destination, force=False, **kwargs):
+        """Same as cmds.connectAttr, compounds connect child by child.
+        """
+        source_name, source_attr, index = self._parse(source)
+        name, attr, index = self._parse(destination)
+        pairs = [(source_attr, attr)]
+        if source_attr in COMPOUNDS and attr in COMPOUNDS:
+            pairs = list(zip(COMPOUNDS[source_attr], COMPOUNDS[attr]))
+
+        for source_attr, attr in pairs:
+            plug = "{}.{}".format(name, attr)
+            if plug in self._inputs and not force:
+                raise RuntimeError("{} is already connected.".format(plug))
+            if (attr in self._nodes[name]["locked"]
+                    or self._is_output(self._nodes[name]["type"], attr)):
+                raise RuntimeError("{} cannot be connected.".format(plug))
+            self._inputs[plug] = "{}.{}".format(source_name, source_attr)
+            self._overrides.pop(plug, None)
+        self._changed()
+
+    def disconnectAttr(self, source, destination, **kwargs):
+        """Same as cmds.disconnectAttr.
+        """
+        name, attr, index = self._parse(destination)
+        for child in COMPOUNDS.get(attr, (attr,)):
+            self._inputs.pop("{}.{}".format(name, child), None)
+        self._changed()
+
+    def listConnections(self, obj, source=True, destination=True, type=None,
+                        **kwargs):
+        """Same as cmds.listConnections, returns the connected nodes. The
+        targets and driven node of a constraint are listed as its sources,
+        like the connections Maya makes.
+        """
+        if "." in obj:
+            name, attr, index = self._parse(obj)
+            plugs = set("{}.{}".format(name, child)
+                        for child in COMPOUNDS.get(attr, (attr,)))
+            matches = lambda plug: plug in plugs
+        else:
+            name = self._node(obj)
+            matches = lambda plug: plug.split(".")[0] == name
+
+        connections = list(self._inputs.items())
+        for handle, node in self._nodes.items():
+            # the solver poses its joints without connections in Maya, the
+            # handle is listed as their source so their matrices depend on it
+            if node["type"] == "ikHandle":
+                connections.extend(("{}.rotate".format(joint),
+                                    "{}.ikSolution".format(handle))
+                                   for joint in node["chain"][:2])
+        for constraint, node in self._nodes.items():
+            if node["type"] not in _CONSTRAINT_TYPES:
+                continue
+            if node["type"] == "poleVectorConstraint":
+                start = self._nodes[node["driven"]]["chain"][0]
+                connections.append(
+                    ("{}.constraintRotatePivot".format(constraint),
+                     "{}.translate".format(start))
+                )
+            connections.extend(("{}.target".format(constraint),
+                                "{}.parentMatrix".format(target))
+                               for target, weight_attr, offset
+                               in node["targets"])
+            connections.append(
+                ("{}.constraintParentInverseMatrix".format(constraint),
+                 "{}.parentInverseMatrix".format(node["driven"]))
+            )
+
+        nodes = []
+        for plug, source_plug in sorted(connections):
+            if source and matches(plug):
+                nodes.append(source_plug.split(".")[0])
+            if destination and matches(source_plug):
+                nodes.append(plug.split(".")[0])
+        if type:
+            nodes = self.ls(nodes, type=type)
+
+        return [node for index, node in enumerate(nodes)
+                if node not in nodes[:index]]
+
+    # animation
+
+    def _key_times(self, time):
+        """Returns the frames of a setKeyframe time flag.
+        """
+        if time is None:
+            return [self._time]
+        if isinstance(time, tuple):
+            return sorted(set(float(value) for value in time))
+        if isinstance(time, list):
+            return sorted(set(value for item in time
+                              for value in self._key_times(item)))
+
+        return [float(time)]
+
+    def setKeyframe(self, *objects, **kwargs):
+        """Same as cmds.setKeyframe, keys the value the attribute has on each
+        frame unless a value is given.
+        """
+        times = self._key_times(kwargs.get("time"))
+        value = kwargs.get("value")
+        count = 0
+        curves = []
+        for name, attr in self._expand_plugs(objects,
+                                             kwargs.get("attribute")):
+            plug = "{}.{}".format(name, attr)
+            keys = [(time, self._get(name, attr,
+                                     None if time == self._time else time)
+                     if value is None else value) for time in times]
+            curve = self._key_curve(name, attr)
+            for time, key_value in keys:
+                self._add_key(curve, time, float(key_value))
+                count += 1
+            curves.append(curve)
+            if self._time in times:
+                self._overrides.pop(plug, None)
+        self._changed(curves)
+
+        return count
+
+    def keyframe(self, *objects, **kwargs):
+        """Same as cmds.keyframe, only queries, returns None if there is no
+        key.
+        """
+        if not kwargs.get("query"):
+            raise RuntimeError("The memory scene only queries keyframes!")
+
+        time_range = kwargs.get("time")
+        if time_range is not None and not isinstance(time_range, tuple):
+            time_range = (time_range, time_range)
+        result = []
+        for curve in self._curves(objects, kwargs.get("attribute")):
+            node = self._nodes[curve]
+            for time, value in zip(node["times"], node["values"]):
+                if time_range and not (time_range[0] <= time
+                                       <= time_range[-1]):
+                    continue
+                result.append(value if kwargs.get("valueChange") else time)
+
+        return result or None
+
+    def bakeResults(self, objects, time=None, attribute=None,
+                    preserveOutsideKeys=False, **kwargs):
+        """Same as cmds.bakeResults, keys every frame of the time range with
+        the values the attributes evaluate to, before any curve is changed.
+        """
+        first, last = time or self._playback
+        frames = [float(frame) for frame in range(int(math.ceil(first)),
+                                                   int(math.floor(last)) + 1)]
+        baked = [(name, attr, [self._get(name, attr, frame)
+                               for frame in frames])
+                 for name, attr in self._expand_plugs([objects], attribute)]
+
+        curves = []
+        for name, attr, values in baked:
+            curve = self._key_curve(name, attr)
+            curves.append(curve)
+            keys = []
+            if preserveOutsideKeys:
+                node = self._nodes[curve]
+                keys = [(key_time, value) for key_time, value
+                        in zip(node["times"], node["values"])
+                        if key_time < first or key_time > last]
+            self._set_curve_keys(curve, keys + list(zip(frames, values)))
+        self._changed(curves)
+
+        return len(baked)
+
+    # transforms
+
+    def xform(self, node, query=False, worldSpace=False, translation=None,
+              rotation=None, rotateOrder=None, matrix=None, **kwargs):
+        """Same as cmds.xform for translation, rotation, rotate order and
+        matrix, pivots are ignored.
+        """
+        name = self._node(node)
+        if query:
+            if rotateOrder:
+                return switch_math.ROTATE_ORDERS[
+                    int(self._get(name, "rotateOrder"))
+                ]
+            node_matrix = (self._world_matrix(name) if worldSpace
+                           else self._local_matrix(name))
+            if matrix:
+                return list(node_matrix)
+            if translation:
+                return list(node_matrix[12:15])
+            if rotation:
+                if not worldSpace:
+                    return [self._get(name, child)
+                            for child in COMPOUNDS["rotate"]]
+                return switch_math.matrix_to_euler(
+                    node_matrix, int(self._get(name, "rotateOrder"))
+                )
+            raise RuntimeError("Nothing to query.")
+
+        if rotateOrder is not None:
+            self._set(name, "rotateOrder",
+                      switch_math.ROTATE_ORDERS.index(rotateOrder))
+        if translation is not None:
+            translate = list(translation)
+            if worldSpace:
+                inverse = self._parent_inverse_matrix(name)
+                translate = [sum(translate[row] * inverse[row * 4 + col]
+                                 for row in range(3)) + inverse[12 + col]
+                             for col in range(3)]
+            for child, value in zip(COMPOUNDS["translate"], translate):
+                self._set(name, child, value)
+        if rotation is not None:
+            rotate = list(rotation)
+            if worldSpace:
+                current = [self._get(name, child)
+                           for child in COMPOUNDS["rotate"]]
+                world_matrix = switch_math.transform_to_matrix(
+                    self._world_matrix(name)[12:15], rotate,
+                    int(self._get(name, "rotateOrder"))
+                )
+                rotate = self._solve_local(name, world_matrix,
+                                           reference=current)[1]
+            for child, value in zip(COMPOUNDS["rotate"], rotate):
+                self._set(name, child, value)
+
+    def _constraint(self, constraint_type, objects, kwargs):
+        """Creates or queries a constraint, see parentConstraint.
+        """
+        names = [self._node(name) for name in _flatten(objects)]
+        if kwargs.get("query"):
+            constraint = self._nodes[names[0]]
+            if kwargs.get("weightAliasList"):
+                return [target[1] for target in constraint["targets"]]
+            if kwargs.get("targetList"):
+                return [target[0] for target in constraint["targets"]]
+            raise RuntimeError("Nothing to query.")
+
+        targets, driven = names[:-1], names[-1]
+        if not targets:
+            raise RuntimeError("No target given to {}.".format(driven))
+
+        channels = []
+        if constraint_type == "poleVectorConstraint":
+            if self._nodes[driven]["type"] != "ikHandle":
+                raise RuntimeError("{} is not an ik handle.".format(driven))
+            channels.extend(_POLE_VECTOR)
+        elif constraint_type != "orientConstraint":
+            skip = _flatten([kwargs.get("skipTranslate", [])])
+            channels.extend(channel for channel in COMPOUNDS["translate"]
+                            if channel[-1].lower() not in skip)
+        if constraint_type not in ("pointConstraint", "poleVectorConstraint"):
+            skip = _flatten([kwargs.get("skipRotate", [])])
+            channels.extend(channel for channel in COMPOUNDS["rotate"]
+                            if channel[-1].lower() not in skip)
+        for channel in channels:
+            if channel in self._nodes[driven]["locked"]:
+                raise RuntimeError("{}.{} is locked.".format(driven, channel))
+
+        name = self._add_node(
+            constraint_type,
+            kwargs.get("name") or "{}_{}1".format(driven, constraint_type),
+            driven
+        )
+        constraint = self._nodes[name]
+        constraint["driven"] = driven
+        driven_matrix = self._world_matrix(driven)
+        for index, target in enumerate(targets):
+            weight_attr = "{}W{}".format(target.split(":")[-1], index)
+            constraint["attrs"][weight_attr] = float(kwargs.get("weight",
+                                                                1.0))
+            target_matrix = self._world_matrix(target)
+            if constraint_type in ("pointConstraint",
+                                   "poleVectorConstraint"):
+                offset = [0.0, 0.0, 0.0]
+                if kwargs.get("maintainOffset"):
+                    offset = [value - other for value, other
+                              in zip(driven_matrix[12:15],
+                                     target_matrix[12:15])]
+            elif kwargs.get("maintainOffset"):
+                offset = switch_math.measure_offset(target_matrix,
+                                                    driven_matrix)
+            else:
+                offset = None
+            constraint["targets"].append([target, weight_attr, offset])
+
+        for channel in channels:
+            plug = "{}.{}".format(driven, channel)
+            source = self._inputs.get(plug)
+            if source is not None:
+                source_name = source.split(".")[0]
+                if not _is_curve(self._nodes[source_name]["type"]):
+                    raise RuntimeError("{} is already connected.".format(plug))
+                constraint["displaced"][plug] = source_name
+            if channel in _POLE_VECTOR: # drives the pole like a translate
+                channel = "translate" + channel[-1]
+            self._inputs[plug] = "{}.constraint{}{}".format(
+                name, channel[0].upper(), channel[1:]
+            )
+            self._overrides.pop(plug, None)
+        self._changed()
+
+        return [name]
+
+    def parentConstraint(self, *objects, **kwargs):
+        """Same as cmds.parentConstraint, the last node is the driven one.
+        Weights are blended linearly, which is exact for weights of 0 and 1.
+        """
+        return self._constraint("parentConstraint", objects, kwargs)
+
+    def pointConstraint(self, *objects, **kwargs):
+        """Same as cmds.pointConstraint, see parentConstraint.
+        """
+        return self._constraint("pointConstraint", objects, kwargs)
+
+    def orientConstraint(self, *objects, **kwargs):
+        """Same as cmds.orientConstraint, see parentConstraint.
+        """
+        return self._constraint("orientConstraint", objects, kwargs)
+
+    def poleVectorConstraint(self, *objects, **kwargs):
+        """Same as cmds.poleVectorConstraint, the last node is the ik handle.
+        """
+        return self._constraint("poleVectorConstraint", objects, kwargs)
+
+    # joints and ik handles
+
+    def _orient_joint(self, name, orient, secondary, positions):
+        """Orients a joint like cmds.joint(orientJoint=), its children are
+        put back on their world positions from before the edit.
+        """
+        children = sorted(child for child, node in self._nodes.items()
+                          if node["parent"] == name
+                          and node["type"] == "joint")
+        positions = [positions[child] for child in children]
+        world_matrix = self._world_matrix(name)
+        joint_orient = [0.0, 0.0, 0.0]
+        if children and orient != "none":
+            up = [0.0, 0.0, 0.0]
+            up["xyz".index(secondary[0])] = (-1.0 if secondary.endswith("down")
+                                             else 1.0)
+            aim = _subtract(positions[0], world_matrix[12:15])
+            if _normalize(_cross(aim, up)) is None: # aiming up, keep the side
+                up = world_matrix["xyz".index(orient[1]) * 4:][:3]
+            rows = _frame_rows(["xyz".index(axis) for axis in orient[:2]],
+                               (aim, up))
+            local_matrix = switch_math.multiply_matrices(
+                rows[0] + [0.0] + rows[1] + [0.0] + rows[2] + [0.0]
+                + world_matrix[12:15] + [1.0],
+                self._parent_inverse_matrix(name)
+            )
+            joint_orient = switch_math.matrix_to_euler(local_matrix)
+
+        for child, value in zip(COMPOUNDS["rotate"], [0.0, 0.0, 0.0]):
+            self._set(name, child, value)
+        for child, value in zip(COMPOUNDS["jointOrient"], joint_orient):
+            self._set(name, child, value)
+        for child, position in zip(children, positions):
+            self.xform(child, worldSpace=True, translation=position)
+
+    def joint(self, *objects, **kwargs):
+        """Same as cmds.joint, creates a joint at a world position under the
+        selected joint and selects it. With edit, orients the joints with
+        orientJoint and secondaryAxisOrient (default "yup"), children set
+        orients everything below them too. Scale orients are not modeled.
+        """
+        if kwargs.get("edit"):
+            names = [self._node(name) for name in _flatten(objects)]
+            if kwargs.get("children"):
+                names = self._descendants(names)
+            names = sorted((name for name in names
+                            if self._nodes[name]["type"] == "joint"),
+                           key=lambda name: self._path(name).count("|"))
+            orient = kwargs.get("orientJoint")
+            positions = dict((name, self._world_matrix(name)[12:15])
+                             for name, node in self._nodes.items()
+                             if node["type"] == "joint")
+            if orient:
+                for name in names:
+                    self._orient_joint(name, orient,
+                                       kwargs.get("secondaryAxisOrient")
+                                       or "yup", positions)
+            return
+
+        parent = None
+        if (self._selection
+                and self._nodes[self._selection[-1]]["type"] == "joint"):
+            parent = self._selection[-1]
+        name = self._add_node("joint", kwargs.get("name") or "joint1",
+                              parent)
+        position = kwargs.get("position")
+        if position is not None:
+            self.xform(name, worldSpace=True, translation=position)
+        self._selection = [name]
+
+        return name
+
+    def ikHandle(self, startJoint=None, endEffector=None, solver="ikRPsolver",
+                 name=None, **kwargs):
+        """Same as cmds.ikHandle with the rotate plane solver, for chains of
+        two bones, see _ik_local_matrices. The handle starts on the end
+        joint, with its pole vector in the plane of the chain.
+        """
+        if solver != "ikRPsolver":
+            raise RuntimeError("Only the ikRPsolver is supported.")
+
+        start = self._node(startJoint)
+        end = self._node(endEffector)
+        middle = self._nodes[end]["parent"]
+        chain = [start, middle, end]
+        if (middle is None or self._nodes[middle]["parent"] != start
+                or any(self._nodes[joint]["type"] != "joint"
+                       for joint in chain)):
+            raise RuntimeError("{} is not two joints below {}.".format(
+                end, start
+            ))
+        for joint in chain[:2]:
+            if "ik" in self._nodes[joint]:
+                raise RuntimeError("{} is already driven by {}.".format(
+                    joint, self._nodes[joint]["ik"]
+                ))
+
+        matrices = [self._world_matrix(joint) for joint in chain]
+        upper = _subtract(matrices[1][12:15], matrices[0][12:15])
+        lower = _subtract(matrices[2][12:15], matrices[1][12:15])
+        if _normalize(upper) is None or _normalize(lower) is None:
+            raise RuntimeError("The bones of {} have no length.".format(end))
+        # a straight chain bends on any plane
+        normal = (_normalize(_cross(upper, lower))
+                  or _normalize(_cross(upper, [0.0, 1.0, 0.0]))
+                  or _normalize(_cross(upper, [0.0, 0.0, 1.0])))
+
+        handle = self._add_node("ikHandle", name or "ikHandle1")
+        node = self._nodes[handle]
+        node["chain"] = chain
+        node["normals"] = [
+            _normalize(_transform_vector(
+                normal, switch_math.invert_matrix(matrix)
+            )) for matrix in matrices[:2]
+        ]
+        aim = _subtract(matrices[2][12:15], matrices[0][12:15])
+        pole = _normalize(_cross(aim, normal)) or upper
+        node["attrs"].update(zip(_POLE_VECTOR, pole))
+        for joint in chain[:2]:
+            self._nodes[joint]["ik"] = handle
+
+        node["effector"] = self._add_node("ikEffector", "effector1", middle)
+        for child in COMPOUNDS["translate"]:
+            self._set(node["effector"], child, self._get(end, child))
+        self.xform(handle, worldSpace=True, translation=matrices[2][12:15])
+        self._changed()
+
+        return [handle, node["effector"]]
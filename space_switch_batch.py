@@ -0,0 +1,283 @@
+"""
+MODULE: space_switch_batch
+
+Command line entry point that applies space switch and ikfk switch presets
+to scene files without building any UI, meant to be run with mayapy, e.g.
+
+    mayapy space_switch_batch.py shot_010.ma shot_020.ma
+        --preset arm_L.json --preset arm_R.json
+        --bake-mode "bake keyframes" --range 1001 1100 --direction fkik
+        --output-dir baked
+
+Every preset is planned first, then all of them are run as one job per
+scene, see space_switch_engine.execute_plans. The switched scenes are saved
+next to the originals with a suffix, or in the output directory.
+
+With --backend memory, the scenes are memory scenes instead, see
+space_switch_backend: JSON files saved by MemoryScene.file, switched and
+saved as JSON again, so presets can be checked without Maya. Maya scene
+files cannot be opened by the memory backend, those scenes fail.
+
+    python space_switch_batch.py rig.json --preset arm_L.json
+        --backend memory
+
+FUNCTIONS:
+    parse_args: reads the command line options.
+    load_presets: loads and checks preset JSON files.
+    plan_presets: compiles the plan of each preset in the open scene.
+    get_output_path: where a switched scene is saved.
+    process_scene: opens one scene, applies the presets and saves it.
+    main: entry point.
+"""
+
+__author__ = "Te Ling (Danny) Hsu"
+__copyright__ = "Copyright (c) 2020 Te Ling (Danny) Hsu"
+__license__ = "MIT License"
+__version__ = "1.0.0"
+
+import os
+import sys
+import json
+import logging
+import argparse
+
+import space_switch_plan as switch_plan
+import space_switch_backend as switch_backend
+import space_switch_library as switch_library
+import space_switch_profile as switch_profile
+
+# maya modules are imported once maya.standalone is initialized, see main
+
+
+LOGGER = logging.getLogger(__name__)
+
+SCENE_TYPES = {".ma": "mayaAscii", ".mb": "mayaBinary"}
+
+
+def parse_args(args=None):
+    """Reads the command line options.
+
+    Args:
+        args (list|None): command line arguments, sys.argv if None given.
+
+    Returns:
+        Namespace: parsed options.
+    """
+    parser = argparse.ArgumentParser(
+        description="Applies switch presets to Maya scene files."
+    )
+    parser.add_argument("scenes", nargs="+", help="scene files to process.")
+    parser.add_argument("-p", "--preset", dest="presets", action="append",
+                        required=True, help="preset JSON or library file, "
+                             "repeatable.")
+    parser.add_argument("-m", "--bake-mode", default=switch_plan.BAKE_KEYFRAMES,
+                        choices=switch_plan.BAKE_MODES,
+                        help="frames to switch on.")
+    parser.add_argument("-r", "--range", nargs=2, type=float, default=None,
+                        metavar=("START", "END"),
+                        help="time range, the playback range is used for "
+                             "bake every frame if not given.")
+    parser.add_argument("-f", "--frame", type=float, default=None,
+                        help="frame to switch on in current frame mode.")
+    parser.add_argument("-d", "--direction", default="ikfk",
+                        choices=("ikfk", "fkik"),
+                        help="ik --> fk (ikfk) or fk --> ik (fkik).")
+    parser.add_argument("-o", "--output-dir", default=None,
+                        help="saves the scenes here instead of next to the "
+                             "originals.")
+    parser.add_argument("-s", "--suffix", default="_switched",
+                        help="added to the saved scene names.")
+    parser.add_argument("--profile", default=None, metavar="REPORT",
+                        help="appends a timing report per scene to this "
+                             "JSON lines file.")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="plans the switches without changing or "
+                             "saving anything.")
+    parser.add_argument("--backend", default=switch_backend.MAYA_BACKEND,
+                        choices=switch_backend.BACKENDS,
+                        help="scene the files are opened in, memory only "
+                             "opens memory scenes.")
+
+    return parser.parse_args(args)
+
+
+def load_presets(paths):
+    """Loads preset JSON files and preset libraries.
+
+    Args:
+        paths (list): preset file or library paths.
+
+    Returns:
+        list: (name, data) per preset.
+
+    Raises:
+        ValueError: if a file is not a switch preset.
+    """
+    presets = []
+    for path in paths:
+        if switch_library.is_library(path): # every preset of the library
+            presets.extend(switch_library.PresetLibrary(path).get_all())
+            continue
+
+        with open(path) as in_file:
+            data = json.load(in_file)
+        if not isinstance(data, dict) or data.get("mode") not in (
+                "space switch", "ikfk switch"):
+            raise ValueError("{} is not a switch preset!".format(path))
+        presets.append((os.path.splitext(os.path.basename(path))[0], data))
+
+    return presets
+
+
+def plan_presets(presets, options):
+    """Compiles the plan of each preset in the open scene.
+
+    Args:
+        presets (list): (name, data) pairs, see load_presets.
+        options (Namespace): see parse_args.
+
+    Returns:
+        list: (data, plan) pairs, see space_switch_engine.execute_plans.
+
+    Raises:
+        ValueError: if a preset does not match the scene or has nothing to
+                    bake.
+    """
+    import space_switch_engine as engine
+
+    cmds = switch_backend.get_backend()
+    time_range = options.range
+    if (time_range is None
+            and options.bake_mode == switch_plan.BAKE_EVERY_FRAME):
+        time_range = (cmds.playbackOptions(query=True, minTime=True),
+                      cmds.playbackOptions(query=True, maxTime=True))
+    current_frame = options.frame
+    if current_frame is None:
+        current_frame = cmds.currentTime(query=True)
+
+    jobs = []
+    for name, data in presets:
+        if not engine.validate_switch_data(data, data["mode"]):
+            raise ValueError("{} does not match the scene!".format(name))
+
+        direction = None
+        if data["mode"] == "ikfk switch":
+            direction = options.direction
+        ctls = switch_plan.get_switch_controls(data, direction)
+        keyframes = cmds.keyframe(ctls, query=True, timeChange=True) or []
+        try:
+            plan = switch_plan.plan_switch(data["mode"], options.bake_mode,
+                                           keyframes, current_frame,
+                                           time_range, direction)
+        except ValueError as e:
+            raise ValueError("{}: {}".format(name, str(e)))
+        jobs.append((data, plan))
+
+    return jobs
+
+
+def get_output_path(scene, options):
+    """Returns where a switched scene is saved.
+
+    Args:
+        scene (str): path of the original scene.
+        options (Namespace): see parse_args.
+
+    Returns:
+        str: output scene path.
+    """
+    folder, file_name = os.path.split(scene)
+    name, ext = os.path.splitext(file_name)
+    folder = options.output_dir or folder
+
+    return os.path.join(folder, "{}{}{}".format(name, options.suffix, ext))
+
+
+def process_scene(scene, presets, options):
+    """Opens one scene, applies every preset as one job and saves it.
+
+    Args:
+        scene (str): scene file path.
+        presets (list): (name, data) pairs, see load_presets.
+        options (Namespace): see parse_args.
+
+    Returns:
+        str|None: path of the saved scene, None for dry runs.
+    """
+    import space_switch_engine as engine
+
+    cmds = switch_backend.get_backend()
+    with switch_profile.phase("open scene"):
+        cmds.file(scene, open=True, force=True)
+    # presets are edited in place (calibration), keep the loaded ones clean
+    presets = [(name, dict(data)) for name, data in presets]
+    jobs = plan_presets(presets, options)
+
+    if options.dry_run:
+        for (name, preset), (data, plan) in zip(presets, jobs):
+            LOGGER.info("%s | %s: %s", scene, name,
+                        switch_plan.estimate_cost(plan))
+        return None
+
+    with switch_profile.phase("switch"):
+        engine.execute_plans(jobs)
+
+    output_path = get_output_path(scene, options)
+    if options.output_dir and not os.path.isdir(options.output_dir):
+        os.makedirs(options.output_dir)
+    cmds.file(rename=output_path)
+    with switch_profile.phase("save scene"):
+        cmds.file(save=True, force=True, type=SCENE_TYPES.get(
+            os.path.splitext(output_path)[1].lower(), "mayaAscii"
+        ))
+    LOGGER.info("Saved %s", output_path)
+
+    return output_path
+
+
+def main(args=None):
+    """Entry point, processes every scene and keeps going if one fails.
+
+    Args:
+        args (list|None): command line arguments, sys.argv if None given.
+
+    Returns:
+        int: 0 if every scene was processed, 1 otherwise.
+    """
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    options = parse_args(args)
+    try:
+        presets = load_presets(options.presets)
+    except (IOError, ValueError) as e:
+        LOGGER.error(str(e))
+        return 1
+
+    if options.backend == switch_backend.MEMORY_BACKEND:
+        switch_backend.use_memory()
+    else:
+        import maya.standalone
+        maya.standalone.initialize(name="python")
+        switch_backend.use_maya()
+    if options.profile:
+        import space_switch_engine # counts the maya commands it calls
+        switch_profile.enable(options.profile)
+
+    failed = []
+    for scene in options.scenes:
+        try:
+            with switch_profile.phase(os.path.basename(scene)):
+                process_scene(scene, presets, options)
+        except Exception as e: # keep going with the other scenes
+            LOGGER.error("%s failed: %s", scene, str(e))
+            failed.append(scene)
+
+    if failed:
+        LOGGER.error("%d of %d scenes failed:\n%s", len(failed),
+                     len(options.scenes), "\n".join(failed))
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,626 @@
+"""
+MODULE: space_switch_benchmark
+
+Times the switch engines, meant to be run with mayapy. Without a scene, a
+suite of synthetic rigs is built and every switch mode is timed over ranges
+from 100 to 10,000 frames, e.g.
+
+    mayapy space_switch_benchmark.py --controls 8 --depth 4 --chains 2
+        --frames 100 1000 10000 --output timings.json
+        --baseline baseline.json
+
+The synthetic rigs can also be built in memory, see space_switch_backend,
+to time the pipeline without Maya, its ikfk chains solved by the two-bone ik
+of the memory scene:
+
+    python space_switch_benchmark.py --backend memory --controls 8
+
+Under Maya, every case is timed with the controls posed by cmds and by
+OpenMaya, see space_switch_plan.TRANSFORM_MODES, and the speedup of the
+latter is reported. Only the ikfk chains, and the space switched controls
+that cannot be solved in memory, are posed one frame at a time, so that is
+where it shows. Pick one with --transforms. The memory scene has no
+OpenMaya, so only cmds is timed there and no speedup is reported.
+
+With a scene, its presets are switched every frame by each bake engine:
+
+    mayapy space_switch_benchmark.py shot_010.ma --preset arm_L.json
+        --range 1001 2000 --repeats 3 --output timings.json
+
+Every run is undone before the next one, so all of them start from the same
+scene, and the fastest run is kept. Results are written as JSON, and can be
+compared against a previous results file used as baseline.
+
+FUNCTIONS:
+    time_plans: times one run of space_switch_engine.execute_plans.
+    compare_bake_engines: times every bake engine on the same plans.
+    compare_transform_modes: speedup of the OpenMaya transforms per case.
+    build_space_rig: builds a control switching between two spaces.
+    build_ikfk_rig: builds a three-joint chain blending ik and fk.
+    build_rigs: builds the synthetic rigs of one benchmark case.
+    plan_presets: compiles the plans of presets in one switch mode.
+    run_suite: times every switch mode on synthetic rigs.
+    compare_results: compares results against a baseline.
+    parse_args: reads the command line options.
+    main: entry point.
+"""
+
+__author__ = "Te Ling (Danny) Hsu"
+__copyright__ = "Copyright (c) 2020 Te Ling (Danny) Hsu"
+__license__ = "MIT License"
+__version__ = "1.0.0"
+
+import sys
+import json
+import math
+import time
+import logging
+import argparse
+import platform
+
+import space_switch_plan as switch_plan
+import space_switch_backend as switch_backend
+
+# maya modules are imported once maya.standalone is initialized, see main
+
+
+LOGGER = logging.getLogger(__name__)
+
+RESULTS_VERSION = 1
+DEFAULT_FRAMES = (100, 1000, 10000)
+
+
+def time_plans(jobs, bake_engine, repeats=3,
+               transform_mode=switch_plan.CMDS_TRANSFORMS):
+    """Runs plans several times, undoing each run, and returns the fastest.
+
+    Args:
+        jobs (list): (data, plan) pairs, see space_switch_engine.execute_plans.
+        bake_engine (str): one of space_switch_engine.BAKE_ENGINES.
+        repeats (int): number of runs.
+        transform_mode (str): one of space_switch_plan.TRANSFORM_MODES.
+
+    Returns:
+        float: duration of the fastest run, in seconds.
+    """
+    import space_switch_engine as engine
+
+    cmds = switch_backend.get_backend()
+    cmds.undoInfo(state=True)
+    timings = []
+    for _ in range(repeats):
+        # the presets get their calibration stored in them, keep them clean
+        run_jobs = [(dict(data), plan) for data, plan in jobs]
+        cmds.undoInfo(openChunk=True)
+        try:
+            start = time.time()
+            engine.execute_plans(run_jobs, bake_engine=bake_engine,
+                                 transform_mode=transform_mode)
+            timings.append(time.time() - start)
+        finally:
+            cmds.undoInfo(closeChunk=True)
+            cmds.undo()
+
+    return min(timings)
+
+
+def compare_bake_engines(presets, time_range, repeats=3,
+                         transform_modes=(switch_plan.CMDS_TRANSFORMS,)):
+    """Times every bake engine switching the given presets every frame of a
+    time range.
+
+    Args:
+        presets (list): space switch presets.
+        time_range (tuple): first and last frame.
+        repeats (int): runs per engine, see time_plans.
+        transform_modes (list): transform modes timed with each engine.
+
+    Returns:
+        dict: {(bake engine, transform mode): seconds}.
+    """
+    import space_switch_engine as engine
+
+    jobs = plan_presets(presets, switch_plan.BAKE_EVERY_FRAME, time_range)
+
+    return dict(((bake_engine, transform_mode),
+                 time_plans(jobs, bake_engine, repeats, transform_mode))
+                for bake_engine in engine.BAKE_ENGINES
+                for transform_mode in transform_modes)
+
+
+def compare_transform_modes(results):
+    """Matches the cases timed with both transform modes and returns how much
+    faster the OpenMaya transforms were.
+
+    Args:
+        results (list): see run_suite.
+
+    Returns:
+        list: (case, cmds seconds, api seconds, speedup) of every case timed
+              in both modes.
+    """
+    timings = {}
+    for result in results:
+        key = _case_key(dict(result, transforms=switch_plan.CMDS_TRANSFORMS))
+        transform_mode = result.get("transforms", switch_plan.CMDS_TRANSFORMS)
+        timings.setdefault(key, {})[transform_mode] = result["seconds"]
+
+    speedups = []
+    for key in sorted(timings):
+        cmds_seconds = timings[key].get(switch_plan.CMDS_TRANSFORMS)
+        api_seconds = timings[key].get(switch_plan.API_TRANSFORMS)
+        if not cmds_seconds or not api_seconds:
+            continue
+        speedups.append((key, cmds_seconds, api_seconds,
+                         cmds_seconds / api_seconds))
+
+    return speedups
+
+
+def _key_wave(plugs, frames, step, amplitude, phase=0.0):
+    """Keys a sine wave on the given plugs every step frames.
+    """
+    cmds = switch_backend.get_backend()
+
+    for index, plug in enumerate(plugs):
+        node, attr = plug.split(".")
+        for frame in range(1, frames + 1, step):
+            value = amplitude * math.sin(frame * 0.05 + phase + index)
+            cmds.setKeyframe(node, attribute=attr, time=frame, value=value)
+
+
+def build_space_rig(name, depth, frames, step):
+    """Builds a control under a hierarchy of the given depth, whose parent
+    is constrained to two animated spaces picked by an enum attribute.
+
+    Args:
+        name (str): prefix of the node names.
+        depth (int): number of groups above the control.
+        frames (int): animated range, from frame 1.
+        step (int): frames between keys.
+
+    Returns:
+        dict: space switch preset of the control.
+    """
+    cmds = switch_backend.get_backend()
+
+    root = cmds.group(empty=True, name="{}_root".format(name))
+    parent = root
+    for level in range(depth):
+        parent = cmds.group(empty=True, parent=parent,
+                            name="{}_grp{}".format(name, level))
+        cmds.setAttr("{}.translateX".format(parent), 1.0)
+
+    spaces = []
+    for index in range(2):
+        space = cmds.spaceLocator(name="{}_space{}".format(name, index))[0]
+        cmds.parent(space, root)
+        _key_wave(["{}.translateY".format(space),
+                   "{}.rotateZ".format(space)], frames, step, 2.0, index)
+        spaces.append(space)
+
+    offset = cmds.group(empty=True, parent=parent,
+                        name="{}_offset".format(name))
+    ctl = cmds.circle(name="{}_ctl".format(name),
+                      constructionHistory=False)[0]
+    ctl = cmds.parent(ctl, offset)[0]
+    cmds.addAttr(ctl, longName="space", attributeType="enum",
+                 enumName="space0:space1", keyable=True)
+
+    constraint = cmds.parentConstraint(spaces, offset, maintainOffset=True)[0]
+    weights = cmds.parentConstraint(constraint, query=True,
+                                    weightAliasList=True)
+    for index, weight in enumerate(weights):
+        condition = cmds.createNode("condition",
+                                    name="{}_space{}_cnd".format(name, index))
+        cmds.connectAttr("{}.space".format(ctl),
+                         "{}.firstTerm".format(condition))
+        cmds.setAttr("{}.secondTerm".format(condition), index)
+        cmds.setAttr("{}.colorIfTrueR".format(condition), 1.0)
+        cmds.setAttr("{}.colorIfFalseR".format(condition), 0.0)
+        cmds.connectAttr("{}.outColorR".format(condition),
+                         "{}.{}".format(constraint, weight))
+
+    _key_wave(["{}.{}".format(ctl, channel) for channel in
+               ("translateX", "translateY", "rotateX", "rotateY")],
+              frames, step, 1.0)
+
+    return {"mode": "space switch",
+            "target control": ctl,
+            "source space": ["{}.space".format(ctl), 0],
+            "target space": ["{}.space".format(ctl), 1]}
+
+
+def build_ikfk_rig(name, frames, step):
+    """Builds a three-joint chain blended between fk controls and an ik
+    handle by a 0 (fk) to 1 (ik) switch attribute.
+
+    Args:
+        name (str): prefix of the node names.
+        frames (int): animated range, from frame 1.
+        step (int): frames between keys.
+
+    Returns:
+        dict: ikfk switch preset of the chain.
+    """
+    cmds = switch_backend.get_backend()
+
+    cmds.select(clear=True)
+    joints = [cmds.joint(name="{}_{}_jnt".format(name, part), position=pos)
+              for part, pos in (("shoulder", (0, 0, 0)),
+                                ("elbow", (3, 0, -0.5)),
+                                ("wrist", (6, 0, 0)))]
+    cmds.joint(joints[0], edit=True, orientJoint="xyz",
+               secondaryAxisOrient="yup", children=True,
+               zeroScaleOrient=True)
+
+    switch = cmds.group(empty=True, name="{}_switch".format(name))
+    cmds.addAttr(switch, longName="ikfk", attributeType="double",
+                 minValue=0.0, maxValue=1.0, defaultValue=1.0, keyable=True)
+    reverse = cmds.createNode("reverse", name="{}_ikfk_rev".format(name))
+    cmds.connectAttr("{}.ikfk".format(switch), "{}.inputX".format(reverse))
+
+    # fk controls drive the joints while the switch is 0
+    fk_ctls = []
+    parent = None
+    for jnt in joints:
+        ctl = cmds.group(empty=True,
+                         name=jnt.replace("_jnt", "_fk_ctl"))
+        if parent:
+            ctl = cmds.parent(ctl, parent)[0]
+        cmds.delete(cmds.parentConstraint(jnt, ctl))
+        constraint = cmds.orientConstraint(ctl, jnt, maintainOffset=True)[0]
+        weight = cmds.orientConstraint(constraint, query=True,
+                                       weightAliasList=True)[0]
+        cmds.connectAttr("{}.outputX".format(reverse),
+                         "{}.{}".format(constraint, weight))
+        fk_ctls.append(ctl)
+        parent = ctl
+
+    # the ik handle drives them while the switch is 1
+    handle = cmds.ikHandle(startJoint=joints[0], endEffector=joints[2],
+                           solver="ikRPsolver",
+                           name="{}_ikHandle".format(name))[0]
+    cmds.connectAttr("{}.ikfk".format(switch), "{}.ikBlend".format(handle))
+    ik_wrist = cmds.group(empty=True, name="{}_ik_wrist_ctl".format(name))
+    cmds.delete(cmds.pointConstraint(joints[2], ik_wrist))
+    cmds.parent(handle, ik_wrist)
+    ik_elbow = cmds.spaceLocator(name="{}_ik_elbow_ctl".format(name))[0]
+    cmds.setAttr("{}.translate".format(ik_elbow), 3.0, 0.0, -4.0)
+    cmds.poleVectorConstraint(ik_elbow, handle)
+
+    _key_wave(["{}.rotateY".format(ctl) for ctl in fk_ctls], frames, step,
+              30.0)
+    _key_wave(["{}.translateX".format(ik_wrist),
+               "{}.translateY".format(ik_wrist),
+               "{}.translateY".format(ik_elbow)], frames, step, 1.5)
+
+    return {"mode": "ikfk switch",
+            "shoulder joint": joints[0],
+            "elbow joint": joints[1],
+            "wrist joint": joints[2],
+            "fk shoulder": fk_ctls[0],
+            "fk elbow": fk_ctls[1],
+            "fk wrist": fk_ctls[2],
+            "fk switch": ["{}.ikfk".format(switch), 0.0],
+            "fk visibility": "time1",
+            "ik elbow": ik_elbow,
+            "ik wrist": ik_wrist,
+            "ik switch": ["{}.ikfk".format(switch), 1.0],
+            "ik visibility": "time1"}
+
+
+def build_rigs(controls, depth, chains, frames, step=10):
+    """Builds the synthetic rigs of one benchmark case in a new scene.
+
+    Args:
+        controls (int): number of space switched controls.
+        depth (int): number of groups above each control.
+        chains (int): number of ikfk chains.
+        frames (int): animated range, from frame 1.
+        step (int): frames between keys.
+
+    Returns:
+        tuple: space switch presets and ikfk switch presets.
+    """
+    cmds = switch_backend.get_backend()
+
+    cmds.file(new=True, force=True)
+    cmds.playbackOptions(minTime=1, maxTime=frames)
+    space_presets = [build_space_rig("space{}".format(index), depth, frames,
+                                     step) for index in range(controls)]
+    ikfk_presets = [build_ikfk_rig("arm{}".format(index), frames, step)
+                    for index in range(chains)]
+
+    return space_presets, ikfk_presets
+
+
+def plan_presets(presets, bake_mode, time_range, direction=None):
+    """Compiles the plans of presets in one switch mode, the current frame
+    mode switches in the middle of the time range.
+
+    Args:
+        presets (list): switch presets, all of the same mode.
+        bake_mode (str): one of space_switch_plan.BAKE_MODES.
+        time_range (tuple): first and last frame.
+        direction (str|None): "ikfk" or "fkik" for ikfk switch presets.
+
+    Returns:
+        list: (data, plan) pairs.
+    """
+    cmds = switch_backend.get_backend()
+
+    jobs = []
+    for data in presets:
+        ctls = switch_plan.get_switch_controls(data, direction)
+        keyframes = cmds.keyframe(ctls, query=True, timeChange=True) or []
+        jobs.append((data, switch_plan.plan_switch(
+            data["mode"], bake_mode, keyframes,
+            int((time_range[0] + time_range[1]) / 2), time_range, direction
+        )))
+
+    return jobs
+
+
+def run_suite(controls=4, depth=3, chains=2, frame_counts=DEFAULT_FRAMES,
+              bake_modes=switch_plan.BAKE_MODES, repeats=1, step=10,
+              transform_modes=(switch_plan.CMDS_TRANSFORMS,)):
+    """Times every switch mode on synthetic rigs, for each range length.
+
+    Args:
+        controls (int): number of space switched controls.
+        depth (int): number of groups above each control.
+        chains (int): number of ikfk chains.
+        frame_counts (list): range lengths to time, from frame 1.
+        bake_modes (list): bake modes to time.
+        repeats (int): runs per case, see time_plans.
+        step (int): frames between keys.
+        transform_modes (list): transform modes timed with each engine.
+
+    Returns:
+        list: one result per case, with its "mode", "direction",
+              "bake mode", "engine", "transforms", "frames", "controls",
+              "depth", "chains" and "seconds".
+    """
+    import space_switch_engine as engine
+
+    results = []
+    for frames in frame_counts:
+        space_presets, ikfk_presets = build_rigs(controls, depth, chains,
+                                                 frames, step)
+        cases = [(space_presets, None), (ikfk_presets, "ikfk"),
+                 (ikfk_presets, "fkik")]
+        for bake_mode in bake_modes:
+            for presets, direction in cases:
+                if not presets:
+                    continue
+                jobs = plan_presets(presets, bake_mode, (1, frames),
+                                    direction)
+                engines = [engine.PYTHON_ENGINE]
+                if (direction is None
+                        and bake_mode == switch_plan.BAKE_EVERY_FRAME):
+                    engines.append(engine.NATIVE_ENGINE)
+
+                for bake_engine in engines:
+                    for transform_mode in transform_modes:
+                        seconds = time_plans(jobs, bake_engine, repeats,
+                                             transform_mode)
+                        result = {"mode": presets[0]["mode"],
+                                  "direction": direction,
+                                  "bake mode": bake_mode,
+                                  "engine": bake_engine,
+                                  "transforms": transform_mode,
+                                  "frames": frames,
+                                  "controls": controls,
+                                  "depth": depth,
+                                  "chains": chains,
+                                  "seconds": seconds}
+                        LOGGER.info("%s: %.3fs", _case_key(result), seconds)
+                        results.append(result)
+
+    return results
+
+
+def _case_key(result):
+    """Returns what identifies a benchmark case, to match it in a baseline.
+    """
+    mode = result["mode"]
+    if result["direction"]:
+        mode = "{} {}".format(mode, result["direction"])
+    bake_engine = result["engine"]
+    # results from before the transform modes were all timed with cmds
+    transform_mode = result.get("transforms", switch_plan.CMDS_TRANSFORMS)
+    if transform_mode != switch_plan.CMDS_TRANSFORMS:
+        bake_engine = "{} ({} transforms)".format(bake_engine, transform_mode)
+
+    return "{} | {} | {} | {} frames | {}x{} controls, {} chains".format(
+        mode, result["bake mode"], bake_engine, result["frames"],
+        result["controls"], result["depth"], result["chains"]
+    )
+
+
+def compare_results(results, baseline, tolerance=0.1):
+    """Compares results against a baseline, case by case.
+
+    Args:
+        results (list): see run_suite.
+        baseline (list): results of a previous run.
+        tolerance (float): slowdown ratio above which a case regressed.
+
+    Returns:
+        list: (case, baseline seconds, seconds, ratio) of the regressed
+              cases.
+    """
+    previous = dict((_case_key(result), result["seconds"])
+                    for result in baseline)
+    regressions = []
+    for result in results:
+        key = _case_key(result)
+        if not previous.get(key):
+            continue
+        ratio = result["seconds"] / previous[key]
+        LOGGER.info("%s: %.3fs -> %.3fs (x%.2f)", key, previous[key],
+                    result["seconds"], ratio)
+        if ratio > 1.0 + tolerance:
+            regressions.append((key, previous[key], result["seconds"], ratio))
+
+    return regressions
+
+
+def parse_args(args=None):
+    """Reads the command line options.
+
+    Args:
+        args (list|None): command line arguments, sys.argv if None given.
+
+    Returns:
+        Namespace: parsed options.
+    """
+    parser = argparse.ArgumentParser(
+        description="Times the switch engines on synthetic rigs, or on the "
+                    "presets of a scene."
+    )
+    parser.add_argument("scene", nargs="?", default=None,
+                        help="scene file to switch, synthetic rigs are "
+                             "built if not given.")
+    parser.add_argument("-p", "--preset", dest="presets", action="append",
+                        default=[],
+                        help="space switch preset JSON file of the scene, "
+                             "repeatable.")
+    parser.add_argument("--backend", default=switch_backend.MAYA_BACKEND,
+                        choices=switch_backend.BACKENDS,
+                        help="scene the synthetic rigs are built in.")
+    parser.add_argument("--transforms", nargs="+", default=None,
+                        choices=switch_plan.TRANSFORM_MODES,
+                        help="how the controls are posed, both are timed "
+                             "and compared by default under maya.")
+    parser.add_argument("-r", "--range", nargs=2, type=float, default=None,
+                        metavar=("START", "END"),
+                        help="time range to bake in the scene.")
+    parser.add_argument("--controls", type=int, default=4,
+                        help="space switched controls of the synthetic rigs.")
+    parser.add_argument("--depth", type=int, default=3,
+                        help="groups above each synthetic control.")
+    parser.add_argument("--chains", type=int, default=2,
+                        help="ikfk chains of the synthetic rigs.")
+    parser.add_argument("--frames", nargs="+", type=int,
+                        default=list(DEFAULT_FRAMES),
+                        help="range lengths timed on the synthetic rigs.")
+    parser.add_argument("--bake-modes", nargs="+",
+                        default=list(switch_plan.BAKE_MODES),
+                        choices=switch_plan.BAKE_MODES,
+                        help="bake modes timed on the synthetic rigs.")
+    parser.add_argument("-n", "--repeats", type=int, default=1,
+                        help="runs per case, the fastest is kept.")
+    parser.add_argument("-o", "--output", default=None,
+                        help="writes the results to this JSON file.")
+    parser.add_argument("-b", "--baseline", default=None,
+                        help="results file to compare against.")
+    parser.add_argument("-t", "--tolerance", type=float, default=0.1,
+                        help="slowdown ratio counted as a regression.")
+
+    return parser.parse_args(args)
+
+
+def main(args=None):
+    """Entry point.
+
+    Args:
+        args (list|None): command line arguments, sys.argv if None given.
+
+    Returns:
+        int: 0 if successful, 1 if it failed or any case regressed.
+    """
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    options = parse_args(args)
+    if options.scene and not (options.presets and options.range):
+        LOGGER.error("A scene needs --preset and --range!")
+        return 1
+    memory = options.backend == switch_backend.MEMORY_BACKEND
+    if options.scene and memory:
+        LOGGER.error("A scene can only be opened by the maya backend!")
+        return 1
+    if memory and switch_plan.API_TRANSFORMS in (options.transforms or ()):
+        LOGGER.error("The memory backend has no OpenMaya!")
+        return 1
+    transform_modes = options.transforms
+    if not transform_modes:
+        transform_modes = ([switch_plan.CMDS_TRANSFORMS] if memory
+                           else list(switch_plan.TRANSFORM_MODES))
+
+    presets = []
+    for path in options.presets:
+        with open(path) as in_file:
+            presets.append(json.load(in_file))
+
+    if memory:
+        cmds = switch_backend.use_memory()
+    else:
+        import maya.standalone
+        maya.standalone.initialize(name="python")
+        cmds = switch_backend.use_maya()
+    import space_switch_engine as engine
+
+    if options.scene:
+        cmds.file(options.scene, open=True, force=True)
+        for data in presets:
+            if not engine.validate_switch_data(data, "space switch"):
+                LOGGER.error("A preset does not match the scene!")
+                return 1
+
+        frames = int(options.range[1] - options.range[0]) + 1
+        timings = compare_bake_engines(presets, tuple(options.range),
+                                       options.repeats, transform_modes)
+        results = []
+        for (bake_engine, transform_mode), seconds in sorted(
+                timings.items()):
+            LOGGER.info("%s, %s transforms: %.3fs (%.2fms per frame)",
+                        bake_engine, transform_mode, seconds,
+                        seconds * 1000.0 / frames)
+            results.append({"mode": "space switch", "direction": None,
+                            "bake mode": switch_plan.BAKE_EVERY_FRAME,
+                            "engine": bake_engine,
+                            "transforms": transform_mode, "frames": frames,
+                            "controls": len(presets), "depth": None,
+                            "chains": 0, "seconds": seconds,
+                            "scene": options.scene})
+    else:
+        results = run_suite(options.controls, options.depth, options.chains,
+                            options.frames, options.bake_modes,
+                            options.repeats, transform_modes=transform_modes)
+
+    for key, cmds_seconds, api_seconds, speedup in compare_transform_modes(
+            results):
+        LOGGER.info("%s: %.3fs with cmds, %.3fs with api (x%.2f faster)",
+                    key, cmds_seconds, api_seconds, speedup)
+
+    if options.output:
+        with open(options.output, "w") as out_file:
+            json.dump({"version": RESULTS_VERSION,
+                       "backend": options.backend,
+                       "maya": cmds.about(version=True),
+                       "platform": platform.platform(),
+                       "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+                       "results": results}, out_file, indent=4)
+
+    if options.baseline:
+        with open(options.baseline) as in_file:
+            baseline = json.load(in_file)
+        if (baseline.get("backend", switch_backend.MAYA_BACKEND)
+                != options.backend):
+            LOGGER.error("The baseline was not timed on the %s backend!",
+                         options.backend)
+            return 1
+        regressions = compare_results(results, baseline["results"],
+                                      options.tolerance)
+        for key, before, after, ratio in regressions:
+            LOGGER.error("Regressed: %s, %.3fs -> %.3fs (x%.2f)", key,
+                         before, after, ratio)
+        if regressions:
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
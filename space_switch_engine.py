@@ -0,0 +1,2069 @@
+"""
+MODULE: space_switch_engine
+
+Scene-side helpers used by the space switch tool that do not depend on the UI.
+Maya is not needed to import it, see space_switch_backend to run it on another
+scene backend.
+
+FUNCTIONS:
+    validate_switch_data: checks a preset against the scene.
+    get_switch_nodes: scene node each key of a preset refers to.
+    bind_switch_data: records the node uuids of a preset.
+    resolve_switch_nodes: finds the nodes of a preset by uuid or name.
+    get_plug: resolves a node attribute into an OpenMaya plug.
+    sample_matrices: evaluates matrix attributes at arbitrary times.
+    sample_world_transforms: world position and rotation at arbitrary times.
+    sample_ikfk_chain: world transforms of a three-joint chain over a range.
+    sample_ikfk_chains: sample_ikfk_chain for many chains in one pass.
+    chain_pole_vectors: ik elbow positions of sampled joint chains.
+    matrix_to_world_transform: converts a world matrix into xform values.
+    solve_constraint: matches a node to another without building a constraint.
+    offset_world_transform: world transform of a node from its driver's.
+    measure_offsets: rigid offsets between drivers and driven nodes.
+    measure_chain: bone lengths and reach of a three-joint chain.
+    check_ikfk_pose: checks if an ikfk preset can be calibrated on a frame.
+    calibrate_ikfk: measures the joint to control offsets of an ikfk preset.
+    is_ikfk_calibration: checks if an ikfk calibration is complete.
+    get_ikfk_calibration: cached ikfk calibration, measured on first use.
+    get_local_transform: local translate and rotate values of a transform.
+    can_solve_offline: checks if a node's local values can be solved in memory.
+    solve_local_transforms: local values of a node from sampled matrices.
+    write_curve_keys: writes all the keys of one anim curve in one pass.
+    apply_world_transform: moves a node to a world position and rotation.
+    hold_space: buffers keys that hold a control and its space on one frame.
+    bake_space_frames: keys a control so it keeps the given world matrices.
+    bake_controls: bake_space_frames for many controls at once.
+    get_pole_distance: pole vector distance of an ikfk preset.
+    solve_ik_to_fk: fk control rotations matching a sampled joint chain.
+    solve_fk_to_ik: ik control transforms matching a sampled joint chain.
+    apply_ik_to_fk: keys the fk controls and switch on one frame.
+    apply_fk_to_ik: keys the ik controls and switch on one frame.
+    execute_plan: runs a switch plan compiled by space_switch_plan.
+    execute_plans: runs many switch plans sharing one sampling pass.
+    get_matrix_cache: shared MatrixCache used by sample_matrices.
+    release_matrix_cache: removes the shared MatrixCache and its callbacks.
+    clear_caches: forgets the nodes, calibrations and matrices cached so far.
+
+CLASSES:
+    AnimCurveWriter: collects the keys of a bake and writes them per curve.
+    ApiTransforms: reads and poses transforms through OpenMaya 2.0.
+    MatrixCache: LRU cache of sampled matrices, dropped as their inputs change.
+    PerformanceContext: quiets the scene and UI while a switch runs.
+"""
+
+__author__ = "Te Ling (Danny) Hsu"
+__copyright__ = "Copyright (c) 2020 Te Ling (Danny) Hsu"
+__license__ = "MIT License"
+__version__ = "1.0.0"
+
+import sys
+import math
+import logging
+from functools import partial
+from collections import OrderedDict
+
+try:
+    import maya.cmds as cmds
+    import maya.api.OpenMaya as om
+except ImportError: # outside of Maya, see space_switch_backend.set_backend
+    cmds = None
+    om = None
+
+import space_switch_math as switch_math
+import space_switch_plan as switch_plan
+import space_switch_profile as switch_profile
+
+
+LOGGER = logging.getLogger(__name__)
+
+try:
+    STRING_TYPES = (basestring,)
+except NameError: # python 3
+    STRING_TYPES = (str,)
+
+TRANSLATE_CHANNELS = ("translateX", "translateY", "translateZ")
+ROTATE_CHANNELS = ("rotateX", "rotateY", "rotateZ")
+
+POLE_DISTANCE = switch_math.POLE_DISTANCE
+
+# these have to be zeroed for the offline solver to match cmds.xform
+OFFSET_ATTRS = ("rotatePivot", "rotatePivotTranslate", "scalePivot",
+                "scalePivotTranslate", "shear")
+
+# ikfk preset keys: (control, joint it is matched to, switch it is measured in)
+IKFK_CALIBRATION_PAIRS = (("fk shoulder", "shoulder joint", "fk switch"),
+                          ("fk elbow", "elbow joint", "fk switch"),
+                          ("fk wrist", "wrist joint", "fk switch"),
+                          ("ik wrist", "wrist joint", "ik switch"))
+
+# relative tolerance of the bone lengths and reach, see check_ikfk_pose
+IKFK_POSE_TOLERANCE = 1e-3
+
+# ikfk calibrations measured in this session, see get_ikfk_calibration
+_CALIBRATION_CACHE = {}
+
+# preset nodes found by uuid, see resolve_switch_nodes
+_NODE_HANDLES = {}
+
+# shared matrix cache, see get_matrix_cache
+_MATRIX_CACHE = None
+
+# how bake every frame space switches are keyed, see execute_plans
+PYTHON_ENGINE = "python" # solved in memory, keyed by AnimCurveWriter
+NATIVE_ENGINE = "bakeResults" # driven by a proxy, keyed by cmds.bakeResults
+BAKE_ENGINES = (PYTHON_ENGINE, NATIVE_ENGINE)
+
+
+def validate_switch_data(switch_data, switch_mode="space switch"):
+    """Validates a space switch or ikfk switch preset, checks that all the
+    keys are there and that its nodes and attributes exist in the scene. The
+    nodes are found with resolve_switch_nodes, in one pass for the whole
+    preset.
+
+    TODO: need to have a more thorough check to see if all keys & values
+          are correct (right now it does not do that)
+
+    Args:
+        switch_data (dict): the preset to check.
+        switch_mode (str): "space switch" or "ikfk switch".
+
+    Returns:
+        bool: True if successful, False otherwise.
+    """
+    if switch_mode == "space switch":
+        std_keys = ["mode", "target control", "source space", "target space"]
+        attr_keys = ["source space", "target space"]
+        # node uuids
+        optional_keys = ["nodes"]
+    else: # switch_mode == "ikfk switch"
+        std_keys = ["mode", "shoulder joint", "elbow joint", "wrist joint",
+                    "fk shoulder", "fk elbow", "fk wrist", "fk switch",
+                    "fk visibility", "ik elbow", "ik wrist", "ik switch",
+                    "ik visibility"]
+        attr_keys = ["fk switch", "ik switch"] # TODO: future optional visibility switch, ignore for now
+                     # "fk visibility", "ik visibility" <-- ignore these for now
+        # node uuids, measured offsets and pole vector distance
+        optional_keys = ["nodes", "calibration", "pole distance"]
+
+    # check if the keys are correct!
+    if (not set(switch_data.keys()) - set(optional_keys) == set(std_keys)):
+        return False
+
+    for key, value in switch_data.items():
+        if key == "nodes":
+            # [uuid, namespace] keyed by preset key, see bind_switch_data
+            if not isinstance(value, dict) or not all(
+                    isinstance(node, list) and len(node) == 2
+                    and all(isinstance(item, STRING_TYPES) for item in node)
+                    for node in value.values()):
+                return False
+            continue
+
+        if key == "calibration":
+            # offset matrices keyed by control, see calibrate_ikfk
+            if not is_ikfk_calibration(value):
+                return False
+            continue
+
+        if key == "pole distance":
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                return False
+            continue
+
+        if not value: # check if any user input is empty
+            return False
+
+        if key in attr_keys:
+            if not (isinstance(value, list) and len(value) == 2
+                    and isinstance(value[0], STRING_TYPES)
+                    and value[0].count(".") == 1):
+                return False
+        elif not isinstance(value, STRING_TYPES):
+            return False
+        elif key == "mode" and value not in ["space switch", "ikfk switch"]:
+            return False
+
+    # check if the nodes still exist in the scene
+    nodes = resolve_switch_nodes(switch_data)
+    if nodes is None:
+        return False
+
+    # check if the attributes still exist
+    for key in attr_keys:
+        node, attr = switch_data[key][0].split(".")
+        if om is None: # no API, the nodes are names
+            if not cmds.attributeQuery(attr, node=node, exists=True):
+                return False
+        elif not om.MFnDependencyNode(
+                nodes[key].object()).hasAttribute(attr):
+            return False
+
+    # all user inputs are still valid
+    return True
+
+
+def get_switch_nodes(data):
+    """Returns the scene node each key of a preset refers to, by name.
+
+    Args:
+        data (dict): space switch or ikfk switch data.
+
+    Returns:
+        dict: {key: node name}, attribute keys give the node of the attribute.
+    """
+    nodes = {}
+    for key, value in data.items():
+        if key == "mode":
+            continue
+        if isinstance(value, STRING_TYPES):
+            nodes[key] = value
+        elif (isinstance(value, list) and value
+                and isinstance(value[0], STRING_TYPES)):
+            nodes[key] = value[0].split(".")[0]
+
+    return nodes
+
+
+def _get_node_name(obj):
+    """Returns the shortest unique name of a node.
+    """
+    if obj.hasFn(om.MFn.kDagNode):
+        return om.MFnDagNode(obj).partialPathName()
+
+    return om.MFnDependencyNode(obj).name()
+
+
+def _get_namespace(node):
+    """Returns the namespace of a node name, without the leading colon.
+    """
+    return node.split("|")[-1].rpartition(":")[0]
+
+
+def bind_switch_data(data):
+    """Records the uuid and namespace of every node of a preset under its
+    "nodes" key, so the preset still finds them once renamed or referenced
+    under another namespace, see resolve_switch_nodes.
+
+    Args:
+        data (dict): space switch or ikfk switch data, edited in place. Its
+                     nodes must exist in the scene.
+    """
+    bound = {}
+    for key, node in get_switch_nodes(data).items():
+        if om is None: # no API, see space_switch_backend
+            bound[key] = [cmds.ls(node, uuid=True)[0], _get_namespace(node)]
+            continue
+        sel = om.MSelectionList()
+        sel.add(node)
+        fn = om.MFnDependencyNode(sel.getDependNode(0))
+        bound[key] = [fn.uuid().asString(), fn.namespace]
+
+    data["nodes"] = bound
+
+
+def resolve_switch_nodes(data):
+    """Finds the nodes of a preset in the scene. Nodes bound by
+    bind_switch_data are looked up by uuid with a single cmds.ls call, the
+    namespace picks between several references of the same rig, and their
+    current names are written back into the preset. The rest are looked up
+    by name. Found nodes are kept as MObjectHandles in _NODE_HANDLES, which
+    stop being valid once the nodes are deleted or another scene is opened.
+
+    Args:
+        data (dict): space switch or ikfk switch data, node names are
+                     updated in place.
+
+    Returns:
+        dict|None: {key: MObjectHandle}, see get_switch_nodes, or {key: node
+                   name} on a backend without OpenMaya. None if any node is
+                   missing.
+    """
+    if om is None:
+        return _resolve_switch_nodes_cmds(data)
+
+    names = get_switch_nodes(data)
+    bound = data.get("nodes") or {}
+    handles = {}
+
+    # nodes found before, as long as they were not deleted since
+    for key in names:
+        handle = _NODE_HANDLES.get(tuple(bound.get(key, ())))
+        if handle is not None and handle.isValid():
+            handles[key] = handle
+
+    # the rest of the bound nodes in one go
+    uuids = set(bound[key][0] for key in names
+                if key in bound and key not in handles)
+    found = {} # {uuid: [(namespace, MObjectHandle), ...]}
+    for node in (cmds.ls(list(uuids), long=True) if uuids else []):
+        sel = om.MSelectionList()
+        sel.add(node)
+        obj = sel.getDependNode(0)
+        fn = om.MFnDependencyNode(obj)
+        found.setdefault(fn.uuid().asString(), []).append(
+            (fn.namespace, om.MObjectHandle(obj))
+        )
+
+    for key, name in names.items():
+        if key in handles:
+            continue
+
+        if key in bound:
+            uuid, namespace = bound[key]
+            matches = found.get(uuid, [])
+            if len(matches) > 1: # same rig referenced more than once
+                matches = [match for match in matches if match[0] == namespace]
+            if len(matches) == 1:
+                handles[key] = matches[0][1]
+                _NODE_HANDLES[(uuid, namespace)] = matches[0][1]
+                continue
+
+        # not bound, or the bound node is gone, find it by name
+        sel = om.MSelectionList()
+        try:
+            sel.add(name)
+        except RuntimeError: # node does not exist
+            return None
+        handles[key] = om.MObjectHandle(sel.getDependNode(0))
+
+    _follow_renames(data, dict((key, _get_node_name(handle.object()))
+                               for key, handle in handles.items()))
+
+    return handles
+
+
+def _resolve_switch_nodes_cmds(data):
+    """Same as resolve_switch_nodes with cmds.ls only, for backends without
+    OpenMaya. Returns {key: node name}, or None if any node is missing.
+    """
+    names = get_switch_nodes(data)
+    bound = data.get("nodes") or {}
+    uuids = set(bound[key][0] for key in names if key in bound)
+    found = {} # {uuid: [(namespace, long name), ...]}
+    for node in (cmds.ls(list(uuids), long=True) if uuids else []):
+        found.setdefault(cmds.ls(node, uuid=True)[0], []).append(
+            (_get_namespace(node), node)
+        )
+
+    nodes = {}
+    for key, name in names.items():
+        matches = []
+        if key in bound:
+            uuid, namespace = bound[key]
+            matches = found.get(uuid, [])
+            if len(matches) > 1: # same rig referenced more than once
+                matches = [match for match in matches if match[0] == namespace]
+        if len(matches) == 1:
+            nodes[key] = cmds.ls(matches[0][1])[0]
+            continue
+
+        # not bound, or the bound node is gone, find it by name
+        matches = cmds.ls(name)
+        if not matches:
+            return None
+        nodes[key] = matches[0]
+
+    _follow_renames(data, nodes)
+
+    return nodes
+
+
+def _follow_renames(data, names):
+    """Writes the current names of the nodes of a preset back into it.
+    """
+    for key, name in names.items():
+        if name == get_switch_nodes({key: data[key]}).get(key):
+            continue
+        if isinstance(data[key], list):
+            attr = data[key][0].split(".", 1)[1]
+            data[key] = ["{}.{}".format(name, attr)] + data[key][1:]
+        else:
+            data[key] = name
+
+
+def get_plug(node, attr):
+    """Takes a node and an attribute name and returns its MPlug. The first
+    element is returned for array attributes like worldMatrix.
+
+    Args:
+        node (str): any dependency node.
+        attr (str): attribute name, e.g. "worldMatrix".
+
+    Returns:
+        MPlug: plug of the given attribute.
+    """
+    sel = om.MSelectionList()
+    sel.add(node)
+    plug = om.MFnDependencyNode(sel.getDependNode(0)).findPlug(attr, False)
+    if plug.isArray:
+        plug = plug.elementByLogicalIndex(0)
+
+    return plug
+
+
+@switch_profile.profiled("sampling")
+def sample_matrices(node_attrs, times, use_context=True, cache=None):
+    """Evaluates matrix attributes at the given times without moving the
+    current time, so the scene and viewport do not have to update per frame.
+
+    Args:
+        node_attrs (list): (node, attribute) pairs, e.g.
+                           [("arm_ctl", "worldMatrix")].
+        times (list): frame numbers to evaluate.
+        use_context (bool): evaluates with OpenMaya DG contexts if True,
+                            uses cmds.getAttr(time=) otherwise, or on a
+                            backend without OpenMaya.
+        cache (MatrixCache|None|bool): only the matrices missing from it
+                                       are evaluated, the shared cache is
+                                       used if None given and disabled if
+                                       False given.
+
+    Returns:
+        dict: {(node, attribute): [matrix, ...]}, each matrix is a list of
+              16 floats, listed in the same order as times.
+    """
+    samples = dict((pair, []) for pair in node_attrs)
+    if not node_attrs or not times:
+        return samples
+
+    if cache is None:
+        cache = _MATRIX_CACHE
+    elif cache is False:
+        cache = None
+    if cache is not None:
+        cache.watch(node_attrs)
+        for pair in node_attrs:
+            samples[pair] = [cache.get(pair[0], pair[1], time)
+                             for time in times]
+        missing = set((pair, time) for pair in node_attrs
+                      for time, matrix in zip(times, samples[pair])
+                      if matrix is None)
+        if missing:
+            missing_pairs = sorted(set(pair for pair, time in missing))
+            missing_times = sorted(set(time for pair, time in missing))
+            new_samples = sample_matrices(missing_pairs, missing_times,
+                                          use_context, cache=False)
+            for pair in missing_pairs:
+                new_matrices = dict(zip(missing_times, new_samples[pair]))
+                for time, matrix in new_matrices.items():
+                    cache.add(pair[0], pair[1], time, matrix)
+                samples[pair] = [matrix or new_matrices[time] for time, matrix
+                                 in zip(times, samples[pair])]
+        return samples
+
+    if use_context and om is not None:
+        plugs = [(pair, get_plug(*pair)) for pair in node_attrs]
+        unit = om.MTime.uiUnit()
+        for time in times:
+            context = om.MDGContext(om.MTime(time, unit))
+            for pair, plug in plugs:
+                data = om.MFnMatrixData(plug.asMObject(context))
+                samples[pair].append(list(data.matrix()))
+    else:
+        for node, attr in node_attrs:
+            plug = "{}.{}".format(node, attr)
+            if cmds.attributeQuery(attr, node=node, multi=True):
+                plug += "[0]"
+            for time in times:
+                samples[(node, attr)].append(cmds.getAttr(plug, time=time))
+
+    return samples
+
+
+def matrix_to_world_transform(matrix, rotate_order=0):
+    """Takes a world matrix and returns the world position and rotation the
+    same way cmds.xform(query=True, worldSpace=True) reports them.
+
+    Args:
+        matrix (list): 16 floats.
+        rotate_order (int): rotate order of the node, 0 (xyz) to 5 (zyx).
+
+    Returns:
+        tuple: world position and rotation (in degrees).
+    """
+    return switch_math.matrix_to_world_transform(matrix, rotate_order)
+
+
+def sample_world_transforms(nodes, times, use_context=True):
+    """Samples the world position and rotation of transform nodes at the given
+    times in one pass. This is the bulk equivalent of querying
+    cmds.xform(worldSpace=True) after cmds.currentTime on every frame.
+
+    Args:
+        nodes (list): transform nodes.
+        times (list): frame numbers to evaluate.
+        use_context (bool): see sample_matrices.
+
+    Returns:
+        dict: {node: [(pos, rot), ...]} in the same order as times.
+    """
+    pairs = [(node, "worldMatrix") for node in nodes]
+    samples = sample_matrices(pairs, times, use_context)
+
+    transforms = {}
+    for node, attr in pairs:
+        rotate_order = cmds.getAttr("{}.rotateOrder".format(node))
+        transforms[node] = [matrix_to_world_transform(matrix, rotate_order)
+                            for matrix in samples[(node, attr)]]
+
+    return transforms
+
+
+def sample_ikfk_chain(shoulder_jnt, elbow_jnt, wrist_jnt, times,
+                      use_context=True):
+    """Samples the world transforms of an ik/fk joint chain for a whole frame
+    list at once.
+
+    Args:
+        shoulder_jnt (str): shoulder joint.
+        elbow_jnt (str): elbow joint.
+        wrist_jnt (str): wrist joint.
+        times (list): frame numbers to evaluate.
+        use_context (bool): see sample_matrices.
+
+    Returns:
+        list: one (shoulder, elbow, wrist) tuple per frame, each item is a
+              (pos, rot) pair in world space.
+    """
+    return sample_ikfk_chains([(shoulder_jnt, elbow_jnt, wrist_jnt)], times,
+                              use_context)[0]
+
+
+def sample_ikfk_chains(chains, times, use_context=True):
+    """Samples the world transforms of many ik/fk joint chains, e.g. all four
+    limbs, in a single pass.
+
+    Args:
+        chains (list): (shoulder, elbow, wrist) joints of each chain.
+        times (list): frame numbers to evaluate.
+        use_context (bool): see sample_matrices.
+
+    Returns:
+        list: per chain, the same list sample_ikfk_chain returns.
+    """
+    joints = []
+    for chain in chains:
+        joints.extend(jnt for jnt in chain if jnt not in joints)
+    transforms = sample_world_transforms(joints, times, use_context)
+
+    return [list(zip(*[transforms[jnt] for jnt in chain])) for chain in chains]
+
+
+def chain_pole_vectors(chains, distance=POLE_DISTANCE):
+    """Computes the ik elbow position of every sampled chain in one go.
+
+    Args:
+        chains (list): (shoulder, elbow, wrist) transforms, as returned by
+                       sample_ikfk_chain.
+        distance (float): see space_switch_math.solve_pole_vectors.
+
+    Returns:
+        list: ik elbow positions in world space, one per chain.
+    """
+    if not chains:
+        return []
+
+    positions = [[transform[0] for transform in joints]
+                 for joints in zip(*chains)]
+
+    return switch_math.solve_pole_vectors(positions[0], positions[1],
+                                          positions[2], distance)
+
+
+@switch_profile.profiled("constrain")
+def solve_constraint(driver, driven, constraint_type="parentConstraint",
+                     time=None):
+    """Computes where a constraint with maintainOffset=False would put the
+    driven node, straight from the driver's world matrix. Nothing is created
+    in the scene and the current time is not changed.
+
+    Args:
+        driver (str): a parent transform node.
+        driven (str): a child transform node.
+        constraint_type (str): parentConstraint, pointConstraint or
+                               orientConstraint.
+        time (int|float|None): frame to evaluate, current frame if None.
+
+    Returns:
+        tuple: world position and rotation of the driven node, rotation is in
+               the driven node's rotate order.
+    """
+    if constraint_type not in ("parentConstraint", "pointConstraint",
+                               "orientConstraint"):
+        raise ValueError("Unsupported constraint type: {}".format(
+            constraint_type
+        ))
+
+    kwargs = {} if time is None else {"time": time}
+    driver_matrix = cmds.getAttr("{}.worldMatrix[0]".format(driver), **kwargs)
+    rotate_order = cmds.getAttr("{}.rotateOrder".format(driven))
+    pos, rot = matrix_to_world_transform(
+        switch_math.constrain_matrix(driver_matrix), rotate_order
+    )
+
+    # point and orient constraints leave the other half untouched
+    if constraint_type != "parentConstraint":
+        driven_matrix = cmds.getAttr("{}.worldMatrix[0]".format(driven),
+                                     **kwargs)
+        driven_pos, driven_rot = matrix_to_world_transform(driven_matrix,
+                                                           rotate_order)
+        if constraint_type == "pointConstraint":
+            rot = driven_rot
+        else:
+            pos = driven_pos
+
+    return pos, rot
+
+
+def offset_world_transform(driver, driven, transform, offset_matrix):
+    """Takes the world transform of a driver and returns the world transform
+    of the driven node sitting at the given rigid offset from it.
+
+    Args:
+        driver (str): a transform node, e.g. a joint.
+        driven (str): a transform node, e.g. the control matched to it.
+        transform (tuple): world position and rotation of the driver, as
+                           returned by sample_world_transforms.
+        offset_matrix (list): offset measured by measure_offsets.
+
+    Returns:
+        tuple: world position and rotation of the driven node, rotation is in
+               the driven node's rotate order.
+    """
+    driver_matrix = switch_math.transform_to_matrix(
+        transform[0], transform[1],
+        cmds.getAttr("{}.rotateOrder".format(driver))
+    )
+
+    return matrix_to_world_transform(
+        switch_math.constrain_matrix(driver_matrix, offset_matrix),
+        cmds.getAttr("{}.rotateOrder".format(driven))
+    )
+
+
+def measure_offsets(pairs, switch_attr=None, switch_value=None):
+    """Measures the rigid offset of each driven node relative to its driver
+    on the current frame. The switch attribute is set to the given value
+    while measuring and restored afterwards.
+
+    Args:
+        pairs (list): (driver, driven) transform node pairs.
+        switch_attr (str|None): node.attribute that puts the rig in the mode
+                                the offsets are measured in.
+        switch_value (type): value of the switch attribute.
+
+    Returns:
+        dict: {(driver, driven): offset matrix as 16 floats}.
+    """
+    if switch_attr:
+        orig_value = cmds.getAttr(switch_attr)
+        cmds.setAttr(switch_attr, switch_value)
+
+    offsets = {}
+    try:
+        for driver, driven in pairs:
+            offsets[(driver, driven)] = switch_math.measure_offset(
+                cmds.getAttr("{}.worldMatrix[0]".format(driver)),
+                cmds.getAttr("{}.worldMatrix[0]".format(driven))
+            )
+    finally:
+        if switch_attr:
+            cmds.setAttr(switch_attr, orig_value)
+
+    return offsets
+
+
+def _distance(position, other):
+    """Returns the distance between two positions.
+    """
+    return math.sqrt(sum((value - other_value) ** 2
+                         for value, other_value in zip(position, other)))
+
+
+def measure_chain(joints, switch_attr=None, switch_value=None):
+    """Measures a three-joint chain on the current frame. The switch attribute
+    is set to the given value while measuring and restored afterwards, see
+    measure_offsets.
+
+    Args:
+        joints (list): shoulder, elbow and wrist joints.
+        switch_attr (str|None): node.attribute that puts the rig in the mode
+                                the chain is measured in.
+        switch_value (type): value of the switch attribute.
+
+    Returns:
+        tuple: upper bone length, lower bone length, and the distance from
+               the shoulder to the wrist.
+    """
+    if switch_attr:
+        orig_value = cmds.getAttr(switch_attr)
+        cmds.setAttr(switch_attr, switch_value)
+
+    try:
+        shoulder, elbow, wrist = [
+            cmds.getAttr("{}.worldMatrix[0]".format(jnt))[12:15]
+            for jnt in joints
+        ]
+    finally:
+        if switch_attr:
+            cmds.setAttr(switch_attr, orig_value)
+
+    return (_distance(shoulder, elbow), _distance(elbow, wrist),
+            _distance(shoulder, wrist))
+
+
+def check_ikfk_pose(data, tolerance=IKFK_POSE_TOLERANCE):
+    """Checks if the ik offsets of an ikfk preset can be measured on the
+    current frame. In ik mode the bones must keep their fk lengths, a
+    stretched chain is not at the same offset from its controls on every
+    frame, and the chain must not be straight, the wrist stops short of the
+    ik wrist control once it is out of reach.
+
+    Args:
+        data (dict): ikfk switch data.
+        tolerance (float): relative to the bone lengths.
+
+    Returns:
+        str|None: what is wrong with the pose, None if it can be measured.
+    """
+    joints = [data["shoulder joint"], data["elbow joint"],
+              data["wrist joint"]]
+    fk_lengths = measure_chain(joints, *data["fk switch"])[:2]
+    upper, lower, reach = measure_chain(joints, *data["ik switch"])
+
+    if min(fk_lengths) <= switch_math.EPSILON:
+        return "a bone of the chain has no length"
+    for length, fk_length in zip((upper, lower), fk_lengths):
+        if abs(length - fk_length) > tolerance * fk_length:
+            return "the ik chain is stretched"
+    if reach >= (upper + lower) * (1.0 - tolerance):
+        return "the ik chain is straight, the ik wrist may be out of reach"
+
+    return None
+
+
+def calibrate_ikfk(data):
+    """Measures the offsets between the joints of an ikfk preset and the
+    controls matched to them. FK controls are measured in fk mode and the
+    ik wrist in ik mode, these offsets are constant for a given rig.
+
+    The offsets are measured on the current frame if check_ikfk_pose passes
+    there, on the first key of the ik controls that passes otherwise.
+
+    Args:
+        data (dict): ikfk switch data.
+
+    Returns:
+        dict: {control key: offset matrix}, e.g. {"ik wrist": [...]}.
+
+    Raises:
+        ValueError: if no frame tried has a pose that can be measured.
+    """
+    current_frame = cmds.currentTime(query=True)
+    problem = check_ikfk_pose(data)
+    try:
+        if problem:
+            # look for a pose that can be measured on the ik control keys
+            frames = cmds.keyframe(data["ik wrist"], data["ik elbow"],
+                                   query=True, timeChange=True) or []
+            for frame in sorted(set(frames)):
+                cmds.currentTime(frame, edit=True)
+                if check_ikfk_pose(data) is None:
+                    break
+            else:
+                raise ValueError(
+                    "Cannot calibrate {}: {} on frame {} and on every key "
+                    "of its ik controls!".format(data["wrist joint"],
+                                                 problem, current_frame)
+                )
+            LOGGER.warning("%s on frame %s, calibrating %s on frame %s",
+                           problem, current_frame, data["wrist joint"],
+                           frame)
+
+        calibration = {}
+        for switch_key in ["fk switch", "ik switch"]:
+            keys = [(ctl_key, jnt_key) for ctl_key, jnt_key, key
+                    in IKFK_CALIBRATION_PAIRS if key == switch_key]
+            offsets = measure_offsets([(data[jnt_key], data[ctl_key])
+                                       for ctl_key, jnt_key in keys],
+                                      *data[switch_key])
+            for ctl_key, jnt_key in keys:
+                calibration[ctl_key] = offsets[(data[jnt_key],
+                                                data[ctl_key])]
+    finally:
+        if problem:
+            cmds.currentTime(current_frame, edit=True)
+
+    return calibration
+
+
+def is_ikfk_calibration(calibration):
+    """Checks if a calibration has an offset matrix for every control of
+    IKFK_CALIBRATION_PAIRS, and nothing else.
+
+    Args:
+        calibration (dict): see calibrate_ikfk.
+
+    Returns:
+        bool: True if it is complete, False otherwise.
+    """
+    if not isinstance(calibration, dict):
+        return False
+    if set(calibration) != set(pair[0] for pair in IKFK_CALIBRATION_PAIRS):
+        return False
+
+    return all(isinstance(matrix, list) and len(matrix) == 16
+               for matrix in calibration.values())
+
+
+def _calibration_cache_key(data):
+    """Returns a hashable key made of the nodes and switches of an ikfk preset.
+    """
+    return tuple((key, str(data[key])) for key in sorted(
+        set(key for pair in IKFK_CALIBRATION_PAIRS for key in pair)
+    ))
+
+
+@switch_profile.profiled("calibration")
+def get_ikfk_calibration(data):
+    """Returns the calibration of an ikfk preset. Uses the one stored in the
+    preset if there is one, then the one measured earlier in this session,
+    and calibrates the rig otherwise. The result is stored back in the
+    preset under "calibration", so it is saved along with it. Incomplete
+    calibrations, e.g. from an older preset, are measured again.
+
+    Args:
+        data (dict): ikfk switch data.
+
+    Returns:
+        dict: {control key: offset matrix}, see calibrate_ikfk.
+    """
+    cache_key = _calibration_cache_key(data)
+    calibration = data.get("calibration")
+    if not is_ikfk_calibration(calibration):
+        calibration = _CALIBRATION_CACHE.get(cache_key)
+    if not calibration:
+        LOGGER.info("Calibrating ikfk offsets of %s", data["wrist joint"])
+        calibration = calibrate_ikfk(data)
+
+    _CALIBRATION_CACHE[cache_key] = calibration
+    data["calibration"] = calibration
+
+    return calibration
+
+
+def get_local_transform(node, transforms=None):
+    """Takes one transform node and returns its local translate and rotate
+    values at the current time.
+
+    Args:
+        node (str): a transform node.
+        transforms (ApiTransforms|None): reads the node through OpenMaya,
+                                         uses cmds.getAttr if None given.
+
+    Returns:
+        tuple: local translate and rotate values.
+    """
+    if transforms is not None:
+        return transforms.get_local_transform(node)
+
+    translate = list(cmds.getAttr("{}.translate".format(node))[0])
+    rotate = list(cmds.getAttr("{}.rotate".format(node))[0])
+
+    return translate, rotate
+
+
+def can_solve_offline(node, tolerance=1e-6):
+    """Checks if the local values of a node can be solved in memory from
+    sampled matrices, which requires zeroed pivots and no shear.
+
+    Args:
+        node (str): a transform node.
+        tolerance (float): largest offset value considered as zero.
+
+    Returns:
+        bool: True if the offline solver can be used, False otherwise.
+    """
+    for attr in OFFSET_ATTRS:
+        values = cmds.getAttr("{}.{}".format(node, attr))[0]
+        if any(abs(value) > tolerance for value in values):
+            return False
+
+    return True
+
+
+def solve_local_transforms(node, world_matrices, parent_inverse_matrices,
+                           reference_time=None):
+    """Computes in memory the local translate and rotate values that place a
+    node at the given world matrices, using its rotate order, rotate axis
+    and joint orient. See space_switch_math.solve_local_transforms.
+
+    Args:
+        node (str): a transform node.
+        world_matrices (list): world matrices the node should match.
+        parent_inverse_matrices (list): parent inverse matrices of the node
+                                        on the same frames.
+        reference_time (int|float|None): the solved rotations stay close to
+                                         the node's rotation on this frame
+                                         to avoid flips.
+
+    Returns:
+        list: (translate, rotate) per frame.
+    """
+    rotate_order = cmds.getAttr("{}.rotateOrder".format(node))
+    rotate_axis = cmds.getAttr("{}.rotateAxis".format(node))[0]
+    joint_orient = None
+    if cmds.attributeQuery("jointOrient", node=node, exists=True):
+        joint_orient = cmds.getAttr("{}.jointOrient".format(node))[0]
+    reference = None
+    if reference_time is not None:
+        reference = cmds.getAttr("{}.rotate".format(node),
+                                 time=reference_time)[0]
+
+    return switch_math.solve_local_transforms(world_matrices,
+                                              parent_inverse_matrices,
+                                              rotate_order, rotate_axis,
+                                              joint_orient, reference)
+
+
+def write_curve_keys(plug, keys):
+    """Writes all the given keys of one attribute in a single pass. The keys
+    are inserted with one setKeyframe call so Maya takes care of creating the
+    curve and its tangents, then every value is set at once through the
+    keyTimeValue array of the anim curve. Both calls are undoable.
+
+    Falls back to one setKeyframe per key if the attribute is not driven by an
+    anim curve directly (anim layers, pair blends, etc.).
+
+    Args:
+        plug (str): node.attribute to key.
+        keys (dict): {time: value}.
+    """
+    if not keys:
+        return
+
+    times = sorted(keys)
+    cmds.setKeyframe(plug, time=[(time, time) for time in times])
+    curves = cmds.listConnections(plug, source=True, destination=False,
+                                  type="animCurve")
+    if not curves:
+        for time in times:
+            cmds.setKeyframe(plug, time=(time, time), value=keys[time])
+        return
+
+    curve = curves[0]
+    key_times = cmds.keyframe(curve, query=True, timeChange=True)
+    key_values = cmds.keyframe(curve, query=True, valueChange=True)
+
+    # match by rounded time, queried times may drift from the given ones
+    new_values = dict((round(time, 3), value)
+                      for time, value in keys.items())
+    flat = []
+    for time, value in zip(key_times, key_values):
+        flat.extend((time, new_values.get(round(time, 3), value)))
+
+    cmds.setAttr("{}.ktv[0:{}]".format(curve, len(key_times) - 1), *flat)
+
+
+class AnimCurveWriter(object):
+    """Collects keys of a bake in memory and writes each anim curve in one
+    pass, so the number of commands depends on the channels keyed and not on
+    the number of frames.
+    """
+    def __init__(self):
+        """Initializes an empty key buffer.
+        """
+        self._keys = {} # {plug: {time: value}}
+
+    def add_key(self, plug, time, value):
+        """Adds one key to the buffer, replacing any buffered key at the same
+        time.
+
+        Args:
+            plug (str): node.attribute to key.
+            time (int|float): frame number.
+            value (type): value to key, type depends on the attribute.
+        """
+        self._keys.setdefault(plug, {})[time] = value
+
+    def add_transform_keys(self, node, time, translate=None, rotate=None):
+        """Adds translate and/or rotate keys of a transform node.
+
+        Args:
+            node (str): a transform node.
+            time (int|float): frame number.
+            translate (list|None): local translate values, skipped if None.
+            rotate (list|None): local rotate values, skipped if None.
+        """
+        for channels, values in [[TRANSLATE_CHANNELS, translate],
+                                 [ROTATE_CHANNELS, rotate]]:
+            if values is None:
+                continue
+            for channel, value in zip(channels, values):
+                self.add_key("{}.{}".format(node, channel), time, value)
+
+    def add_hold_keys(self, plugs, time):
+        """Adds keys that hold down the current animation of the given
+        attributes at the given time.
+
+        Args:
+            plugs (list): node.attribute strings.
+            time (int|float): frame number.
+        """
+        for plug in plugs:
+            self.add_key(plug, time, cmds.getAttr(plug, time=time))
+
+    @switch_profile.profiled("key writing")
+    def flush(self):
+        """Writes every buffered curve and empties the buffer.
+        """
+        for plug in sorted(self._keys):
+            write_curve_keys(plug, self._keys[plug])
+        self._keys = {}
+
+
+class ApiTransforms(object):
+    """Reads and poses transform nodes through OpenMaya 2.0 instead of
+    cmds.xform and cmds.getAttr. Each node is resolved once to its MDagPath
+    and MFnTransform, world matrices come from MDagPath.inclusiveMatrix and
+    poses are set with MFnTransform.setTranslation/setRotation in world
+    space.
+
+    API edits are not recorded for undo, so commit puts back the values the
+    posed nodes had and sets their final pose again with cmds.setAttr, once
+    per node, which keeps a whole switch undoable.
+    """
+    def __init__(self):
+        """Initializes an empty node cache.
+        """
+        self._nodes = {} # {node: (MDagPath, MFnTransform)}
+        self._originals = {} # {node: {"translate": MVector, "rotate": ...}}
+
+    def _get_node(self, node):
+        """Returns the MDagPath and MFnTransform of a node, resolved once.
+        """
+        found = self._nodes.get(node)
+        if found is None:
+            sel = om.MSelectionList()
+            sel.add(node)
+            path = sel.getDagPath(0)
+            found = (path, om.MFnTransform(path))
+            self._nodes[node] = found
+
+        return found
+
+    def get_world_matrix(self, node):
+        """Returns the world matrix of a node.
+
+        Args:
+            node (str): a transform node.
+
+        Returns:
+            list: 16 floats.
+        """
+        return list(self._get_node(node)[0].inclusiveMatrix())
+
+    def get_world_transform(self, node):
+        """Returns the world position and rotation of a node, the same way
+        cmds.xform(query=True, worldSpace=True) reports them.
+
+        Args:
+            node (str): a transform node.
+
+        Returns:
+            tuple: world position and rotation (in degrees).
+        """
+        path, fn = self._get_node(node)
+        return matrix_to_world_transform(list(path.inclusiveMatrix()),
+                                         fn.rotation().order)
+
+    def get_local_transform(self, node):
+        """Returns the local translate and rotate values of a node, see
+        get_local_transform.
+
+        Args:
+            node (str): a transform node.
+
+        Returns:
+            tuple: local translate and rotate values.
+        """
+        fn = self._get_node(node)[1]
+        rotation = fn.rotation()
+
+        return (list(fn.translation(om.MSpace.kTransform)),
+                [math.degrees(angle)
+                 for angle in (rotation.x, rotation.y, rotation.z)])
+
+    def apply_world_transform(self, node, pos, rot):
+        """Moves a node to a world position and rotation, see
+        apply_world_transform. The values it had are kept for commit.
+
+        Args:
+            node (str): a transform node.
+            pos (list|None): a world position, skipped if None.
+            rot (list|None): a world rotation in the node's rotate order,
+                             skipped if None.
+        """
+        fn = self._get_node(node)[1]
+        originals = self._originals.setdefault(node, {})
+        if pos is not None:
+            if "translate" not in originals:
+                originals["translate"] = fn.translation(om.MSpace.kTransform)
+            fn.setTranslation(om.MVector(pos[0], pos[1], pos[2]),
+                              om.MSpace.kWorld)
+        if rot is not None:
+            previous = fn.rotation()
+            if "rotate" not in originals:
+                originals["rotate"] = previous
+            rotation = om.MEulerRotation(math.radians(rot[0]),
+                                         math.radians(rot[1]),
+                                         math.radians(rot[2]),
+                                         previous.order)
+            fn.setRotation(rotation.asQuaternion(), om.MSpace.kWorld)
+            # keep the euler angles continuous, like cmds.xform does
+            fn.setRotation(fn.rotation().setToClosestSolution(previous))
+
+    def restore(self):
+        """Puts back the values the posed nodes had, nothing is left to
+        commit afterwards.
+        """
+        for node, originals in self._originals.items():
+            fn = self._get_node(node)[1]
+            if "translate" in originals:
+                fn.setTranslation(originals["translate"],
+                                  om.MSpace.kTransform)
+            if "rotate" in originals:
+                fn.setRotation(originals["rotate"])
+        self._originals = {}
+
+    def commit(self):
+        """Makes the poses undoable: the posed nodes are restored, then set
+        again to their final pose with one cmds.setAttr per attribute.
+        """
+        poses = []
+        for node, originals in self._originals.items():
+            translate, rotate = self.get_local_transform(node)
+            poses.append((node, translate if "translate" in originals
+                          else None, rotate if "rotate" in originals
+                          else None))
+        self.restore()
+
+        for node, translate, rotate in poses:
+            if translate is not None:
+                cmds.setAttr("{}.translate".format(node), *translate)
+            if rotate is not None:
+                cmds.setAttr("{}.rotate".format(node), *rotate)
+
+
+@switch_profile.profiled("apply world transform")
+def apply_world_transform(node, pos, rot, transforms=None):
+    """Takes one transform node and a set of world position and rotation, and
+    applies the latter on the former at the current time.
+
+    Args:
+        node (str): a transform node.
+        pos (list|None): a world position, skipped if None.
+        rot (list|None): a world rotation, skipped if None.
+        transforms (ApiTransforms|None): poses the node through OpenMaya,
+                                         uses cmds.xform if None given.
+    """
+    if transforms is not None:
+        transforms.apply_world_transform(node, pos, rot)
+        return
+
+    if pos is not None:
+        cmds.xform(node, translation=pos, worldSpace=True)
+    if rot is not None:
+        cmds.xform(node, rotation=rot, worldSpace=True)
+
+
+def hold_space(writer, frame, ctl, space, space_value):
+    """Buffers keys that hold down the control's animation and the given
+    space on one frame, used on the frame before a switch.
+
+    Args:
+        writer (AnimCurveWriter): buffer of the keys.
+        frame (int|float): frame number to key.
+        ctl (str): control used for space switch operation.
+        space (str): an attribute represents the space.
+        space_value (type): value in the space attribute.
+    """
+    writer.add_key(space, frame, space_value)
+    writer.add_hold_keys(["{}.{}".format(ctl, channel) for channel in
+                          TRANSLATE_CHANNELS + ROTATE_CHANNELS], frame)
+
+
+def bake_space_frames(writer, ctl, bake_data):
+    """Keys the space attributes, then solves and keys the control's local
+    values so it keeps the given world matrices, and writes every curve.
+
+    Args:
+        writer (AnimCurveWriter): buffer of the keys.
+        ctl (str): control used for space switch operation.
+        bake_data (list): (frame, space attribute, space value, world
+                          matrix) per frame.
+    """
+    bake_controls(writer, [(ctl, bake_data)])
+
+
+@switch_profile.profiled("solving")
+def bake_controls(writer, bakes, transforms=None):
+    """Same as bake_space_frames for many controls at once. The parent
+    matrices of every control are sampled in one pass, and controls that
+    cannot be solved in memory share one walk over the timeline. Controls
+    parented under other baked controls wait for their parents to be keyed.
+
+    Args:
+        writer (AnimCurveWriter): buffer of the keys.
+        bakes (list): (control, bake data) pairs, see bake_space_frames.
+        transforms (ApiTransforms|None): poses the controls that cannot be
+                                         solved in memory, see
+                                         apply_world_transform.
+    """
+    bakes = [(ctl, sorted(bake_data, key=lambda data: data[0]))
+             for ctl, bake_data in bakes if bake_data]
+    if not bakes:
+        return
+
+    # the parent matrices depend on the space, so key it first
+    for ctl, bake_data in bakes:
+        for frame, space, space_value, matrix in bake_data:
+            writer.add_key(space, frame, space_value)
+    writer.flush()
+
+    # count the baked ancestors of each control, parents go first
+    paths = [cmds.ls(ctl, long=True)[0] for ctl, bake_data in bakes]
+    tiers = {}
+    for bake, path in zip(bakes, paths):
+        depth = len([other for other in paths
+                     if path.startswith(other + "|")])
+        tiers.setdefault(depth, []).append(bake)
+
+    for depth in sorted(tiers):
+        _bake_tier(writer, tiers[depth], transforms)
+
+
+@switch_profile.profiled("tier")
+def _bake_tier(writer, bakes, transforms=None):
+    """Solves and keys the local values of controls that do not depend on
+    each other, see bake_controls.
+    """
+    offline = [can_solve_offline(ctl) for ctl, bake_data in bakes]
+    offline_times = sorted(set(data[0] for (ctl, bake_data), solvable
+                               in zip(bakes, offline) if solvable
+                               for data in bake_data))
+    samples = sample_matrices([(ctl, "parentInverseMatrix") for
+                               (ctl, bake_data), solvable in zip(bakes, offline)
+                               if solvable], offline_times)
+
+    local_data = [] # (ctl, frame, (translate, rotate))
+    by_frame = {} # {frame: [(ctl, rotate order, matrix)]}
+    with switch_profile.phase("offline solve"):
+        for (ctl, bake_data), solvable in zip(bakes, offline):
+            frames = [data[0] for data in bake_data]
+            matrices = [data[3] for data in bake_data]
+            if solvable:
+                parent_inverses = dict(zip(
+                    offline_times, samples[(ctl, "parentInverseMatrix")]
+                ))
+                local_data.extend(
+                    (ctl, frame, transform) for frame, transform in zip(
+                        frames, solve_local_transforms(
+                            ctl, matrices,
+                            [parent_inverses[frame] for frame in frames],
+                            frames[0]
+                        )
+                    )
+                )
+            else: # pivots are not zeroed, let Maya solve it frame by frame
+                rotate_order = cmds.getAttr("{}.rotateOrder".format(ctl))
+                for frame, matrix in zip(frames, matrices):
+                    by_frame.setdefault(frame, []).append(
+                        (ctl, rotate_order, matrix)
+                    )
+
+    # one walk over the timeline for all of them
+    with switch_profile.phase("posing"):
+        for frame in sorted(by_frame):
+            cmds.currentTime(frame, edit=True)
+            for ctl, rotate_order, matrix in by_frame[frame]:
+                pos, rot = matrix_to_world_transform(matrix, rotate_order)
+                apply_world_transform(ctl, pos, rot, transforms)
+                local_data.append((ctl, frame,
+                                   get_local_transform(ctl, transforms)))
+
+    for ctl, frame, (translate, rotate) in local_data:
+        writer.add_transform_keys(ctl, frame, translate, rotate)
+    writer.flush()
+
+
+def get_pole_distance(data):
+    """Returns the pole vector projection distance of an ikfk preset, an
+    optional "pole distance" entry overrides the default.
+
+    Args:
+        data (dict): ikfk switch data.
+
+    Returns:
+        float: see space_switch_math.solve_pole_vectors.
+    """
+    return float(data.get("pole distance", POLE_DISTANCE))
+
+
+def solve_ik_to_fk(data, chain, calibration=None):
+    """Computes the world rotations of the fk controls that match a sampled
+    joint chain.
+
+    Args:
+        data (dict): ikfk switch data.
+        chain (tuple): (shoulder, elbow, wrist) world transforms of the
+                       joints, see sample_ikfk_chain.
+        calibration (dict|None): offsets from get_ikfk_calibration, the fk
+                                 controls are matched to the joints directly
+                                 if None given.
+
+    Returns:
+        tuple: shoulder, elbow and wrist world rotations.
+    """
+    if calibration:
+        # put the controls back at their measured offsets
+        chain = [offset_world_transform(data[jnt_key], data[ctl_key],
+                                        transform, calibration[ctl_key])
+                 for (ctl_key, jnt_key, switch_key), transform in zip(
+                     IKFK_CALIBRATION_PAIRS[:3], chain)] # fk pairs only
+
+    return tuple(transform[1] for transform in chain) # no position for FK
+
+
+def solve_fk_to_ik(data, chain, frame=None, calibration=None, pole=None):
+    """Computes the world transform of the ik wrist and the position of the
+    ik elbow that match a sampled joint chain.
+
+    Args:
+        data (dict): ikfk switch data.
+        chain (tuple): (shoulder, elbow, wrist) world transforms of the
+                       joints, see sample_ikfk_chain.
+        frame (int|float|None): frame the chain was sampled on, current frame
+                                if None given.
+        calibration (dict|None): offsets from get_ikfk_calibration, the wrist
+                                 is solved through solve_constraint if None
+                                 given.
+        pole (list|None): ik elbow position solved beforehand by
+                          chain_pole_vectors, solved from the chain if None
+                          given.
+
+    Returns:
+        tuple: ik wrist world position and rotation, ik elbow world position.
+    """
+    if calibration:
+        # the ik wrist keeps a constant offset from the wrist joint
+        wrist_pos, wrist_rot = offset_world_transform(
+            data["wrist joint"], data["ik wrist"], chain[2],
+            calibration["ik wrist"]
+        )
+    else:
+        wrist_pos, wrist_rot = solve_constraint(data["wrist joint"],
+                                                data["ik wrist"],
+                                                "parentConstraint", frame)
+    if pole is None:
+        pole = chain_pole_vectors([chain], get_pole_distance(data))[0]
+
+    return wrist_pos, wrist_rot, list(pole)
+
+
+def _ikfk_hold_plugs(data, flag):
+    """Returns the plugs keyed by an ik --> fk (flag True) or fk --> ik
+    switch, which are the ones to hold down on the frame before it.
+    """
+    if flag:
+        return (["{}.{}".format(data[key], channel)
+                 for key in ["fk shoulder", "fk elbow", "fk wrist"]
+                 for channel in ROTATE_CHANNELS]
+                + [data["fk switch"][0]])
+
+    return (["{}.{}".format(data["ik wrist"], channel)
+             for channel in TRANSLATE_CHANNELS + ROTATE_CHANNELS]
+            + ["{}.{}".format(data["ik elbow"], channel)
+               for channel in TRANSLATE_CHANNELS]
+            + [data["ik switch"][0]])
+
+
+def apply_ik_to_fk(data, rotations, frame, writer, prev_frame=None,
+                   transforms=None):
+    """Switches to fk on one frame: keys the fk switch, poses the fk controls
+    with the given world rotations and buffers their local values.
+
+    Args:
+        data (dict): ikfk switch data.
+        rotations (tuple): shoulder, elbow and wrist world rotations, see
+                           solve_ik_to_fk.
+        frame (int|float): frame number to switch on.
+        writer (AnimCurveWriter): buffer of the keys.
+        prev_frame (int|float|None): frame to hold down before the switch.
+        transforms (ApiTransforms|None): poses the controls through
+                                         OpenMaya, see apply_world_transform.
+    """
+    fk_switch_attr, fk_switch_value = data["fk switch"]
+    if prev_frame is not None:
+        writer.add_hold_keys(_ikfk_hold_plugs(data, True), prev_frame)
+
+    if cmds.currentTime(query=True) != frame: # limbs share the same frame
+        cmds.currentTime(frame, edit=True)
+    cmds.setAttr(fk_switch_attr, fk_switch_value)
+    writer.add_key(fk_switch_attr, frame, fk_switch_value)
+    for key, rot in zip(["fk shoulder", "fk elbow", "fk wrist"], rotations):
+        # parents go first, children are posed on top of them
+        apply_world_transform(data[key], None, rot, transforms)
+        writer.add_transform_keys(
+            data[key], frame,
+            rotate=get_local_transform(data[key], transforms)[1]
+        )
+
+
+def apply_fk_to_ik(data, pose, frame, writer, prev_frame=None,
+                   transforms=None):
+    """Switches to ik on one frame: keys the ik switch, poses the ik wrist and
+    elbow with the given world transforms and buffers their local values.
+
+    Args:
+        data (dict): ikfk switch data.
+        pose (tuple): ik wrist world position and rotation, ik elbow world
+                      position, see solve_fk_to_ik.
+        frame (int|float): frame number to switch on.
+        writer (AnimCurveWriter): buffer of the keys.
+        prev_frame (int|float|None): frame to hold down before the switch.
+        transforms (ApiTransforms|None): poses the controls through
+                                         OpenMaya, see apply_world_transform.
+    """
+    ik_switch_attr, ik_switch_value = data["ik switch"]
+    wrist_pos, wrist_rot, elbow_pos = pose
+    if prev_frame is not None:
+        writer.add_hold_keys(_ikfk_hold_plugs(data, False), prev_frame)
+
+    if cmds.currentTime(query=True) != frame: # limbs share the same frame
+        cmds.currentTime(frame, edit=True)
+    cmds.setAttr(ik_switch_attr, ik_switch_value)
+    writer.add_key(ik_switch_attr, frame, ik_switch_value)
+
+    apply_world_transform(data["ik wrist"], wrist_pos, wrist_rot, transforms)
+    writer.add_transform_keys(data["ik wrist"], frame,
+                              *get_local_transform(data["ik wrist"],
+                                                   transforms))
+    apply_world_transform(data["ik elbow"], elbow_pos, None, transforms)
+    writer.add_transform_keys(data["ik elbow"], frame,
+                              get_local_transform(data["ik elbow"],
+                                                  transforms)[0])
+
+
+@switch_profile.profiled("space switch")
+def _execute_space_plans(jobs, writer, bake_engine=PYTHON_ENGINE,
+                         transforms=None):
+    """Runs space switch plans in one pass, see execute_plans.
+    """
+    if bake_engine == NATIVE_ENGINE:
+        native_jobs = [(data, plan) for data, plan in jobs
+                       if plan["bake mode"] == switch_plan.BAKE_EVERY_FRAME]
+        if native_jobs:
+            _bake_space_plans_native(native_jobs, writer)
+        jobs = [(data, plan) for data, plan in jobs
+                if plan["bake mode"] != switch_plan.BAKE_EVERY_FRAME]
+        if not jobs:
+            return
+
+    # key the source spaces first, then sample all the world matrices at
+    # once without moving the time
+    for data, plan in jobs:
+        source_space, source_value = data["source space"]
+        for time in plan["sample times"]:
+            writer.add_key(source_space, time, source_value)
+    writer.flush()
+
+    ctls = []
+    for data, plan in jobs:
+        if data["target control"] not in ctls:
+            ctls.append(data["target control"])
+    sample_times = switch_plan.merge_sample_times([plan for data, plan
+                                                   in jobs])
+    samples = sample_matrices([(ctl, "worldMatrix") for ctl in ctls],
+                              sample_times)
+
+    bakes = []
+    for data, plan in jobs:
+        ctl = data["target control"]
+        source_space, source_value = data["source space"]
+        target_space, target_value = data["target space"]
+        matrices = dict(zip(sample_times, samples[(ctl, "worldMatrix")]))
+
+        bake_data = []
+        for operation in plan["operations"]:
+            frame = operation["frame"]
+            if operation["action"] == switch_plan.HOLD:
+                hold_space(writer, frame, ctl, source_space, source_value)
+            elif operation["action"] == switch_plan.SWITCH:
+                bake_data.append((frame, target_space, target_value,
+                                  matrices[operation["sample"]]))
+            else: # operation["action"] == switch_plan.REVERSE
+                bake_data.append((frame, source_space, source_value,
+                                  matrices[operation["sample"]]))
+        bakes.append((ctl, bake_data))
+
+    bake_controls(writer, bakes, transforms)
+
+
+def _get_settable_channels(node):
+    """Returns the translate and rotate channels of a node that can be keyed.
+    """
+    return [channel for channel in TRANSLATE_CHANNELS + ROTATE_CHANNELS
+            if cmds.getAttr("{}.{}".format(node, channel), settable=True)]
+
+
+@switch_profile.profiled("native bake")
+def _bake_space_plans_native(jobs, writer):
+    """Runs bake every frame space switch plans with cmds.bakeResults: a
+    locator is constrained to each control and baked to record its current
+    world animation, the spaces are switched, then the control is
+    constrained back to the locator and baked, and the locators are deleted.
+    Plans sharing a time range are baked by the same bakeResults calls.
+
+    Raises:
+        ValueError: if a plan has no frame to bake.
+    """
+    # keep the current animation, in the source space
+    ranges = {} # {(first frame, last frame): [(data, plan)]}
+    for data, plan in jobs:
+        ctl = data["target control"]
+        frames = [operation["frame"] for operation in plan["operations"]
+                  if operation["action"] != switch_plan.HOLD]
+        if not frames:
+            raise ValueError("No frames to bake on {}!".format(ctl))
+        ranges.setdefault((frames[0], frames[-1]), []).append((data, plan))
+
+    for data, plan in jobs:
+        ctl = data["target control"]
+        source_space, source_value = data["source space"]
+        for operation in plan["operations"]:
+            if operation["action"] == switch_plan.HOLD:
+                hold_space(writer, operation["frame"], ctl, source_space,
+                           source_value)
+            else:
+                writer.add_key(source_space, operation["frame"], source_value)
+    writer.flush()
+
+    for time_range, range_jobs in sorted(ranges.items()):
+        ctls = []
+        for data, plan in range_jobs:
+            if data["target control"] not in ctls:
+                ctls.append(data["target control"])
+
+        proxies = {}
+        try:
+            for ctl in ctls:
+                # in the root namespace, referenced rigs cannot take new nodes
+                short_name = ctl.split("|")[-1].rsplit(":", 1)[-1]
+                proxy = cmds.spaceLocator(
+                    name=":{}_switch_proxy".format(short_name)
+                )[0]
+                cmds.setAttr("{}.rotateOrder".format(proxy),
+                             cmds.getAttr("{}.rotateOrder".format(ctl)))
+                proxies[ctl] = proxy
+
+            # record the world animation of the controls
+            constraints = [cmds.parentConstraint(ctl, proxies[ctl])[0]
+                           for ctl in ctls]
+            cmds.bakeResults(list(proxies.values()), time=time_range,
+                             simulation=False,
+                             attribute=TRANSLATE_CHANNELS + ROTATE_CHANNELS)
+            cmds.delete(constraints)
+
+            # switch, the reverse frame goes back to the source space
+            for data, plan in range_jobs:
+                source_space, source_value = data["source space"]
+                target_space, target_value = data["target space"]
+                for operation in plan["operations"]:
+                    if operation["action"] == switch_plan.SWITCH:
+                        writer.add_key(target_space, operation["frame"],
+                                       target_value)
+                    elif operation["action"] == switch_plan.REVERSE:
+                        writer.add_key(source_space, operation["frame"],
+                                       source_value)
+            writer.flush()
+
+            # put the controls back where they were, locked channels skipped
+            plugs = []
+            constraints = []
+            for ctl in ctls:
+                channels = _get_settable_channels(ctl)
+                if not channels:
+                    continue
+                plugs.extend("{}.{}".format(ctl, channel)
+                             for channel in channels)
+                skip_translate = [channel[-1] for channel in TRANSLATE_CHANNELS
+                                  if channel not in channels] or "none"
+                skip_rotate = [channel[-1] for channel in ROTATE_CHANNELS
+                               if channel not in channels] or "none"
+                constraints.append(cmds.parentConstraint(
+                    proxies[ctl], ctl, skipTranslate=skip_translate,
+                    skipRotate=skip_rotate
+                )[0])
+            if plugs:
+                cmds.bakeResults(plugs, time=time_range, simulation=False,
+                                 preserveOutsideKeys=True)
+                cmds.delete(constraints)
+
+        finally: # clean up
+            if proxies:
+                cmds.delete(list(proxies.values()))
+
+
+@switch_profile.profiled("ikfk switch")
+def _execute_ikfk_plans(jobs, writer, transforms=None):
+    """Runs ikfk switch plans in one pass, see execute_plans.
+    """
+    # gathering data, the joints of every chain are sampled in one pass
+    sample_times = switch_plan.merge_sample_times([plan for data, plan
+                                                   in jobs])
+    samples = sample_ikfk_chains([(data["shoulder joint"],
+                                   data["elbow joint"], data["wrist joint"])
+                                  for data, plan in jobs], sample_times)
+
+    # solve everything before the scene gets changed
+    switches = {} # {frame: [(data, to_fk, values, prev_frame)]}
+    with switch_profile.phase("solving"):
+        for (data, plan), chain_samples in zip(jobs, samples):
+            flag = plan["direction"] == "ikfk" # True --> ikfk, False --> fkik
+            calibration = get_ikfk_calibration(data) # measured on first use
+            chains = dict(zip(sample_times, chain_samples))
+            poles = dict(zip(sample_times, chain_pole_vectors(
+                chain_samples, get_pole_distance(data)
+            )))
+
+            holds = set(operation["frame"] + 1
+                        for operation in plan["operations"]
+                        if operation["action"] == switch_plan.HOLD)
+            for operation in plan["operations"]:
+                if operation["action"] == switch_plan.HOLD:
+                    continue
+                # reverse runs the opposite direction to close the range
+                to_fk = flag == (operation["action"] == switch_plan.SWITCH)
+                sample = operation["sample"]
+                if to_fk:
+                    values = solve_ik_to_fk(data, chains[sample], calibration)
+                else:
+                    values = solve_fk_to_ik(data, chains[sample], sample,
+                                            calibration, poles[sample])
+                frame = operation["frame"]
+                prev_frame = frame - 1 if frame in holds else None
+                switches.setdefault(frame, []).append(
+                    (data, to_fk, values, prev_frame)
+                )
+
+    # one walk over the timeline for all the chains
+    with switch_profile.phase("posing"):
+        for frame in sorted(switches):
+            for data, to_fk, values, prev_frame in switches[frame]:
+                if to_fk:
+                    apply_ik_to_fk(data, values, frame, writer, prev_frame,
+                                   transforms)
+                else:
+                    apply_fk_to_ik(data, values, frame, writer, prev_frame,
+                                   transforms)
+
+
+def execute_plan(data, plan, writer=None, calibration=None,
+                 bake_engine=PYTHON_ENGINE,
+                 transform_mode=switch_plan.CMDS_TRANSFORMS):
+    """Runs a plan compiled by space_switch_plan.plan_switch on the given
+    preset. Everything is sampled before the scene is changed, and the keys
+    are buffered and written per curve.
+
+    Args:
+        data (dict): space switch or ikfk switch data the plan was made for.
+        plan (dict): the plan to run.
+        writer (AnimCurveWriter|None): buffer shared with other plans, the
+                                       keys are written before returning if
+                                       None given.
+        calibration (dict|None): ikfk offsets, see get_ikfk_calibration.
+                                 Defaults to the one stored in the preset,
+                                 which is measured if there is none.
+        bake_engine (str): one of BAKE_ENGINES, see execute_plans.
+        transform_mode (str): one of space_switch_plan.TRANSFORM_MODES, see
+                              execute_plans.
+    """
+    if calibration is not None:
+        data = dict(data, calibration=calibration)
+    execute_plans([(data, plan)], writer, bake_engine, transform_mode)
+
+
+def execute_plans(jobs, writer=None, bake_engine=PYTHON_ENGINE,
+                  transform_mode=switch_plan.CMDS_TRANSFORMS):
+    """Runs many plans as one job. The world matrices of all the space
+    switched controls, and the joints of all the ikfk chains, are sampled in
+    a single pass over the union of their frames, the ikfk chains are posed
+    in one walk over the timeline, and every curve is written once at the end.
+
+    Args:
+        jobs (list): (data, plan) pairs, see execute_plan. IKFK presets use
+                     the calibration stored in them, see
+                     get_ikfk_calibration.
+        writer (AnimCurveWriter|None): buffer of the keys, the keys are
+                                       written before returning if None given.
+        bake_engine (str): one of BAKE_ENGINES. NATIVE_ENGINE hands the
+                           bake every frame space switches to
+                           cmds.bakeResults, everything else is always run
+                           by PYTHON_ENGINE.
+        transform_mode (str): one of space_switch_plan.TRANSFORM_MODES, how
+                              the ikfk controls, and the space switched
+                              controls that cannot be solved in memory, are
+                              posed and read back. API_TRANSFORMS goes
+                              through ApiTransforms.
+
+    Raises:
+        ValueError: if the bake engine or transform mode is unknown, or
+                    API_TRANSFORMS is used without OpenMaya.
+    """
+    if bake_engine not in BAKE_ENGINES:
+        raise ValueError("Unknown bake engine: {}".format(bake_engine))
+    if transform_mode not in switch_plan.TRANSFORM_MODES:
+        raise ValueError("Unknown transform mode: {}".format(transform_mode))
+
+    transforms = None
+    if transform_mode == switch_plan.API_TRANSFORMS:
+        if om is None:
+            raise ValueError("The backend has no OpenMaya for {}!".format(
+                switch_plan.API_TRANSFORMS
+            ))
+        transforms = ApiTransforms()
+
+    own_writer = writer is None
+    if own_writer:
+        writer = AnimCurveWriter()
+
+    try:
+        space_jobs = [(data, plan) for data, plan in jobs
+                      if plan["mode"] == "space switch"]
+        if space_jobs:
+            _execute_space_plans(space_jobs, writer, bake_engine, transforms)
+        ikfk_jobs = [(data, plan) for data, plan in jobs
+                     if plan["mode"] == "ikfk switch"]
+        if ikfk_jobs:
+            _execute_ikfk_plans(ikfk_jobs, writer, transforms)
+    except Exception: # the api poses cannot be undone
+        if transforms is not None:
+            transforms.restore()
+        raise
+    if transforms is not None:
+        transforms.commit()
+
+    if own_writer:
+        writer.flush()
+
+
+class MatrixCache(object):
+    """LRU cache of sampled matrices keyed by (node, attribute, time), so
+    repeated switches on the same shot reuse what was already evaluated.
+
+    Each cached matrix depends on the nodes upstream of it, see
+    _list_upstream: its node and parents, e.g. constraints, space targets,
+    condition nodes and anim curves. When an attribute of one of them is
+    set, or the keys of an anim curve are edited, only the matrices
+    depending on it are dropped. Connection changes, undo/redo and new
+    scenes empty the whole cache since the graph itself may have changed.
+
+    In Maya the changes are reported by OpenMaya callbacks. Node dirty
+    callbacks are not used since every time change dirties animated nodes.
+    Other backends report them through add_change_callback if they have it,
+    see space_switch_backend.MemoryScene, otherwise the cache has to be
+    cleared by hand.
+    """
+    def __init__(self, max_size=100000):
+        """Initializes an empty cache and installs the global callbacks.
+
+        Args:
+            max_size (int): number of matrices kept, the least recently used
+                            ones are dropped first.
+        """
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._matrices = OrderedDict() # {(node, attr, time): matrix}
+        self._keys = {} # {(node, attr): set of (node, attr, time)}
+        self._upstream = {} # {(node, attr): set of upstream nodes}
+        self._dependents = {} # {upstream node: set of (node, attr)}
+        self._watched = {} # {upstream node: callback id}
+        self._callback_ids = []
+        self._backend_callback = None # (backend, callback id)
+        if om is None: # no API, see space_switch_backend
+            add_callback = getattr(cmds, "add_change_callback", None)
+            if add_callback is not None:
+                self._backend_callback = (cmds,
+                                          add_callback(self._scene_changed))
+            return
+
+        self._callback_ids = [
+            om.MAnimMessage.addAnimCurveEditedCallback(self._curves_edited),
+            om.MDGMessage.addConnectionCallback(self.clear),
+            om.MSceneMessage.addCallback(om.MSceneMessage.kBeforeNew,
+                                         self.clear),
+            om.MSceneMessage.addCallback(om.MSceneMessage.kBeforeOpen,
+                                         self.clear),
+            om.MEventMessage.addEventCallback("Undo", self.clear),
+            om.MEventMessage.addEventCallback("Redo", self.clear)
+        ]
+
+    def __len__(self):
+        return len(self._matrices)
+
+    def get(self, node, attr, time):
+        """Returns a cached matrix and marks it as recently used.
+
+        Args:
+            node (str): any dependency node.
+            attr (str): matrix attribute name.
+            time (int|float): frame number.
+
+        Returns:
+            list|None: 16 floats, None if it is not cached.
+        """
+        key = (node, attr, float(time))
+        matrix = self._matrices.pop(key, None)
+        if matrix is None:
+            self.misses += 1
+            return None
+
+        self._matrices[key] = matrix # move to the most recent end
+        self.hits += 1
+        return matrix
+
+    def add(self, node, attr, time, matrix):
+        """Caches one matrix, dropping the least recently used ones if the
+        cache is full.
+
+        Args:
+            node (str): any dependency node.
+            attr (str): matrix attribute name.
+            time (int|float): frame number.
+            matrix (list): 16 floats.
+        """
+        key = (node, attr, float(time))
+        self._matrices.pop(key, None)
+        self._matrices[key] = matrix
+        self._keys.setdefault(key[:2], set()).add(key)
+        while len(self._matrices) > self.max_size:
+            old_key = self._matrices.popitem(last=False)[0]
+            self._keys[old_key[:2]].discard(old_key)
+
+    def clear(self, *args):
+        """Empties the cache and forgets what the matrices depend on,
+        accepts the arguments of any callback.
+        """
+        self._matrices.clear()
+        self._keys.clear()
+        self._upstream.clear()
+        self._dependents.clear()
+
+    def invalidate(self, nodes):
+        """Drops the matrices depending on any of the given nodes.
+
+        Args:
+            nodes (list): long names of the nodes that changed.
+        """
+        for name in nodes:
+            for pair in self._dependents.get(name, ()):
+                for key in self._keys.pop(pair, ()):
+                    del self._matrices[key]
+
+    def watch(self, node_attrs):
+        """Finds the nodes upstream of the given matrices, so the matrices
+        are dropped when one of them changes.
+
+        Args:
+            node_attrs (list): (node, attribute) pairs of the matrices that
+                               are cached.
+        """
+        for pair in node_attrs:
+            if pair in self._upstream:
+                continue
+            self._upstream[pair] = _list_upstream(*pair)
+            for name in self._upstream[pair]:
+                self._dependents.setdefault(name, set()).add(pair)
+                if om is None or name in self._watched:
+                    continue
+                sel = om.MSelectionList()
+                sel.add(name)
+                self._watched[name] = (
+                    om.MNodeMessage.addAttributeChangedCallback(
+                        sel.getDependNode(0),
+                        partial(self._attribute_changed, name)
+                    )
+                )
+
+    def _attribute_changed(self, name, msg, plug, other_plug, client_data):
+        """Attribute changed callback of the watched nodes.
+        """
+        if msg & om.MNodeMessage.kAttributeSet:
+            self.invalidate([name])
+
+    def _curves_edited(self, curves, client_data):
+        """Anim curve edited callback.
+        """
+        self.invalidate([om.MFnDependencyNode(curve).name()
+                         for curve in curves])
+
+    def _scene_changed(self, nodes):
+        """Change callback of a backend without OpenMaya, nodes is None when
+        the graph changed.
+        """
+        if nodes is None:
+            self.clear()
+        else:
+            self.invalidate(nodes)
+
+    def remove(self):
+        """Removes every callback and empties the cache.
+        """
+        callback_ids = self._callback_ids + list(self._watched.values())
+        if callback_ids:
+            om.MMessage.removeCallbacks(callback_ids)
+        if self._backend_callback is not None:
+            backend, callback_id = self._backend_callback
+            backend.remove_change_callback(callback_id)
+        self._callback_ids = []
+        self._watched = {}
+        self._backend_callback = None
+        self.clear()
+
+
+def _list_upstream(node, attr):
+    """Returns the long names of the nodes a matrix attribute depends on: the
+    node, or its parent for the parent matrices, their DAG parents, and
+    everything feeding any of them through connections. Time nodes are left
+    out, the matrices are sampled at fixed times.
+    """
+    path = (cmds.ls(node, long=True) or [node])[0]
+    if attr.startswith("parent"):
+        path = path.rpartition("|")[0]
+
+    found = set()
+    pending = [path] if path else []
+    while pending:
+        name = pending.pop()
+        if name in found:
+            continue
+        found.add(name)
+        parent = name.rpartition("|")[0]
+        if parent:
+            pending.append(parent)
+        sources = cmds.listConnections(name, source=True,
+                                       destination=False) or []
+        times = set(cmds.ls(sources, type="time"))
+        sources = [source for source in sources if source not in times]
+        if sources:
+            pending.extend(cmds.ls(sources, long=True))
+
+    return found
+
+
+def get_matrix_cache():
+    """Returns the shared MatrixCache used by sample_matrices, creates it on
+    first use.
+
+    Returns:
+        MatrixCache: the shared cache.
+    """
+    global _MATRIX_CACHE
+    if _MATRIX_CACHE is None:
+        _MATRIX_CACHE = MatrixCache()
+
+    return _MATRIX_CACHE
+
+
+def release_matrix_cache():
+    """Removes the shared MatrixCache and its callbacks, sample_matrices
+    evaluates everything again afterwards.
+    """
+    global _MATRIX_CACHE
+    if _MATRIX_CACHE is not None:
+        _MATRIX_CACHE.remove()
+        _MATRIX_CACHE = None
+
+
+def clear_caches():
+    """Forgets everything cached about the scene so far: the nodes found by
+    resolve_switch_nodes, the ikfk calibrations measured, and the shared
+    MatrixCache along with its callbacks.
+    """
+    _NODE_HANDLES.clear()
+    _CALIBRATION_CACHE.clear()
+    release_matrix_cache()
+
+
+class PerformanceContext(object):
+    """Context manager that quiets the scene while a switch runs, so the UI
+    does not react to every time change and key set: autokey is turned off,
+    viewport refresh and OGS are suspended (interactive sessions only), and
+    the evaluation manager can be switched to another mode. Everything is
+    put back on exit, even if an error is raised.
+    """
+    def __init__(self, suspend_refresh=True, pause_viewport=True,
+                 disable_autokey=True, evaluation_mode=None):
+        """Sets up what to suspend.
+
+        Args:
+            suspend_refresh (bool): suspends all viewport and editor refresh.
+            pause_viewport (bool): pauses the OGS viewport.
+            disable_autokey (bool): turns autokey off.
+            evaluation_mode (str|None): evaluation manager mode to use, e.g.
+                                        "off" for DG evaluation, unchanged
+                                        if None given.
+        """
+        self.suspend_refresh = suspend_refresh
+        self.pause_viewport = pause_viewport
+        self.disable_autokey = disable_autokey
+        self.evaluation_mode = evaluation_mode
+        self._interactive = False
+        self._restores = [] # undo each change, in reverse order
+
+    def __enter__(self):
+        try:
+            self._interactive = not cmds.about(batch=True)
+
+            if (self.disable_autokey
+                    and cmds.autoKeyframe(query=True, state=True)):
+                cmds.autoKeyframe(state=False)
+                self._restores.append(partial(cmds.autoKeyframe, state=True))
+
+            if self.evaluation_mode:
+                mode = cmds.evaluationManager(query=True, mode=True)[0]
+                if mode != self.evaluation_mode:
+                    cmds.evaluationManager(mode=self.evaluation_mode)
+                    self._restores.append(partial(cmds.evaluationManager,
+                                                  mode=mode))
+
+            if (self._interactive and self.pause_viewport
+                    and not cmds.ogs(query=True, pause=True)):
+                cmds.ogs(pause=True)
+                # the pause flag toggles
+                self._restores.append(partial(cmds.ogs, pause=True))
+
+            if self._interactive and self.suspend_refresh:
+                cmds.refresh(suspend=True)
+                self._restores.append(partial(cmds.refresh, suspend=False))
+
+        except Exception: # put back what was already changed
+            self.__exit__(*sys.exc_info())
+            raise
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        while self._restores:
+            restore = self._restores.pop()
+            try:
+                restore()
+            except RuntimeError as e: # keep restoring the rest
+                LOGGER.warning("Could not restore scene setting: %s", str(e))
+
+        if self._interactive:
+            cmds.refresh(force=True)
+
+        return False # errors are raised as usual
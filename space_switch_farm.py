@@ -0,0 +1,226 @@
+"""
+MODULE: space_switch_farm
+
+Local scheduler that runs space_switch_batch on many scenes at once. Every
+scene is processed by its own mayapy process, up to a given number of them
+in parallel, and crashed processes are retried. Anything after "--" is
+passed to space_switch_batch as is, e.g.
+
+    python space_switch_farm.py shots/*.ma --workers 8 --report report.json
+        -- --preset arm_L.json --bake-mode "bake every frame"
+
+FUNCTIONS:
+    build_command: command line of one worker.
+    is_crash: checks if an exit code means the worker crashed.
+    run_job: processes one scene, retrying crashes.
+    run_jobs: processes many scenes on a pool of workers.
+    parse_args: reads the command line options.
+    main: entry point.
+"""
+
+__author__ = "Te Ling (Danny) Hsu"
+__copyright__ = "Copyright (c) 2020 Te Ling (Danny) Hsu"
+__license__ = "MIT License"
+__version__ = "1.0.0"
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import subprocess
+import multiprocessing
+from multiprocessing.pool import ThreadPool
+
+
+LOGGER = logging.getLogger(__name__)
+
+BATCH_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            "space_switch_batch.py")
+
+# exit codes of space_switch_batch, see is_crash for the crashed workers
+SUCCESS = 0
+FAILURE = 1
+USAGE_ERROR = 2 # bad options, argparse exits with it
+
+# exit codes above it are signals reported by a shell, e.g. 137 for SIGKILL,
+# or Windows exception codes
+SIGNAL_EXIT = 128
+
+
+def build_command(scene, batch_args, mayapy="mayapy"):
+    """Returns the command line of the worker that processes one scene.
+
+    Args:
+        scene (str): scene file path.
+        batch_args (list): extra space_switch_batch arguments.
+        mayapy (str): mayapy executable.
+
+    Returns:
+        list: command and its arguments.
+    """
+    return [mayapy, BATCH_SCRIPT, scene] + list(batch_args)
+
+
+def is_crash(returncode):
+    """Checks if a worker crashed, i.e. it was killed by a signal rather
+    than exiting on its own. Any other exit code, e.g. USAGE_ERROR, comes
+    back the same however many times the worker runs.
+
+    Args:
+        returncode (int): exit code of the worker process.
+
+    Returns:
+        bool: True if it crashed, False otherwise.
+    """
+    return returncode < 0 or returncode > SIGNAL_EXIT
+
+
+def run_job(scene, batch_args, mayapy="mayapy", retries=2):
+    """Processes one scene in its own mayapy process. A worker that crashes
+    is started again, see is_crash, a scene that simply fails to switch or
+    options space_switch_batch refuses are not.
+
+    Args:
+        scene (str): scene file path.
+        batch_args (list): extra space_switch_batch arguments.
+        mayapy (str): mayapy executable.
+        retries (int): how many times a crashed worker is restarted.
+
+    Returns:
+        dict: "scene", "returncode", "attempts", "duration" (in seconds, of
+              all attempts) and "output" of the last attempt.
+    """
+    command = build_command(scene, batch_args, mayapy)
+    result = {"scene": scene, "returncode": None, "attempts": 0,
+              "duration": 0.0, "output": ""}
+    while result["attempts"] <= retries:
+        result["attempts"] += 1
+        start = time.time()
+        try:
+            process = subprocess.Popen(command, stdout=subprocess.PIPE,
+                                       stderr=subprocess.STDOUT)
+            output = process.communicate()[0]
+            returncode = process.returncode
+        except OSError as e: # mayapy could not be started, no point retrying
+            result.update(returncode=None, output=str(e))
+            break
+        finally:
+            result["duration"] += time.time() - start
+
+        if isinstance(output, bytes):
+            output = output.decode("utf-8", "replace")
+        result.update(returncode=returncode, output=output)
+        if returncode == USAGE_ERROR:
+            LOGGER.error("%s: space_switch_batch refused its options:\n%s",
+                         scene, output)
+        if not is_crash(returncode):
+            break
+        LOGGER.warning("%s crashed (exit code %s), attempt %d of %d", scene,
+                       returncode, result["attempts"], retries + 1)
+
+    return result
+
+
+def run_jobs(scenes, batch_args, workers=None, mayapy="mayapy", retries=2):
+    """Processes many scenes on a pool of mayapy workers. The pool only waits
+    on the worker processes, the scenes are evaluated in parallel.
+
+    Args:
+        scenes (list): scene file paths.
+        batch_args (list): extra space_switch_batch arguments.
+        workers (int|None): number of scenes processed at once, one per core
+                            if None given.
+        mayapy (str): mayapy executable.
+        retries (int): see run_job.
+
+    Returns:
+        list: results of run_job, in the same order as scenes.
+    """
+    if not scenes:
+        return []
+
+    workers = min(workers or multiprocessing.cpu_count(), len(scenes))
+    pool = ThreadPool(workers)
+    try:
+        pending = [pool.apply_async(run_job, (scene, batch_args, mayapy,
+                                              retries))
+                   for scene in scenes]
+        results = []
+        for scene, job in zip(scenes, pending):
+            result = job.get()
+            LOGGER.info("%s: exit code %s in %.1fs (%d attempt(s))", scene,
+                        result["returncode"], result["duration"],
+                        result["attempts"])
+            results.append(result)
+    finally:
+        pool.close()
+        pool.join()
+
+    return results
+
+
+def parse_args(args=None):
+    """Reads the command line options, everything after "--" goes to
+    space_switch_batch.
+
+    Args:
+        args (list|None): command line arguments, sys.argv if None given.
+
+    Returns:
+        tuple: parsed options and the space_switch_batch arguments.
+    """
+    args = list(sys.argv[1:] if args is None else args)
+    batch_args = []
+    if "--" in args:
+        index = args.index("--")
+        args, batch_args = args[:index], args[index + 1:]
+
+    parser = argparse.ArgumentParser(
+        description="Runs space_switch_batch on many scenes in parallel."
+    )
+    parser.add_argument("scenes", nargs="+", help="scene files to process.")
+    parser.add_argument("-w", "--workers", type=int, default=None,
+                        help="scenes processed at once, one per core by "
+                             "default.")
+    parser.add_argument("--mayapy", default=os.environ.get("MAYAPY", "mayapy"),
+                        help="mayapy executable, $MAYAPY by default.")
+    parser.add_argument("--retries", type=int, default=2,
+                        help="times a crashed worker is restarted.")
+    parser.add_argument("--report", default=None,
+                        help="writes the results to this JSON file.")
+
+    return parser.parse_args(args), batch_args
+
+
+def main(args=None):
+    """Entry point.
+
+    Args:
+        args (list|None): command line arguments, sys.argv if None given.
+
+    Returns:
+        int: 0 if every scene was processed, 1 otherwise.
+    """
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    options, batch_args = parse_args(args)
+
+    start = time.time()
+    results = run_jobs(options.scenes, batch_args, options.workers,
+                       options.mayapy, options.retries)
+    failed = [result for result in results if result["returncode"] != SUCCESS]
+    LOGGER.info("%d of %d scenes processed in %.1fs",
+                len(results) - len(failed), len(results), time.time() - start)
+    for result in failed:
+        LOGGER.error("%s failed:\n%s", result["scene"], result["output"])
+
+    if options.report:
+        with open(options.report, "w") as out_file:
+            json.dump(results, out_file, indent=4)
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
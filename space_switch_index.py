@@ -0,0 +1,194 @@
+"""
+MODULE: space_switch_index
+
+Persistent index of a preset folder, so the tool does not have to open every
+preset file on each refresh. The index is a hidden JSON file saved in the
+folder itself and lists, per preset file, its modification time, size, type
+and parsed content:
+
+    {"version": 1,
+     "files": {"arm_L.json": {"mtime": 1589000000.0,
+                              "size": 412,
+                              "mode": "ikfk switch", # None if not a preset
+                              "data": {...}}}}
+
+Only the files whose modification time or size changed since the last
+refresh are parsed again. Nothing in here touches Maya, checking the presets
+against the scene is left to space_switch_engine.validate_switch_data.
+
+FUNCTIONS:
+    get_preset_mode: preset type of a parsed JSON file.
+    read_preset: parses one preset file into an index entry.
+    load_index: reads the index of a folder.
+    save_index: writes the index of a folder.
+    update_index: brings the index of a folder up to date.
+"""
+
+__author__ = "Te Ling (Danny) Hsu"
+__copyright__ = "Copyright (c) 2020 Te Ling (Danny) Hsu"
+__license__ = "MIT License"
+__version__ = "1.0.0"
+
+import os
+import json
+import logging
+import threading
+
+
+LOGGER = logging.getLogger(__name__)
+
+INDEX_FILE = ".space_switch_index.json"
+INDEX_VERSION = 1
+
+MODES = ("space switch", "ikfk switch")
+
+
+def get_preset_mode(data):
+    """Returns the type of a parsed preset file without checking it against
+    the scene, so only one of the two switch modes has to be validated.
+
+    Args:
+        data: content of a JSON file.
+
+    Returns:
+        str|None: "space switch" or "ikfk switch", None if not a preset.
+    """
+    if isinstance(data, dict) and data.get("mode") in MODES:
+        return data["mode"]
+
+    return None
+
+
+def read_preset(path):
+    """Parses one preset file into an index entry.
+
+    Args:
+        path (str): preset file path.
+
+    Returns:
+        dict: "mtime", "size", "mode" and "data" of the file, "mode" and
+              "data" are None if the file is not a preset.
+    """
+    stat = os.stat(path)
+    entry = {"mtime": stat.st_mtime, "size": stat.st_size,
+             "mode": None, "data": None}
+    try:
+        with open(path) as in_file:
+            data = json.load(in_file)
+    except ValueError: # when JSON file is empty or broken
+        return entry
+
+    entry["mode"] = get_preset_mode(data)
+    if entry["mode"]:
+        entry["data"] = data
+
+    return entry
+
+
+def load_index(folder):
+    """Reads the index of a folder.
+
+    Args:
+        folder (str): preset folder.
+
+    Returns:
+        dict: the index, empty if there is none or it is outdated.
+    """
+    index = {"version": INDEX_VERSION, "files": {}}
+    path = os.path.join(folder, INDEX_FILE)
+    if not os.path.isfile(path):
+        return index
+
+    try:
+        with open(path) as in_file:
+            saved = json.load(in_file)
+    except (IOError, ValueError) as e:
+        LOGGER.warning("Ignored broken index %s: %s", path, str(e))
+        return index
+
+    if (isinstance(saved, dict) and saved.get("version") == INDEX_VERSION
+            and isinstance(saved.get("files"), dict)):
+        index = saved
+
+    return index
+
+
+def save_index(folder, index):
+    """Writes the index of a folder. The file is replaced in one go so other
+    users of a shared folder never read half of it, and read-only folders
+    are simply not indexed.
+
+    Args:
+        folder (str): preset folder.
+        index (dict): see load_index.
+
+    Returns:
+        bool: True if saved, False otherwise.
+    """
+    path = os.path.join(folder, INDEX_FILE)
+    temp_path = "{}.{}.{}.tmp".format(path, os.getpid(),
+                                      threading.current_thread().ident)
+    try:
+        with open(temp_path, "w") as out_file:
+            json.dump(index, out_file)
+        if os.path.exists(path) and os.name == "nt":
+            os.remove(path) # rename does not overwrite on Windows
+        os.rename(temp_path, path)
+    except (IOError, OSError) as e:
+        LOGGER.warning("Could not save index %s: %s", path, str(e))
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        return False
+
+    return True
+
+
+def update_index(folder, index=None, callback=None):
+    """Brings the index of a folder up to date, only the preset files added
+    or changed since it was saved are parsed, and saves it if anything
+    changed.
+
+    Args:
+        folder (str): preset folder.
+        index (dict|None): index already in memory, loaded if None given.
+        callback (callable|None): called with the file name and entry of
+                                  every file, sorted by name, as soon as
+                                  the entry is up to date.
+
+    Returns:
+        dict: the updated index.
+    """
+    if index is None:
+        index = load_index(folder)
+
+    files = index["files"]
+    changed = False
+    names = set(file_name for file_name in os.listdir(folder)
+                if file_name.endswith(".json") and file_name != INDEX_FILE)
+
+    for file_name in set(files) - names: # deleted files
+        del files[file_name]
+        changed = True
+
+    for file_name in sorted(names):
+        path = os.path.join(folder, file_name)
+        try:
+            stat = os.stat(path)
+            entry = files.get(file_name)
+            if (entry is None or entry["mtime"] != stat.st_mtime
+                    or entry["size"] != stat.st_size):
+                files[file_name] = read_preset(path)
+                changed = True
+        except (IOError, OSError) as e: # deleted or locked meanwhile
+            LOGGER.warning("Could not read %s: %s", path, str(e))
+            files.pop(file_name, None)
+            changed = True
+            continue
+
+        if callback is not None:
+            callback(file_name, files[file_name])
+
+    if changed:
+        save_index(folder, index)
+
+    return index
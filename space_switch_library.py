@@ -0,0 +1,365 @@
+"""
+MODULE: space_switch_library
+
+Single file library holding all the space switch and ikfk switch presets of
+a character, so loading them costs one file open instead of one per preset.
+
+A library file is laid out as:
+    header: MAGIC followed by the byte offset of the table of contents.
+    records: one JSON preset per line, appended one after the other.
+    table of contents: JSON {"version": 1,
+                             "presets": {name: {"offset": int,
+                                                "size": int,
+                                                "mode": str}}}
+
+Any preset can be read on its own by seeking to its offset. Adding or
+replacing presets appends the new records and a new table of contents, then
+points the header at it, so the rest of the file is never rewritten and a
+crash halfway leaves the previous table of contents in charge. Replaced
+records stay in the file as dead space until PresetLibrary.compact is run.
+
+Per file presets are converted from the command line, e.g.
+
+    python space_switch_library.py import char.sslib presets/char
+    python space_switch_library.py export char.sslib presets/char
+
+FUNCTIONS:
+    is_library: checks if a path is a library file.
+    parse_args: reads the command line options.
+    main: entry point.
+
+CLASSES:
+    PresetLibrary: reads and writes a library file.
+"""
+
+__author__ = "Te Ling (Danny) Hsu"
+__copyright__ = "Copyright (c) 2020 Te Ling (Danny) Hsu"
+__license__ = "MIT License"
+__version__ = "1.0.0"
+
+import os
+import sys
+import json
+import logging
+import argparse
+
+import space_switch_index as switch_index
+
+
+LOGGER = logging.getLogger(__name__)
+
+LIBRARY_EXT = ".sslib"
+MAGIC = b"SSLIB001"
+HEADER_SIZE = len(MAGIC) + 17 # 16 digit offset and a new line
+LIBRARY_VERSION = 1
+
+
+def is_library(path):
+    """Checks if a path is a library file, by its extension.
+
+    Args:
+        path (str): any file path.
+
+    Returns:
+        bool: True if it is a library file, False otherwise.
+    """
+    return os.path.splitext(path)[1].lower() == LIBRARY_EXT
+
+
+def _encode(data):
+    """Returns a JSON object as one line of bytes.
+    """
+    return json.dumps(data).encode("utf-8") + b"\n"
+
+
+class PresetLibrary(object):
+    """Reads and writes a library file. Only the header and the table of
+    contents are read when opening it, presets are read on demand.
+    """
+    def __init__(self, path):
+        """Opens a library, an empty one if the file does not exist yet, it
+        is created on the first write.
+
+        Args:
+            path (str): library file path.
+
+        Raises:
+            ValueError: if the file is not a library.
+        """
+        self.path = path
+        self._presets = {} # table of contents, {name: record}
+        if os.path.isfile(path):
+            self._read_toc()
+
+    def __len__(self):
+        return len(self._presets)
+
+    def __contains__(self, name):
+        return name in self._presets
+
+    def _read_toc(self):
+        """Reads the table of contents the header points to.
+        """
+        with open(self.path, "rb") as in_file:
+            header = in_file.read(HEADER_SIZE)
+            if len(header) != HEADER_SIZE or not header.startswith(MAGIC):
+                raise ValueError("{} is not a preset library!".format(
+                    self.path
+                ))
+            in_file.seek(int(header[len(MAGIC):]))
+            toc = json.loads(in_file.readline().decode("utf-8"))
+
+        if toc.get("version") != LIBRARY_VERSION:
+            raise ValueError("Unsupported library version in {}!".format(
+                self.path
+            ))
+        self._presets = toc["presets"]
+
+    def names(self, mode=None):
+        """Returns the names of the presets in the library.
+
+        Args:
+            mode (str|None): only returns the presets of this switch mode.
+
+        Returns:
+            list: sorted preset names.
+        """
+        return sorted(name for name, record in self._presets.items()
+                      if mode is None or record["mode"] == mode)
+
+    def get_mode(self, name):
+        """Returns the switch mode of a preset without reading it.
+
+        Args:
+            name (str): preset name.
+
+        Returns:
+            str: "space switch" or "ikfk switch".
+        """
+        return self._presets[name]["mode"]
+
+    def get(self, name):
+        """Reads one preset.
+
+        Args:
+            name (str): preset name.
+
+        Returns:
+            dict: the preset.
+
+        Raises:
+            KeyError: if the preset is not in the library.
+        """
+        record = self._presets[name]
+        with open(self.path, "rb") as in_file:
+            in_file.seek(record["offset"])
+            return json.loads(in_file.read(record["size"]).decode("utf-8"))
+
+    def get_all(self):
+        """Reads every preset in one go.
+
+        Returns:
+            list: (name, data) pairs, sorted by name.
+        """
+        presets = []
+        with open(self.path, "rb") as in_file:
+            for name in self.names():
+                record = self._presets[name]
+                in_file.seek(record["offset"])
+                presets.append((name, json.loads(
+                    in_file.read(record["size"]).decode("utf-8")
+                )))
+
+        return presets
+
+    def add(self, name, data):
+        """Adds a preset, or replaces the one with the same name.
+
+        Args:
+            name (str): preset name.
+            data (dict): space switch or ikfk switch data.
+        """
+        self.add_many([(name, data)])
+
+    def add_many(self, presets):
+        """Adds or replaces several presets with a single write.
+
+        Args:
+            presets (list): (name, data) pairs.
+
+        Raises:
+            ValueError: if any data is not a switch preset.
+        """
+        for name, data in presets:
+            if switch_index.get_preset_mode(data) is None:
+                raise ValueError("{} is not a switch preset!".format(name))
+
+        toc = dict(self._presets)
+        if not os.path.isfile(self.path):
+            with open(self.path, "wb") as out_file:
+                out_file.write(MAGIC + b"%016d\n" % 0)
+
+        with open(self.path, "r+b") as out_file:
+            out_file.seek(0, os.SEEK_END)
+            for name, data in presets:
+                record = _encode(data)
+                toc[name] = {"offset": out_file.tell(),
+                             "size": len(record) - 1,
+                             "mode": data["mode"]}
+                out_file.write(record)
+            self._write_toc(out_file, toc)
+
+        self._presets = toc
+
+    def remove(self, name):
+        """Removes a preset, its record stays in the file until compacted.
+
+        Args:
+            name (str): preset name.
+
+        Raises:
+            KeyError: if the preset is not in the library.
+        """
+        toc = dict(self._presets)
+        del toc[name]
+        with open(self.path, "r+b") as out_file:
+            out_file.seek(0, os.SEEK_END)
+            self._write_toc(out_file, toc)
+
+        self._presets = toc
+
+    def _write_toc(self, out_file, toc):
+        """Appends a table of contents at the current position and points
+        the header at it once it is safely on disk.
+        """
+        offset = out_file.tell()
+        out_file.write(_encode({"version": LIBRARY_VERSION, "presets": toc}))
+        out_file.flush()
+        os.fsync(out_file.fileno())
+        out_file.seek(len(MAGIC))
+        out_file.write(b"%016d\n" % offset)
+
+    def compact(self):
+        """Rewrites the library without the replaced and removed records.
+        """
+        presets = self.get_all() if self._presets else []
+        temp_path = "{}.tmp".format(self.path)
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        temp = PresetLibrary(temp_path)
+        temp.add_many(presets)
+
+        if os.name == "nt":
+            os.remove(self.path) # rename does not overwrite on Windows
+        os.rename(temp_path, self.path)
+        self._presets = temp._presets
+
+    def import_folder(self, folder):
+        """Adds every preset JSON file of a folder, named after its file.
+
+        Args:
+            folder (str): folder of per file presets.
+
+        Returns:
+            list: names of the imported presets.
+        """
+        presets = []
+        for file_name in sorted(os.listdir(folder)):
+            if (not file_name.endswith(".json")
+                    or file_name == switch_index.INDEX_FILE):
+                continue
+            entry = switch_index.read_preset(os.path.join(folder, file_name))
+            if entry["mode"]:
+                presets.append((os.path.splitext(file_name)[0],
+                                entry["data"]))
+            else:
+                LOGGER.warning("Skipped %s, not a switch preset", file_name)
+
+        if presets:
+            self.add_many(presets)
+
+        return [name for name, data in presets]
+
+    def export_folder(self, folder, names=None):
+        """Writes presets out as per file JSON presets.
+
+        Args:
+            folder (str): output folder, created if needed.
+            names (list|None): presets to export, all of them if None given.
+
+        Returns:
+            list: paths of the written files.
+        """
+        if not os.path.isdir(folder):
+            os.makedirs(folder)
+
+        paths = []
+        for name in (self.names() if names is None else names):
+            path = os.path.join(folder, "{}.json".format(name))
+            with open(path, "w") as out_file:
+                json.dump(self.get(name), out_file)
+            paths.append(path)
+
+        return paths
+
+
+def parse_args(args=None):
+    """Reads the command line options.
+
+    Args:
+        args (list|None): command line arguments, sys.argv if None given.
+
+    Returns:
+        Namespace: parsed options.
+    """
+    parser = argparse.ArgumentParser(
+        description="Converts switch presets to and from a library file."
+    )
+    parser.add_argument("action",
+                        choices=("import", "export", "list", "compact"),
+                        help="import or export a folder of JSON presets, "
+                             "list or compact the library.")
+    parser.add_argument("library", help="library file.")
+    parser.add_argument("folder", nargs="?", default=None,
+                        help="folder of JSON presets, to import or export.")
+
+    return parser.parse_args(args)
+
+
+def main(args=None):
+    """Entry point.
+
+    Args:
+        args (list|None): command line arguments, sys.argv if None given.
+
+    Returns:
+        int: 0 if successful, 1 otherwise.
+    """
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    options = parse_args(args)
+    if options.action in ("import", "export") and not options.folder:
+        LOGGER.error("No folder given to %s!", options.action)
+        return 1
+
+    try:
+        library = PresetLibrary(options.library)
+        if options.action == "import":
+            names = library.import_folder(options.folder)
+            LOGGER.info("Imported %d presets", len(names))
+        elif options.action == "export":
+            paths = library.export_folder(options.folder)
+            LOGGER.info("Exported %d presets", len(paths))
+        elif options.action == "list":
+            for name in library.names():
+                LOGGER.info("%s (%s)", name, library.get_mode(name))
+        else: # options.action == "compact"
+            library.compact()
+    except (IOError, OSError, ValueError) as e:
+        LOGGER.error(str(e))
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,475 @@
+"""
+MODULE: space_switch_math
+
+Pure math used by the space switch tool. Nothing in here touches Maya, so
+it can run and be tested outside of it. Matrices follow the Maya convention:
+flat lists of 16 floats, row-major, with row vectors (translation in the last
+row), so a child's world matrix is its local matrix times its parent's.
+
+NumPy is used to vectorize the bulk solvers when it is available.
+
+FUNCTIONS:
+    multiply_matrices: multiplies two 4x4 matrices.
+    invert_matrix: inverts a 4x4 matrix.
+    euler_to_matrix: builds a rotation matrix from euler angles.
+    matrix_to_euler: extracts euler angles from a matrix.
+    unwrap_rotations: keeps a sequence of euler angles continuous.
+    solve_local_transforms: local translate and rotate from world matrices.
+    matrix_to_world_transform: world position and rotation from a matrix.
+    constrain_matrix: analytic equivalent of a parent constraint.
+    transform_to_matrix: builds a matrix from a position and rotation.
+    measure_offset: rigid offset between two world matrices.
+    solve_pole_vectors: pole vector positions of three-joint chains.
+"""
+
+__author__ = "Te Ling (Danny) Hsu"
+__copyright__ = "Copyright (c) 2020 Te Ling (Danny) Hsu"
+__license__ = "MIT License"
+__version__ = "1.0.0"
+
+import math
+
+try:
+    import numpy as np
+except ImportError: # optional, pure python is used instead
+    np = None
+
+
+EPSILON = 1e-9
+
+# how far the pole vector is pushed out from the middle of the chain, relative
+# to the distance between the elbow and the midpoint of shoulder and wrist
+POLE_DISTANCE = 4.0
+
+# same order as the rotateOrder enum of Maya's transform node
+ROTATE_ORDERS = ("xyz", "yzx", "zxy", "xzy", "yxz", "zyx")
+
+# first axis, second axis, third axis and parity of each rotate order
+_ROTATE_ORDER_AXES = ((0, 1, 2, False), (1, 2, 0, False), (2, 0, 1, False),
+                      (0, 2, 1, True), (1, 0, 2, True), (2, 1, 0, True))
+
+
+def multiply_matrices(a, b):
+    """Multiplies two 4x4 matrices, a * b.
+
+    Args:
+        a (list): 16 floats.
+        b (list): 16 floats.
+
+    Returns:
+        list: 16 floats.
+    """
+    return [sum(a[row * 4 + i] * b[i * 4 + col] for i in range(4))
+            for row in range(4) for col in range(4)]
+
+
+def invert_matrix(matrix):
+    """Inverts a 4x4 matrix, scale and shear included.
+
+    Args:
+        matrix (list): 16 floats.
+
+    Returns:
+        list: 16 floats.
+
+    Raises:
+        ValueError: if the matrix cannot be inverted.
+    """
+    # gauss-jordan elimination on the matrix next to the identity
+    rows = [list(matrix[row * 4:row * 4 + 4])
+            + [1.0 if col == row else 0.0 for col in range(4)]
+            for row in range(4)]
+    for col in range(4):
+        pivot = max(range(col, 4), key=lambda row: abs(rows[row][col]))
+        if abs(rows[pivot][col]) < EPSILON:
+            raise ValueError("The matrix cannot be inverted!")
+        rows[col], rows[pivot] = rows[pivot], rows[col]
+        rows[col] = [value / rows[col][col] for value in rows[col]]
+        for row in range(4):
+            factor = rows[row][col]
+            if row != col and factor:
+                rows[row] = [value - factor * other for value, other
+                             in zip(rows[row], rows[col])]
+
+    return [value for row in rows for value in row[4:]]
+
+
+def _axis_matrix(axis, angle):
+    """Returns the 3x3 rotation (rows) of one axis, in radians.
+    """
+    cos = math.cos(angle)
+    sin = math.sin(angle)
+    if axis == 0:
+        return [[1.0, 0.0, 0.0], [0.0, cos, sin], [0.0, -sin, cos]]
+    elif axis == 1:
+        return [[cos, 0.0, -sin], [0.0, 1.0, 0.0], [sin, 0.0, cos]]
+    return [[cos, sin, 0.0], [-sin, cos, 0.0], [0.0, 0.0, 1.0]]
+
+
+def _multiply_3x3(a, b):
+    """Multiplies two 3x3 matrices given as lists of rows.
+    """
+    return [[sum(a[row][i] * b[i][col] for i in range(3)) for col in range(3)]
+            for row in range(3)]
+
+
+def _transpose_3x3(a):
+    """Transposes a 3x3 matrix given as a list of rows.
+    """
+    return [[a[col][row] for col in range(3)] for row in range(3)]
+
+
+def euler_to_matrix(rotation, rotate_order=0):
+    """Builds a rotation matrix the same way a Maya transform does.
+
+    Args:
+        rotation (list): x, y and z rotation in degrees.
+        rotate_order (int): 0 (xyz) to 5 (zyx).
+
+    Returns:
+        list: 16 floats.
+    """
+    first, second, third = _ROTATE_ORDER_AXES[rotate_order][:3]
+    rows = _multiply_3x3(
+        _multiply_3x3(_axis_matrix(first, math.radians(rotation[first])),
+                      _axis_matrix(second, math.radians(rotation[second]))),
+        _axis_matrix(third, math.radians(rotation[third]))
+    )
+
+    return rows[0] + [0.0] + rows[1] + [0.0] + rows[2] + [0.0,
+                                                           0.0, 0.0, 0.0, 1.0]
+
+
+def _basis(matrix):
+    """Returns the upper 3x3 of a matrix as rows with the scale removed.
+    """
+    rows = []
+    for row in range(3):
+        axis = matrix[row * 4:row * 4 + 3]
+        length = math.sqrt(sum(value * value for value in axis)) or 1.0
+        rows.append([value / length for value in axis])
+
+    return rows
+
+
+def _rigid(matrix):
+    """Returns a copy of a matrix with the scale and shear removed.
+    """
+    rows = _basis(matrix)
+
+    return (rows[0] + [0.0] + rows[1] + [0.0] + rows[2] + [0.0]
+            + list(matrix[12:15]) + [1.0])
+
+
+def _rigid_inverse(matrix):
+    """Inverts a matrix without scale or shear, the transposed rotation is
+    its inverse.
+    """
+    rows = _transpose_3x3([matrix[0:3], matrix[4:7], matrix[8:11]])
+    translate = [-sum(matrix[12 + i] * rows[i][col] for i in range(3))
+                 for col in range(3)]
+
+    return (rows[0] + [0.0] + rows[1] + [0.0] + rows[2] + [0.0]
+            + translate + [1.0])
+
+
+def _rows_to_euler(rows, rotate_order):
+    """Extracts euler angles in degrees from an orthonormal 3x3 (rows).
+    """
+    first, second, third, parity = _ROTATE_ORDER_AXES[rotate_order]
+    # work on the column vector form of the matrix
+    col = _transpose_3x3(rows)
+    cos_y = math.hypot(col[first][first], col[second][first])
+    if cos_y > EPSILON:
+        angle_x = math.atan2(col[third][second], col[third][third])
+        angle_z = math.atan2(col[second][first], col[first][first])
+    else: # gimbal lock, put everything in the first axis
+        angle_x = math.atan2(-col[second][third], col[second][second])
+        angle_z = 0.0
+    angle_y = math.atan2(-col[third][first], cos_y)
+    if parity:
+        angle_x, angle_y, angle_z = -angle_x, -angle_y, -angle_z
+
+    rotation = [0.0, 0.0, 0.0]
+    rotation[first] = math.degrees(angle_x)
+    rotation[second] = math.degrees(angle_y)
+    rotation[third] = math.degrees(angle_z)
+
+    return rotation
+
+
+def matrix_to_euler(matrix, rotate_order=0):
+    """Extracts euler angles from a matrix, ignoring its scale.
+
+    Args:
+        matrix (list): 16 floats.
+        rotate_order (int): 0 (xyz) to 5 (zyx).
+
+    Returns:
+        list: x, y and z rotation in degrees.
+    """
+    return _rows_to_euler(_basis(matrix), rotate_order)
+
+
+def unwrap_rotations(rotations, reference=None, rotate_order=None):
+    """Keeps each rotation closest to the one before it, which avoids flips
+    in the baked curves. Multiples of 360 degrees are added to each axis and,
+    with a rotate order, the other euler solution of the same orientation
+    (first and last axes +180, middle axis 180 - angle) is used when it is
+    closer, so curves stay continuous when the middle axis passes 90.
+
+    Args:
+        rotations (list): x, y and z rotations in degrees, one per frame.
+        reference (list|None): rotation the first frame should stay close to.
+        rotate_order (int|None): rotate order of the rotations, 0 (xyz) to 5
+                                 (zyx). Only whole turns are added if None.
+
+    Returns:
+        list: the unwrapped rotations.
+    """
+    axes = None
+    if rotate_order is not None:
+        axes = _ROTATE_ORDER_AXES[rotate_order][:3]
+
+    result = []
+    previous = reference
+    for rotation in rotations:
+        rotation = list(rotation)
+        if previous is not None:
+            candidates = [rotation]
+            if axes is not None:
+                first, second, third = axes
+                alternate = list(rotation)
+                alternate[first] += 180.0
+                alternate[second] = 180.0 - alternate[second]
+                alternate[third] += 180.0
+                candidates.append(alternate)
+            best = None
+            for candidate in candidates:
+                candidate = [angle + 360.0 * round((prev - angle) / 360.0)
+                             for angle, prev in zip(candidate, previous)]
+                distance = sum(abs(angle - prev)
+                               for angle, prev in zip(candidate, previous))
+                # the first solution wins ties
+                if best is None or distance < best[0] - EPSILON:
+                    best = (distance, candidate)
+            rotation = best[1]
+        result.append(rotation)
+        previous = rotation
+
+    return result
+
+
+def _offset_rotations(rotate_axis, joint_orient):
+    """Returns the inverse rotate axis and joint orient as 3x3 rows, both are
+    always in xyz order on Maya nodes.
+    """
+    pre = post = None
+    if rotate_axis and any(rotate_axis):
+        pre = _transpose_3x3(_basis(euler_to_matrix(rotate_axis)))
+    if joint_orient and any(joint_orient):
+        post = _transpose_3x3(_basis(euler_to_matrix(joint_orient)))
+
+    return pre, post
+
+
+def solve_local_transforms(world_matrices, parent_inverse_matrices,
+                           rotate_order=0, rotate_axis=None,
+                           joint_orient=None, reference=None):
+    """Computes the local translate and rotate values that place a node at
+    the given world matrices, one per frame, entirely in memory. The node is
+    expected to have zeroed pivots and no shear.
+
+    Args:
+        world_matrices (list): world matrices (16 floats) of the node.
+        parent_inverse_matrices (list): parent inverse matrices of the node
+                                        on the same frames.
+        rotate_order (int): rotate order of the node, 0 (xyz) to 5 (zyx).
+        rotate_axis (list|None): rotate axis of the node in degrees.
+        joint_orient (list|None): joint orient of the node in degrees.
+        reference (list|None): rotation the first frame should stay close to.
+
+    Returns:
+        list: (translate, rotate) per frame.
+    """
+    if not world_matrices:
+        return []
+
+    if np is not None:
+        return _solve_local_transforms_numpy(world_matrices,
+                                             parent_inverse_matrices,
+                                             rotate_order, rotate_axis,
+                                             joint_orient, reference)
+
+    pre, post = _offset_rotations(rotate_axis, joint_orient)
+    translates = []
+    rotations = []
+    for world, parent_inverse in zip(world_matrices,
+                                     parent_inverse_matrices):
+        local = multiply_matrices(world, parent_inverse)
+        rows = _basis(local)
+        if pre:
+            rows = _multiply_3x3(pre, rows)
+        if post:
+            rows = _multiply_3x3(rows, post)
+        translates.append(local[12:15])
+        rotations.append(_rows_to_euler(rows, rotate_order))
+
+    return list(zip(translates, unwrap_rotations(rotations, reference,
+                                                 rotate_order)))
+
+
+def _solve_local_transforms_numpy(world_matrices, parent_inverse_matrices,
+                                  rotate_order, rotate_axis, joint_orient,
+                                  reference):
+    """Vectorized version of solve_local_transforms.
+    """
+    world = np.asarray(world_matrices, dtype=float).reshape(-1, 4, 4)
+    parent_inverse = np.asarray(parent_inverse_matrices,
+                                dtype=float).reshape(-1, 4, 4)
+    local = np.matmul(world, parent_inverse)
+
+    rows = local[:, :3, :3]
+    lengths = np.linalg.norm(rows, axis=2, keepdims=True)
+    rows = rows / np.where(lengths > EPSILON, lengths, 1.0)
+    pre, post = _offset_rotations(rotate_axis, joint_orient)
+    if pre:
+        rows = np.matmul(np.asarray(pre), rows)
+    if post:
+        rows = np.matmul(rows, np.asarray(post))
+
+    first, second, third, parity = _ROTATE_ORDER_AXES[rotate_order]
+    col = np.transpose(rows, (0, 2, 1))
+    cos_y = np.hypot(col[:, first, first], col[:, second, first])
+    regular = cos_y > EPSILON
+    angle_x = np.where(regular,
+                       np.arctan2(col[:, third, second], col[:, third, third]),
+                       np.arctan2(-col[:, second, third],
+                                  col[:, second, second]))
+    angle_y = np.arctan2(-col[:, third, first], cos_y)
+    angle_z = np.where(regular,
+                       np.arctan2(col[:, second, first], col[:, first, first]),
+                       0.0)
+    if parity:
+        angle_x, angle_y, angle_z = -angle_x, -angle_y, -angle_z
+
+    rotations = np.empty((len(local), 3))
+    rotations[:, first] = np.degrees(angle_x)
+    rotations[:, second] = np.degrees(angle_y)
+    rotations[:, third] = np.degrees(angle_z)
+
+    # picking between the two euler solutions depends on the frame before,
+    # so the unwrap runs frame by frame
+    rotations = unwrap_rotations(rotations.tolist(), reference, rotate_order)
+
+    return list(zip(local[:, 3, :3].tolist(), rotations))
+
+
+def matrix_to_world_transform(matrix, rotate_order=0):
+    """Takes a world matrix and returns the world position and rotation the
+    same way cmds.xform(query=True, worldSpace=True) reports them.
+
+    Args:
+        matrix (list): 16 floats.
+        rotate_order (int): rotate order to express the rotation in.
+
+    Returns:
+        tuple: world position and rotation (in degrees).
+    """
+    return list(matrix[12:15]), matrix_to_euler(matrix, rotate_order)
+
+
+def constrain_matrix(driver_matrix, offset_matrix=None,
+                     parent_inverse_matrix=None):
+    """Computes where a parent constraint puts the driven node, without
+    building one. Like the constraint, the driver's scale is not passed on.
+
+    Args:
+        driver_matrix (list): world matrix of the driver.
+        offset_matrix (list|None): offset of the driven node relative to the
+                                   driver, None is the same as constraining
+                                   with maintainOffset=False.
+        parent_inverse_matrix (list|None): parent inverse matrix of the
+                                           driven node, returns the local
+                                           matrix if given.
+
+    Returns:
+        list: world matrix of the driven node, or its local matrix if the
+              parent inverse matrix is given.
+    """
+    matrix = _rigid(driver_matrix)
+    if offset_matrix is not None:
+        matrix = multiply_matrices(offset_matrix, matrix)
+    if parent_inverse_matrix is not None:
+        matrix = multiply_matrices(matrix, parent_inverse_matrix)
+
+    return matrix
+
+
+def transform_to_matrix(pos, rot, rotate_order=0):
+    """Builds a world matrix from a position and rotation, the opposite of
+    matrix_to_world_transform.
+
+    Args:
+        pos (list): world position.
+        rot (list): world rotation in degrees.
+        rotate_order (int): rotate order the rotation is expressed in.
+
+    Returns:
+        list: 16 floats.
+    """
+    matrix = euler_to_matrix(rot, rotate_order)
+    matrix[12:15] = [float(value) for value in pos]
+
+    return matrix
+
+
+def measure_offset(driver_matrix, driven_matrix):
+    """Measures the rigid offset of the driven node relative to the driver,
+    so that constrain_matrix(driver_matrix, offset) gives back the driven
+    matrix without its scale.
+
+    Args:
+        driver_matrix (list): world matrix of the driver.
+        driven_matrix (list): world matrix of the driven node.
+
+    Returns:
+        list: 16 floats.
+    """
+    return multiply_matrices(_rigid(driven_matrix),
+                             _rigid_inverse(_rigid(driver_matrix)))
+
+
+def solve_pole_vectors(shoulder_positions, elbow_positions, wrist_positions,
+                       distance=POLE_DISTANCE):
+    """Computes the pole vector (ik elbow) position of a three-joint chain on
+    every frame. The elbow is pushed out from the midpoint between shoulder
+    and wrist, so the pole stays on the plane of the chain.
+
+    Args:
+        shoulder_positions (list): world positions of the shoulder, one per
+                                   frame.
+        elbow_positions (list): world positions of the elbow.
+        wrist_positions (list): world positions of the wrist.
+        distance (float): projection distance, relative to the distance
+                          between the elbow and the midpoint.
+
+    Returns:
+        list: pole vector positions, one per frame.
+    """
+    if np is not None:
+        shoulder = np.asarray(shoulder_positions, dtype=float).reshape(-1, 3)
+        elbow = np.asarray(elbow_positions, dtype=float).reshape(-1, 3)
+        wrist = np.asarray(wrist_positions, dtype=float).reshape(-1, 3)
+        midpoint = (shoulder + wrist) * 0.5
+
+        return ((elbow - midpoint) * distance + midpoint).tolist()
+
+    poles = []
+    for shoulder, elbow, wrist in zip(shoulder_positions, elbow_positions,
+                                      wrist_positions):
+        midpoint = [(s + w) * 0.5 for s, w in zip(shoulder, wrist)]
+        poles.append([(e - m) * distance + m
+                      for e, m in zip(elbow, midpoint)])
+
+    return poles
@@ -0,0 +1,195 @@
+"""
+MODULE: space_switch_plan
+
+Turns a switch preset and the user's options into an explicit plan: the
+frames to sample and the operations to write on each frame. Nothing in here
+touches Maya, plans are plain dictionaries that can be saved as JSON,
+inspected for a dry run, or merged so several plans share one sampling pass.
+Plans are run by space_switch_engine.execute_plan.
+
+A plan looks like:
+    {"mode": "space switch",
+     "direction": None, # "ikfk" or "fkik" for ikfk switch plans
+     "bake mode": "bake keyframes",
+     "sample times": [12, 24],
+     "operations": [{"action": "hold", "frame": 11},
+                    {"action": "switch", "frame": 12, "sample": 12},
+                    {"action": "reverse", "frame": 24, "sample": 24}]}
+
+Operations:
+    hold: keeps the current animation and space on the frame before a switch.
+    switch: switches to the target space (or ik/fk) on the frame, matching
+            the pose sampled on "sample".
+    reverse: switches back to the source space on the frame, used to close
+             a switched range.
+
+FUNCTIONS:
+    get_switch_controls: controls whose keys decide the frames to switch on.
+    plan_switch: compiles a plan from the keys and options of one switch.
+    merge_sample_times: union of the sample times of several plans.
+    estimate_cost: counts the samples and keys a plan is going to need.
+"""
+
+__author__ = "Te Ling (Danny) Hsu"
+__copyright__ = "Copyright (c) 2020 Te Ling (Danny) Hsu"
+__license__ = "MIT License"
+__version__ = "1.0.0"
+
+
+CURRENT_FRAME = "current frame"
+BAKE_KEYFRAMES = "bake keyframes"
+BAKE_EVERY_FRAME = "bake every frame"
+BAKE_MODES = (CURRENT_FRAME, BAKE_KEYFRAMES, BAKE_EVERY_FRAME)
+
+# how controls are posed and read back while a plan runs, see
+# space_switch_engine.execute_plans
+CMDS_TRANSFORMS = "cmds" # cmds.xform and cmds.getAttr
+API_TRANSFORMS = "api" # OpenMaya 2.0, see space_switch_engine.ApiTransforms
+TRANSFORM_MODES = (CMDS_TRANSFORMS, API_TRANSFORMS)
+
+HOLD = "hold"
+SWITCH = "switch"
+REVERSE = "reverse"
+
+
+def _operation(action, frame, sample=None):
+    """Returns one plan operation, holds do not sample anything.
+    """
+    operation = {"action": action, "frame": frame}
+    if sample is not None:
+        operation["sample"] = sample
+
+    return operation
+
+
+def get_switch_controls(data, direction=None):
+    """Returns the controls whose keys decide the frames a preset switches
+    on, which are the ones driving the pose before the switch.
+
+    Args:
+        data (dict): space switch or ikfk switch data.
+        direction (str|None): "ikfk" or "fkik" for ikfk switch data.
+
+    Returns:
+        list: control names.
+    """
+    if data["mode"] == "space switch":
+        return [data["target control"]]
+    elif direction == "ikfk":
+        return [data["ik elbow"], data["ik wrist"]]
+
+    return [data["fk shoulder"], data["fk elbow"], data["fk wrist"]]
+
+
+def plan_switch(mode, bake_mode, keyframes=None, current_frame=None,
+                time_range=None, direction=None):
+    """Compiles the plan of one switch. Anything right on top or outside the
+    outermost two keys runs regularly, anything on the inside makes a switch
+    and gets closed by switching back on its last frame.
+
+    Args:
+        mode (str): "space switch" or "ikfk switch".
+        bake_mode (str): one of BAKE_MODES.
+        keyframes (list|None): existing key times of the switched controls.
+        current_frame (int|float|None): frame to switch on in CURRENT_FRAME
+                                        mode.
+        time_range (tuple|None): first and last frame. Keys outside of it
+                                 are ignored in BAKE_KEYFRAMES mode, and it
+                                 is required in BAKE_EVERY_FRAME mode.
+        direction (str|None): "ikfk" or "fkik" for ikfk switch plans.
+
+    Returns:
+        dict: the plan, see the module docstring.
+
+    Raises:
+        ValueError: if the options are invalid or there is nothing to bake.
+    """
+    if bake_mode not in BAKE_MODES:
+        raise ValueError("Unknown bake mode: {}".format(bake_mode))
+    if mode == "ikfk switch" and direction not in ("ikfk", "fkik"):
+        raise ValueError("Unknown ikfk direction: {}".format(direction))
+
+    ref_keys = sorted(set(keyframes or [])) # rid of duplicates
+    operations = []
+
+    if bake_mode == CURRENT_FRAME:
+        if current_frame is None:
+            raise ValueError("No current frame given!")
+        operations.append(_operation(HOLD, current_frame - 1))
+        operations.append(_operation(SWITCH, current_frame, current_frame))
+
+    elif bake_mode == BAKE_KEYFRAMES:
+        keys = ref_keys
+        if time_range is not None: # only get the keys within set range
+            keys = [key for key in keys
+                    if time_range[0] <= key <= time_range[1]]
+        if not keys:
+            raise ValueError("No keys to bake!")
+
+        if keys[0] > ref_keys[0]:
+            operations.append(_operation(HOLD, keys[0] - 1))
+        for key in keys:
+            operations.append(_operation(SWITCH, key, key))
+
+        if len(keys) > 1 and keys[-1] < ref_keys[-1]:
+            # flip target and source to close chunk, the previous frame may
+            # or may not be a key so we have to be sure and switch it too
+            operations[-1] = _operation(REVERSE, keys[-1], keys[-1])
+            operations.append(_operation(SWITCH, keys[-1] - 1, keys[-1] - 1))
+
+    else: # bake_mode == BAKE_EVERY_FRAME
+        if time_range is None:
+            raise ValueError("No time range given!")
+        frames = range(int(time_range[0]), int(time_range[1]) + 1)
+
+        if ref_keys and ref_keys[0] < frames[0]:
+            operations.append(_operation(HOLD, frames[0] - 1))
+        for frame in frames:
+            operations.append(_operation(SWITCH, frame, frame))
+
+        # since it is bake every frame, no need to do the frame before
+        if ref_keys and ref_keys[-1] > frames[-1]:
+            operations[-1] = _operation(REVERSE, frames[-1], frames[-1])
+
+    operations.sort(key=lambda operation: operation["frame"])
+    sample_times = sorted(set(operation["sample"] for operation in operations
+                              if "sample" in operation))
+
+    return {"mode": mode,
+            "direction": direction,
+            "bake mode": bake_mode,
+            "sample times": sample_times,
+            "operations": operations}
+
+
+def merge_sample_times(plans):
+    """Takes several plans and returns every frame any of them samples, so
+    they can all be evaluated in a single pass over the timeline.
+
+    Args:
+        plans (list): plans returned by plan_switch.
+
+    Returns:
+        list: sorted sample times.
+    """
+    return sorted(set(time for plan in plans
+                      for time in plan["sample times"]))
+
+
+def estimate_cost(plan):
+    """Counts what a plan needs without running it, used for dry runs.
+
+    Args:
+        plan (dict): a plan returned by plan_switch.
+
+    Returns:
+        dict: number of "samples", "switches" and "holds", plus the number
+              of "keyed frames".
+    """
+    actions = [operation["action"] for operation in plan["operations"]]
+
+    return {"samples": len(plan["sample times"]),
+            "switches": actions.count(SWITCH) + actions.count(REVERSE),
+            "holds": actions.count(HOLD),
+            "keyed frames": len(set(operation["frame"]
+                                    for operation in plan["operations"]))}
@@ -0,0 +1,256 @@
+"""
+MODULE: space_switch_profile
+
+Optional instrumentation of the switch pipeline. Once enabled, every call
+to a function decorated with profiled, and every block wrapped in phase, is
+timed, and the maya.cmds calls made inside it are counted. When the
+outermost one returns, a report is logged and appended as one JSON line to
+the output file, if any:
+
+    {"name": "space_switch",
+     "seconds": 1.52,
+     "phases": {"space_switch": {"calls": 1, "seconds": 1.52},
+                "space_switch/sampling": {"calls": 1, "seconds": 0.31},
+                "space_switch/solving/key writing": {"calls": 1, ...}},
+     "commands": {"space_switch/sampling": {"keyframe": 1}, ...}}
+
+While disabled, profiled adds a single flag check per call and phase returns
+a shared no-op context, and maya.cmds is left untouched.
+
+FUNCTIONS:
+    enable: starts recording reports.
+    disable: stops recording reports.
+    is_enabled: checks if reports are recorded.
+    phase: context that times a block of code.
+    profiled: decorator that times a function.
+    format_report: human readable version of a report.
+
+CLASSES:
+    CommandCounter: stand-in for maya.cmds that counts the commands called.
+"""
+
+__author__ = "Te Ling (Danny) Hsu"
+__copyright__ = "Copyright (c) 2020 Te Ling (Danny) Hsu"
+__license__ = "MIT License"
+__version__ = "1.0.0"
+
+import sys
+import json
+import time
+import logging
+from functools import wraps
+
+
+LOGGER = logging.getLogger(__name__)
+
+# modules whose maya.cmds calls are counted, if they are imported
+INSTRUMENTED_MODULES = ("space_switch_engine", "space_switch_tool")
+
+_ENABLED = False
+_OUTPUT = None # JSON lines file the reports are appended to
+_STACK = [] # paths of the phases currently running
+_REPORT = None # report of the outermost phase currently running
+_ORIGINAL_CMDS = {} # {module name: maya.cmds}
+
+
+class CommandCounter(object):
+    """Stand-in for maya.cmds that counts the commands called, per phase,
+    then forwards them.
+    """
+    def __init__(self, cmds):
+        """Wraps the given maya.cmds module.
+
+        Args:
+            cmds (module): maya.cmds.
+        """
+        self._cmds = cmds
+        self._wrappers = {}
+
+    def __getattr__(self, name):
+        wrapper = self._wrappers.get(name)
+        if wrapper is not None:
+            return wrapper
+
+        command = getattr(self._cmds, name)
+        if not callable(command):
+            return command
+
+        @wraps(command)
+        def wrapper(*args, **kwargs):
+            if _REPORT is not None:
+                counts = _REPORT["commands"].setdefault(_STACK[-1], {})
+                counts[name] = counts.get(name, 0) + 1
+            return command(*args, **kwargs)
+
+        self._wrappers[name] = wrapper
+        return wrapper
+
+
+def enable(output=None):
+    """Starts recording a report for every outermost profiled call, and
+    counting the maya.cmds calls of the instrumented modules.
+
+    Args:
+        output (str|None): JSON lines file the reports are appended to,
+                           reports are only logged if None given.
+    """
+    global _ENABLED, _OUTPUT
+    _OUTPUT = output
+    if _ENABLED:
+        return
+
+    for module_name in INSTRUMENTED_MODULES:
+        module = sys.modules.get(module_name)
+        if module is not None and hasattr(module, "cmds"):
+            _ORIGINAL_CMDS[module_name] = module.cmds
+            module.cmds = CommandCounter(module.cmds)
+    _ENABLED = True
+
+
+def disable():
+    """Stops recording reports and puts maya.cmds back.
+    """
+    global _ENABLED, _REPORT
+    for module_name, cmds in _ORIGINAL_CMDS.items():
+        module = sys.modules.get(module_name)
+        if module is not None:
+            module.cmds = cmds
+    _ORIGINAL_CMDS.clear()
+    del _STACK[:]
+    _REPORT = None
+    _ENABLED = False
+
+
+def is_enabled():
+    """Checks if reports are recorded.
+
+    Returns:
+        bool: True if enabled, False otherwise.
+    """
+    return _ENABLED
+
+
+class _NoPhase(object):
+    """Context that does nothing, returned by phase while disabled.
+    """
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_NO_PHASE = _NoPhase()
+
+
+class _Phase(object):
+    """Context that times a block of code, see phase.
+    """
+    def __init__(self, name):
+        self.name = name
+        self.path = None
+        self.start = None
+
+    def __enter__(self):
+        global _REPORT
+        if _STACK and _STACK[-1].rsplit("/", 1)[-1] == self.name:
+            return self # recursive call, already timed
+
+        self.path = "/".join(_STACK[-1:] + [self.name])
+        if _REPORT is None:
+            _REPORT = {"name": self.name, "seconds": 0.0, "phases": {},
+                       "commands": {}}
+        _STACK.append(self.path)
+        self.start = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        global _REPORT
+        if self.path is None:
+            return False
+
+        seconds = time.time() - self.start
+        _STACK.pop()
+        if _REPORT is None: # disabled meanwhile
+            return False
+
+        stats = _REPORT["phases"].setdefault(self.path, {"calls": 0,
+                                                         "seconds": 0.0})
+        stats["calls"] += 1
+        stats["seconds"] += seconds
+
+        if not _STACK: # outermost phase, the report is complete
+            report, _REPORT = _REPORT, None
+            report["seconds"] = seconds
+            _write_report(report)
+
+        return False
+
+
+def phase(name):
+    """Returns a context that times the block of code it wraps, nested
+    phases are reported under their parent, e.g. "space_switch/sampling".
+
+    Args:
+        name (str): phase name.
+
+    Returns:
+        context: no-op context while disabled.
+    """
+    if not _ENABLED:
+        return _NO_PHASE
+
+    return _Phase(name)
+
+
+def profiled(name):
+    """Decorator that times every call of a function as a phase.
+
+    Args:
+        name (str): phase name.
+
+    Returns:
+        callable: the decorator.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _ENABLED:
+                return func(*args, **kwargs)
+            with _Phase(name):
+                return func(*args, **kwargs)
+        return wrapper
+
+    return decorator
+
+
+def format_report(report):
+    """Returns a human readable version of a report.
+
+    Args:
+        report (dict): see the module docstring.
+
+    Returns:
+        str: one line per phase, with its time, calls and maya commands.
+    """
+    lines = ["{} took {:.3f}s".format(report["name"], report["seconds"])]
+    for path in sorted(report["phases"]):
+        stats = report["phases"][path]
+        commands = report["commands"].get(path, {})
+        lines.append("  {:<40} {:>8.3f}s {:>6} call(s) {:>6} command(s)"
+                     .format(path, stats["seconds"], stats["calls"],
+                             sum(commands.values())))
+
+    return "\n".join(lines)
+
+
+def _write_report(report):
+    """Logs a finished report and appends it to the output file.
+    """
+    LOGGER.info(format_report(report))
+    if _OUTPUT:
+        try:
+            with open(_OUTPUT, "a") as out_file:
+                out_file.write(json.dumps(report) + "\n")
+        except IOError as e:
+            LOGGER.warning("Could not write the report: %s", str(e))
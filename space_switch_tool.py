@@ -3,6 +3,8 @@ MODULE: space_switch_tool
 
 CLASSES:
     SpaceSwitchTool: class for main UI and space switch methods.
+    PresetScanner: class that reads a preset folder on a worker thread.
+    PresetScanSignals: class holding the signals of PresetScanner.
     CustomIntValidator: class to reimplement the QIntValidator.
     ClickableLabel: class to reimplement the QLabel.
 """
@@ -22,10 +24,15 @@ from functools import partial
 import maya.mel as mel
 import maya.cmds as cmds
 import shiboken2 as shiboken
-import maya.api.OpenMaya as om
 import maya.OpenMayaUI as OpenMayaUI
 from PySide2 import QtWidgets, QtGui, QtCore
 
+import space_switch_plan as switch_plan
+import space_switch_index as switch_index
+import space_switch_library as switch_library
+import space_switch_engine as engine
+import space_switch_profile as switch_profile
+
 
 LOGGER = logging.getLogger(__name__)
 
@@ -136,48 +143,6 @@ def check_rotate_order(source, target):
     return False
 
 
-def constrain_move_key(driver, driven, constraintType):
-    """Taken from Veronica's ikfk matching script, instead of using xform, which
-    is behaving inconsistently, use constraint, get the value and apply.
-
-    TODO: figure out why the broken code works on norman rig but not the legit one ;_;
-
-    Args:
-        driver (str): a parent transform node.
-        driven (str): a child transform node.
-        constraintType (str): any Maya constraint type.
-
-    Returns:
-        list: a list of nodes that is not None and exists in Maya.
-    """
-    # create a hold positio locator at where driver is (avoid cycle error)  
-    loc = cmds.spaceLocator(name="temp")[0]
-    cmds.parent(loc, driver)
-    cmds.setAttr("{}.translate".format(loc), 0, 0, 0)
-    cmds.setAttr("{}.rotate".format(loc), 0, 0, 0)
-    cmds.parent(loc, world=True)
-    # cmds.delete(cmds.parentConstraint(driver, loc, maintainOffset=False))
-
-    execStr = ('con = cmds.%s(loc, driven, maintainOffset=False)[0]'
-               % constraintType)
-    exec(execStr)
-    location = cmds.xform(driven, query=True, translation=True,
-                          worldSpace=True)
-    rotation = cmds.xform(driven, query=True, rotation=True, worldSpace=True)
-    cmds.delete(con, loc)
-    return location, rotation
-
-    # # this works in Veronica's script(pyMel), try to replicate it
-    # execStr = ('con = %s(driver, driven, maintainOffset=False)'
-    #            % constraintType)
-    # exec(execStr)
-    # location = cmds.xform(driven, query=True, translation=True,
-    #                       worldSpace=True)
-    # rotation = cmds.xform(driven, query=True, rotation=True, worldSpace=True)
-    # delete(con.name())
-    # return location, rotation
-
-
 def lock_viewport():
     """Finds Maya viewport and locks it down to save viewport feedback time.
     """
@@ -217,47 +182,6 @@ def filter_invalid_objects(objects):
     return objs
 
 
-def create_transform_keys(objects=None, time=None,
-                          tx=False, ty=False, tz=False,
-                          rx=False, ry=False, rz=False,
-                          sx=False, sy=False, sz=False):
-    """Takes an object list and sets keys on the transform channels
-    based on the flags given. It is primary used to deal with cmds.setKeyframe
-    function so we can avoid repeating string formatting.
-
-    Args:
-        objects (list): a list of any transform nodes.
-        time (int|float|None): frame number to set key frame on, set on
-                               current frame if None given.
-        tx (bool): translate X channel, keyed if set to True.
-        ty (bool): translate Y channel, keyed if set to True.
-        tz (bool): translate Z channel, keyed if set to True.
-        rx (bool): rotate X channel, keyed if set to True.
-        ry (bool): rotate Y channel, keyed if set to True.
-        rz (bool): rotate Z channel, keyed if set to True.
-        sx (bool): scale X channel, keyed if set to True.
-        sy (bool): scale Y channel, keyed if set to True.
-        sz (bool): scale Z channel, keyed if set to True.
-    """                
-    objs = filter_invalid_objects(objects) or cmds.ls(selection=True)
-    if not objs: # return if nothing is found
-        LOGGER.warning("No valid objects were found to create transform keys")
-        return
-
-    if time is None:
-        time = cmds.currentTime(query=True)
-
-    attr_dict = {"translateX":tx, "translateY":ty, "translateZ":tz,
-                 "rotateX":rx, "rotateY":ry, "rotateZ":rz,
-                 "scaleX":sx, "scaleY":sy, "scaleZ":sz}
-    
-    for obj in objs:
-        for attr in attr_dict:
-            if attr_dict[attr] is True:
-                cmds.setKeyframe("{}.{}".format(obj, attr),
-                                  time=(time, time))
-
-
 def get_timeline_range():
     """Returns the minimum and maximum frame numbers of the current
     playback range, and calculates the difference to find time range.
@@ -346,46 +270,6 @@ def double_warning(msg, title='Warning!'):
     QtWidgets.QMessageBox.warning(None, title, msg)
 
 
-def get_world_matrix(ctl):
-    """Takes one transform node and returns its position and rotation
-    in world space.
-
-    Args:
-        ctl (str): a transform node.
-
-    Returns:
-        tuple: world position and rotation of the control,
-               and returns None if control is invalid.
-    """
-    # check if ctl exists and is a transform node
-    transform = cmds.ls(ctl, type="transform")
-    if transform: # TODO: log this
-        pos = cmds.xform(ctl, query=True, translation=True, worldSpace=True)
-        rot = cmds.xform(ctl, query=True, rotation=True, worldSpace=True)
-    else:
-        LOGGER.warning("This is not a transfomr node!")
-        pos = None
-        rot = None
-
-    return pos, rot
-
-
-def apply_world_matrix(ctl, pos, rot):
-    """Takes one transform node and a set of world position and
-    rotation, and applies the latter on the former.
-
-    Args:
-        ctl (str): a transform node.
-        pos (list): a world position.
-        rot (list): a world rotation.
-    """
-    # check if ctl exists and is a transform node
-    transform = cmds.ls(ctl, type="transform")
-    if transform:
-        cmds.xform(ctl, translation=pos, worldSpace=True)
-        cmds.xform(ctl, rotation=rot, worldSpace=True)
-
-
 def get_maya_window():
     """Takes Maya's main window and wraps it as QMainWindow so it can
     be set as parent of any Qt objects.
@@ -412,6 +296,10 @@ def open_UI():
     except Exception, e:
         LOGGER.warning(e)
 
+    # timing reports of every switch, see space_switch_profile
+    if os.environ.get("SPACE_SWITCH_PROFILE"):
+        switch_profile.enable(os.environ["SPACE_SWITCH_PROFILE"])
+
     mayaPtr = get_maya_window()
     space_switch_win = SpaceSwitchTool("Space Switch Tool", mayaPtr)
     space_switch_win.show()
@@ -427,6 +315,44 @@ class ClickableLabel(QtWidgets.QLabel):
         self.clicked.emit()
 
 
+class PresetScanSignals(QtCore.QObject):
+    """Signals of PresetScanner, QRunnable is not a QObject.
+    """
+    preset_read = QtCore.Signal(int, str, object) # scan id, file name, entry
+    finished = QtCore.Signal(int) # scan id
+
+
+class PresetScanner(QtCore.QRunnable):
+    """Reads and parses the presets of a folder on a QThreadPool thread, see
+    space_switch_index.update_index. Every preset is sent back as soon as it
+    is read, scene validation is left to the main thread.
+    """
+    def __init__(self, scan_id, folder):
+        """Sets up the scan.
+
+        Args:
+            scan_id (int): sent back with the results, so results of an
+                           outdated scan can be ignored.
+            folder (str): preset folder.
+        """
+        super(PresetScanner, self).__init__()
+        self.scan_id = scan_id
+        self.folder = folder
+        self.signals = PresetScanSignals()
+
+    def run(self):
+        """Scans the folder, runs on the worker thread.
+        """
+        try:
+            switch_index.update_index(self.folder, callback=partial(
+                self.signals.preset_read.emit, self.scan_id
+            ))
+        except (IOError, OSError) as e: # folder deleted meanwhile
+            LOGGER.warning(e)
+        finally:
+            self.signals.finished.emit(self.scan_id)
+
+
 class CustomIntValidator(QtGui.QIntValidator):
     """Reimplements the validate method of QIntValidator to
     accommodate an empty string user input.
@@ -450,6 +376,8 @@ class SpaceSwitchTool(QtWidgets.QDialog):
     TODO: take care of QLineEdit setFocus() issue.
     """
     folder_path_str = ""
+    # options of engine.PerformanceContext, e.g. {"evaluation_mode": "off"}
+    performance_settings = {}
     def __init__(self, win_name, parent=None):
         """Sets up all UI components.
 
@@ -474,6 +402,11 @@ class SpaceSwitchTool(QtWidgets.QDialog):
         # declare and initialize variable
         self._selected_item = None
         self._file_list_items = {}
+        self._preset_sources = {} # {item name: (path, library preset name)}
+        self._scan_id = 0 # bumped on every refresh, see populate_list_widget
+        self._scanned_presets = [] # waiting to be validated
+        self._scanned_names = set() # item names seen by the current scan
+        self._file_stamps = {} # {item name: (mtime, size)} of valid files
         self._space_switch_data_dict = {"mode":"space switch",
                                         "target control":"",
                                         "source space":[],
@@ -514,8 +447,13 @@ class SpaceSwitchTool(QtWidgets.QDialog):
         )
         self._load_path_btn = QtWidgets.QPushButton()
         self._refresh_list_btn = QtWidgets.QPushButton()
-        self._file_list_widget = QtWidgets.QListWidget() # single selection
+        self._watch_folder_btn = QtWidgets.QPushButton()
+        self._folder_watcher = QtCore.QFileSystemWatcher(self)
+        self._watch_timer = QtCore.QTimer(self) # debounces folder changes
+        self._file_list_widget = QtWidgets.QListWidget() # multi selection
+        self._scan_timer = QtCore.QTimer(self) # batches scanned presets
         self._list_item_popup_menu = QtWidgets.QMenu(self)
+        self._run_selected_action = QtWidgets.QAction("run selected", self)
         self._delete_action = QtWidgets.QAction("delete", self)
         self._tutorial_lbl = QtWidgets.QLabel(self._tutorial_txt)
         self._main_switch_side_lyt = QtWidgets.QVBoxLayout()
@@ -566,6 +504,8 @@ class SpaceSwitchTool(QtWidgets.QDialog):
         self._bakeKeyframes_radbtn = QtWidgets.QRadioButton("bake keyframes")
         self._everyFrame_radbtn = QtWidgets.QRadioButton("bake every frame")     
         self._set_time_range_chkbx = QtWidgets.QCheckBox("set time range")
+        self._bake_results_chkbx = QtWidgets.QCheckBox("bakeResults")
+        self._api_transforms_chkbx = QtWidgets.QCheckBox("OpenMaya")
         self._start_frame_field = QtWidgets.QLineEdit(self._start_frame)
         self._end_frame_field = QtWidgets.QLineEdit(self._end_frame)
         self._connect_lbl = QtWidgets.QLabel("to")
@@ -584,6 +524,9 @@ class SpaceSwitchTool(QtWidgets.QDialog):
         self._connect_signals()
         self.populate_list_widget()
 
+        # reuse sampled matrices between switches while the UI is open
+        engine.get_matrix_cache()
+
     def _set_widgets(self):
         '''Sets all parameters for the widgets.
         '''
@@ -624,9 +567,23 @@ class SpaceSwitchTool(QtWidgets.QDialog):
         )
         self._refresh_list_btn.setIcon(refresh_list_icon)
         self._refresh_list_btn.setFixedSize(24,24)       
+        watch_folder_icon = QtWidgets.QApplication.style().standardIcon(
+            QtWidgets.QStyle.SP_FileDialogContentsView
+        )
+        self._watch_folder_btn.setIcon(watch_folder_icon)
+        self._watch_folder_btn.setFixedSize(24,24)
+        self._watch_folder_btn.setCheckable(True)
+        self._watch_folder_btn.setToolTip("Keep the list in sync with the "
+                                          "folder")
+        self._watch_timer.setSingleShot(True)
+        self._watch_timer.setInterval(500) # a bulk copy is one refresh
         self._file_list_widget.setContextMenuPolicy(
             QtCore.Qt.CustomContextMenu
         )
+        self._file_list_widget.setSelectionMode(
+            QtWidgets.QAbstractItemView.ExtendedSelection # ctrl/shift click
+        )
+        self._list_item_popup_menu.addAction(self._run_selected_action)
         self._list_item_popup_menu.addAction(self._delete_action)
         self._tutorial_lbl.setMargin(10)
 
@@ -678,6 +635,13 @@ class SpaceSwitchTool(QtWidgets.QDialog):
         self._end_frame_field.setValidator(CustomIntValidator())
         self._end_frame_field.setFixedWidth(40)
         self._time_range_widget.setDisabled(True)
+        self._bake_results_chkbx.setEnabled(False) # bake every frame only
+        self._bake_results_chkbx.setToolTip(
+            "Bake space switches every frame with Maya's bakeResults"
+        )
+        self._api_transforms_chkbx.setToolTip(
+            "Pose the controls with OpenMaya instead of cmds while switching"
+        )
 
         # set main switch button state
         self._swtich_btn.setEnabled(False)
@@ -770,6 +734,7 @@ class SpaceSwitchTool(QtWidgets.QDialog):
         main_switch_folder_lyt.addWidget(self._folder_path_field)
         main_switch_folder_lyt.addWidget(self._load_path_btn)
         main_switch_folder_lyt.addWidget(self._refresh_list_btn)
+        main_switch_folder_lyt.addWidget(self._watch_folder_btn)
         main_switch_list_lyt.addWidget(self._file_list_widget)
         main_switch_list_lyt.addLayout(self._main_switch_side_lyt)
         self._main_switch_tab.setLayout(self._main_switch_side_lyt)
@@ -821,6 +786,8 @@ class SpaceSwitchTool(QtWidgets.QDialog):
         bake_mode_lyt.addStretch()
         time_range_option_lyt.addWidget(self._set_time_range_chkbx)
         time_range_option_lyt.addWidget(self._time_range_widget)
+        time_range_option_lyt.addWidget(self._bake_results_chkbx)
+        time_range_option_lyt.addWidget(self._api_transforms_chkbx)
         time_range_lyt.addWidget(self._start_frame_field)
         time_range_lyt.addWidget(self._connect_lbl)
         time_range_lyt.addWidget(self._end_frame_field)
@@ -838,13 +805,19 @@ class SpaceSwitchTool(QtWidgets.QDialog):
 
         # connect main switch buttons
         self._tabs.currentChanged.connect(self._tab_changed)
+        self._scan_timer.timeout.connect(self._add_scanned_presets)
         self._folder_path_field.editingFinished.connect(self._folder_path_changed)
         self._load_path_btn.clicked.connect(self.get_folder_path)
         self._refresh_list_btn.clicked.connect(self.populate_list_widget)
+        self._watch_folder_btn.toggled.connect(self._watch_toggled)
+        self._folder_watcher.directoryChanged.connect(self._folder_changed)
+        self._folder_watcher.fileChanged.connect(self._folder_changed)
+        self._watch_timer.timeout.connect(self.sync_list_widget)
         self._file_list_widget.itemClicked.connect(self._list_item_selected)
         self._file_list_widget.customContextMenuRequested.connect(
             self._context_menu
         )
+        self._run_selected_action.triggered.connect(self.run_selected)
         self._delete_action.triggered.connect(self._delete_item)
 
         # connect space switch buttons
@@ -927,6 +900,9 @@ class SpaceSwitchTool(QtWidgets.QDialog):
         self._set_time_range_chkbx.stateChanged.connect(
             self._toggle_time_range
         )
+        self._everyFrame_radbtn.toggled.connect(
+            self._bake_results_chkbx.setEnabled
+        )
         self._start_frame_field.editingFinished.connect(self._set_start_frame)
         self._end_frame_field.editingFinished.connect(self._set_end_frame)
 
@@ -947,7 +923,7 @@ class SpaceSwitchTool(QtWidgets.QDialog):
         
         else:
             # deselect any list item when tab is changed
-            self._file_list_widget.setItemSelected(self._selected_item, False) 
+            self._file_list_widget.clearSelection()
             self._selected_item = None
 
             if tab is self._space_switch_tab:
@@ -971,11 +947,14 @@ class SpaceSwitchTool(QtWidgets.QDialog):
         Args:
             point (QPoint): show coordinates at where mouse is clicked.
         """
-        item = self._file_list_widget.selectedItems()
-        if item:
-            item = item[0] # list widget is limited to single selection
+        items = self._file_list_widget.selectedItems()
+        if items:
+            item = self._file_list_widget.currentItem()
+            if item not in items: # current item may have been deselected
+                item = items[0]
             if item is not self._selected_item:
                 self._update_selected_item(item)
+            self._update_multi_selection()
             self._list_item_popup_menu.popup(
                 self._file_list_widget.mapToGlobal(point)
             )
@@ -989,7 +968,9 @@ class SpaceSwitchTool(QtWidgets.QDialog):
         """
         folder_name = self._folder_path_field.text()
         if os.path.isdir(folder_name):
-            SpaceSwitchTool.folder_path_str = folder_name
+            if folder_name != SpaceSwitchTool.folder_path_str:
+                SpaceSwitchTool.folder_path_str = folder_name
+                self._watched_folder_changed()
         else:
             # in case the directory is no longer valid
             if self.validate_directory():
@@ -1031,13 +1012,34 @@ class SpaceSwitchTool(QtWidgets.QDialog):
         left mouse clikc).
         """
         item = self._file_list_widget.currentItem()
-        if item is self._selected_item:
+        items = self._file_list_widget.selectedItems()
+        if len(items) > 1: # ctrl/shift click, items run as one job
+            if item in items and item is not self._selected_item:
+                self._update_selected_item(item)
+            self._update_multi_selection()
+        elif item is self._selected_item:
             self._file_list_widget.setItemSelected(item, False) # deselect
             self._selected_item = None
             self._list_item_deselected()
             # leave the data_dict be, no need to empty it when deselect
-        else:
-            self._update_selected_item(item)
+        elif items:
+            self._update_selected_item(items[0])
+        else: # current item was deselected with ctrl click
+            self._selected_item = None
+            self._list_item_deselected()
+
+    def _update_multi_selection(self):
+        """Updates the switch button and the run selected action based on how
+        many list items are selected.
+        """
+        items = self._file_list_widget.selectedItems()
+        self._run_selected_action.setEnabled(bool(items))
+        if len(items) > 1:
+            modes = [self._file_list_items[item.text()]["mode"]
+                     for item in items]
+            self._swtich_btn.setText("Switch Selected ({})".format(len(items)))
+            self._swtich_btn.setEnabled(True)
+            self._ikfk_mode_widget.setEnabled("ikfk switch" in modes)
 
     def _list_item_deselected(self):
         """Disable widgets when list item is deselected.
@@ -1046,21 +1048,47 @@ class SpaceSwitchTool(QtWidgets.QDialog):
         self._swtich_btn.setEnabled(False)
         self._swtich_btn.setText("Please Select an Item")
 
-    def _add_item(self, name, data):
+    def _add_item(self, name, data, source=None):
         """Internal method that adds the imported data into list widget. This
         method is not responsible for checking whether the data is valid!
 
         Args:
             name (str): file name, title of the list widget item.
             data (dict): either an space switch or ikfk switch dictionary
+            source (tuple|None): path of the file the data was loaded from
+                                 and its preset name if it is a library,
+                                 see _save_item_calibration.
         """      
         if self._file_list_widget.findItems(name, QtCore.Qt.MatchExactly):
             double_warning("Item already exists in the list!")
             return
 
         self._file_list_items[name] = data
+        if source:
+            self._preset_sources[name] = source
         self._file_list_widget.addItem(name)
 
+    def _save_item_calibration(self, name):
+        """Writes the ikfk calibration of a list item back to the file it was
+        loaded from, so the offsets are not measured again next session.
+
+        Args:
+            name (str): title of the list widget item.
+        """
+        path, preset_name = self._preset_sources.get(name, (None, None))
+        if not path:
+            return
+
+        data = self._file_list_items[name]
+        try:
+            if preset_name is None:
+                with open(path, "w") as out_file:
+                    json.dump(data, out_file)
+            else:
+                switch_library.PresetLibrary(path).add(preset_name, data)
+        except (IOError, ValueError), msg:
+            LOGGER.warning("Calibration of %s not saved: %s", name, msg)
+
     def _delete_item(self):
         """Internal method that executes when delete action on the right click
         menu is triggered. Cleans up the internal data.
@@ -1071,13 +1099,14 @@ class SpaceSwitchTool(QtWidgets.QDialog):
         name = self._selected_item.text()
         self._file_list_widget.takeItem(row) # does not clean up
         self._file_list_items.pop(name)
+        self._preset_sources.pop(name, None)
         del self._selected_item # clean up item widget
         
         # handles the next selection, keep consistency in behavior
         item = self._file_list_widget.selectedItems()
         if item:
-            item = item[0] # list widget is limited to single selection
-            self._update_selected_item(item)
+            self._update_selected_item(item[0])
+            self._update_multi_selection()
         else: # the list is emptied
             self._selected_item = None
             self._list_item_deselected()
@@ -1115,10 +1144,29 @@ class SpaceSwitchTool(QtWidgets.QDialog):
         # if default_dir is empty, goes to the default Maya folder
         default_dir = SpaceSwitchTool.folder_path_str or get_current_folder() 
         default_path = os.path.join(default_dir, "{}.json".format(name))
-        file_name = QtWidgets.QFileDialog.getSaveFileName(self, "Save",
-                                                          default_path,
-                                                          "*.json")[0]
-        if file_name:
+        file_name = QtWidgets.QFileDialog.getSaveFileName(
+            self, "Save", default_path,
+            "*.json;;*{}".format(switch_library.LIBRARY_EXT)
+        )[0]
+        if not file_name:
+            return
+
+        # record node uuids so the preset survives renames
+        if self.validate_switch_data(data["mode"], data):
+            engine.bind_switch_data(data)
+
+        if switch_library.is_library(file_name):
+            # adds or replaces the preset inside the character library
+            name, ok = QtWidgets.QInputDialog.getText(self, "Save",
+                                                      "Preset name:",
+                                                      text=name)
+            if not ok or not name:
+                return
+            try:
+                switch_library.PresetLibrary(file_name).add(name, data)
+            except (IOError, ValueError), msg:
+                double_warning(str(msg))
+        else:
             with open(file_name, "w") as out_file:
                 json.dump(data, out_file)
 
@@ -1129,20 +1177,26 @@ class SpaceSwitchTool(QtWidgets.QDialog):
             # if default_dir is empty, goes to the last opened folder
             default_dir = (SpaceSwitchTool.folder_path_str
                            or get_current_folder())
-            file_name = QtWidgets.QFileDialog.getOpenFileName(self, "Load",
-                                                              default_dir,
-                                                              "*.json")[0]
+            file_name = QtWidgets.QFileDialog.getOpenFileName(
+                self, "Load", default_dir,
+                "*.json *{}".format(switch_library.LIBRARY_EXT)
+            )[0]
             if not file_name:
                 return
 
-        with open(file_name) as in_file:
-            try:
-                data = json.load(in_file)
-            except ValueError, msg: # when JSON file is empty
-                double_warning(str(msg))
+        tab = self._tabs.currentWidget()
+        if switch_library.is_library(file_name):
+            data = self._load_library_preset(file_name, tab)
+            if data is None:
                 return
+        else:
+            with open(file_name) as in_file:
+                try:
+                    data = json.load(in_file)
+                except ValueError, msg: # when JSON file is empty
+                    double_warning(str(msg))
+                    return
 
-        tab = self._tabs.currentWidget()
         warning_msg = ("Invalid json file selected!\nMake sure the "
                        "selected json file is a proper\nspace switch "
                        "data and target rigs are loaded in the scene")
@@ -1169,11 +1223,58 @@ class SpaceSwitchTool(QtWidgets.QDialog):
             valid = (self.validate_switch_data("space switch", data)
                      or self.validate_switch_data("ikfk switch", data))
             if valid:
-                self._add_item(name, data)
+                self._add_item(name, data, (file_name, None))
             else:
                 if give_warning: # disable warning when populating list widget
                     double_warning(warning_msg)
 
+    def _load_library_preset(self, file_name, tab):
+        """Loads presets from a character library. The main switch tab gets
+        every valid preset of the library, the other tabs let the user pick
+        one preset of their mode.
+
+        Args:
+            file_name (str): library file path.
+            tab (QWidget): current tab.
+
+        Returns:
+            dict|None: the picked preset, None if nothing is left to load.
+        """
+        try:
+            library = switch_library.PresetLibrary(file_name)
+        except (IOError, ValueError), msg:
+            double_warning(str(msg))
+            return None
+
+        if tab is self._main_switch_tab:
+            invalid = []
+            for name, data in library.get_all():
+                if self.validate_switch_data(data["mode"], data):
+                    self._add_item(name, data, (file_name, name))
+                else:
+                    invalid.append(name)
+            if invalid:
+                double_warning("Presets not matching the scene:\n{}".format(
+                    "\n".join(invalid)
+                ))
+            return None
+
+        mode = "ikfk switch"
+        if tab is self._space_switch_tab:
+            mode = "space switch"
+        names = library.names(mode)
+        if not names:
+            double_warning("No {} preset in this library!".format(mode))
+            return None
+
+        name, ok = QtWidgets.QInputDialog.getItem(self, "Load",
+                                                  "Preset name:", names,
+                                                  editable=False)
+        if not ok:
+            return None
+
+        return library.get(name)
+
     def _toggle_time_range(self):
         """When checked, makes custom time range section available for user.
         """
@@ -1229,26 +1330,175 @@ class SpaceSwitchTool(QtWidgets.QDialog):
             # this will NOT trigger the editingFinished for QLineEdit
             self._folder_path_field.setText(folder_name)
             SpaceSwitchTool.folder_path_str = folder_name
+            self._watched_folder_changed()
 
         self.setFocus()
 
     def populate_list_widget(self):
-        """Read folder directory and re-populate the list widget.
+        """Read folder directory and re-populate the list widget. The files
+        are read on a worker thread and added as they arrive, see
+        _preset_scanned.
         """
-        # clear list
+        # clear list, results of a scan still running are ignored
         self._file_list_widget.clear()
         self._file_list_items = {}
+        self._preset_sources = {}
+        self._file_stamps = {}
+        self._scan_id += 1
 
         if self.validate_directory():
-            path = SpaceSwitchTool.folder_path_str
-            data_files = [f for f in os.listdir(path) if f.endswith(".json")]
-            for f in data_files:
-                file_path = os.path.join(path, f)
-                self._load_switch_data(file_name=file_path, give_warning=False)
+            self._start_scan()
 
             # disable widget state to "nothing selected"
             self._list_item_deselected()
 
+    def sync_list_widget(self):
+        """Re-scans the folder but only adds, updates or removes the list
+        items whose files were added, edited or deleted since the last scan.
+        """
+        if self.validate_directory():
+            self._start_scan()
+
+    def _start_scan(self):
+        """Starts a PresetScanner on the current folder, see _scan_finished.
+        """
+        self._scanned_presets = []
+        self._scanned_names = set()
+        self._scan_id += 1
+        scanner = PresetScanner(self._scan_id, SpaceSwitchTool.folder_path_str)
+        scanner.signals.preset_read.connect(self._preset_scanned)
+        scanner.signals.finished.connect(self._scan_finished)
+        QtCore.QThreadPool.globalInstance().start(scanner)
+
+    def _preset_scanned(self, scan_id, file_name, entry):
+        """Queues a file read by PresetScanner, queued files are validated in
+        batches so the UI is not redrawn for every file.
+
+        Args:
+            scan_id (int): scan the file comes from.
+            file_name (str): file name.
+            entry (dict): index entry, see space_switch_index.read_preset.
+        """
+        if scan_id != self._scan_id:
+            return
+
+        self._scanned_presets.append((file_name, entry))
+        if not self._scan_timer.isActive():
+            self._scan_timer.start(50)
+
+    def _scan_finished(self, scan_id):
+        """Adds the last presets of a scan and removes the items whose file
+        is gone.
+
+        Args:
+            scan_id (int): scan that finished.
+        """
+        if scan_id != self._scan_id:
+            return
+
+        self._add_scanned_presets()
+        for name in set(self._file_stamps) - self._scanned_names:
+            del self._file_stamps[name] # file deleted or renamed
+            if name in self._file_list_items:
+                self._remove_item(name)
+
+        self._update_folder_watcher() # new files need watching too
+
+    def _add_scanned_presets(self):
+        """Validates the queued files against the scene, adds the valid
+        presets to the list widget and updates or removes the items whose
+        file changed since the last scan. Only the files of valid presets
+        are stamped, invalid ones are validated again on every scan.
+        """
+        self._scan_timer.stop()
+        presets, self._scanned_presets = self._scanned_presets, []
+        for file_name, entry in presets:
+            name = os.path.splitext(file_name)[0]
+            stamp = (entry["mtime"], entry["size"])
+            self._scanned_names.add(name)
+            if self._file_stamps.get(name) == stamp:
+                continue # unchanged and valid since the last scan
+
+            if not (entry["mode"] and self.validate_switch_data(
+                    entry["mode"], entry["data"])):
+                # not stamped, its nodes may be in the scene by the next scan
+                self._file_stamps.pop(name, None)
+                if name in self._file_list_items:
+                    self._remove_item(name)
+                continue
+
+            self._file_stamps[name] = stamp
+            if name in self._file_list_items: # file edited
+                self._file_list_items[name] = entry["data"]
+                if (self._selected_item is not None
+                        and self._selected_item.text() == name):
+                    self._update_selected_item(self._selected_item)
+            else:
+                self._add_item(name, entry["data"], (
+                    os.path.join(SpaceSwitchTool.folder_path_str, file_name),
+                    None
+                ))
+
+    def _remove_item(self, name):
+        """Removes a list item whose file is gone or no longer valid.
+
+        Args:
+            name (str): title of the list widget item.
+        """
+        item = self._file_list_widget.findItems(name,
+                                                QtCore.Qt.MatchExactly)[0]
+        self._file_list_widget.takeItem(self._file_list_widget.row(item))
+        self._file_list_items.pop(name)
+        self._preset_sources.pop(name, None)
+        if item is self._selected_item:
+            self._selected_item = None
+            self._list_item_deselected()
+
+    def _watch_toggled(self, checked):
+        """Starts or stops watching the folder, syncs the list right away.
+
+        Args:
+            checked (bool): state of the watch button.
+        """
+        self._update_folder_watcher()
+        if checked:
+            self.sync_list_widget()
+
+    def _watched_folder_changed(self):
+        """Loads the new folder right away when the folder is watched.
+        """
+        if self._watch_folder_btn.isChecked():
+            self.populate_list_widget()
+
+    def _update_folder_watcher(self):
+        """Watches the current folder and its preset files while the watch
+        button is checked, stops watching otherwise.
+        """
+        paths = (self._folder_watcher.files()
+                 + self._folder_watcher.directories())
+        if paths:
+            self._folder_watcher.removePaths(paths)
+
+        folder = SpaceSwitchTool.folder_path_str
+        if (not self._watch_folder_btn.isChecked() or not folder
+                or not os.path.isdir(folder)):
+            return
+
+        self._folder_watcher.addPath(folder)
+        files = [os.path.join(folder, f) for f in os.listdir(folder)
+                 if f.endswith(".json") and f != switch_index.INDEX_FILE]
+        if files:
+            self._folder_watcher.addPaths(files)
+
+    def _folder_changed(self, path):
+        """Restarts the debounce timer on every change in the watched folder,
+        the list is synced once the changes settle.
+
+        Args:
+            path (str): changed file or folder.
+        """
+        self._watch_timer.start()
+
     def _populate_space_switch_UI(self):
         """Read internal data and populate the space switch UI.
         """
@@ -1322,11 +1572,16 @@ class SpaceSwitchTool(QtWidgets.QDialog):
             value = cmds.getAttr(attr[0])
             if key in ["source space", "target space"]:
                 self._space_switch_data_dict[key] = [attr[0], value]
+                # recorded uuid no longer applies
+                self._space_switch_data_dict.get("nodes", {}).pop(key, None)
                 if self.validate_switch_data("space switch"):
                     # enable if data is complete
                     self._swtich_btn.setEnabled(True)
             else:
                 self._ikfk_switch_data_dict[key] = [attr[0], value]
+                # measured offsets and recorded uuid no longer apply
+                self._ikfk_switch_data_dict.pop("calibration", None)
+                self._ikfk_switch_data_dict.get("nodes", {}).pop(key, None)
                 if self.validate_switch_data("ikfk switch"):
                     # enable if data is complete
                     self._swtich_btn.setEnabled(True)
@@ -1339,6 +1594,7 @@ class SpaceSwitchTool(QtWidgets.QDialog):
             self._space_switch_data_dict[key] = []
         else: # attributes for ik/fk switch
             self._ikfk_switch_data_dict[key] = []
+            self._ikfk_switch_data_dict.pop("calibration", None)
         double_warning(
             "Invalid selection!\n--- please load {} ---".format(key)
         )
@@ -1359,11 +1615,16 @@ class SpaceSwitchTool(QtWidgets.QDialog):
         if len(sel) == 1: # only allow one selected object
             if key == "target control":
                 self._space_switch_data_dict[key] = sel[0]
+                # recorded uuid no longer applies
+                self._space_switch_data_dict.get("nodes", {}).pop(key, None)
                 if self.validate_switch_data("space switch"):
                     # enable if data is complete
                     self._swtich_btn.setEnabled(True)
             else:
                 self._ikfk_switch_data_dict[key] = sel[0]
+                # measured offsets and recorded uuid no longer apply
+                self._ikfk_switch_data_dict.pop("calibration", None)
+                self._ikfk_switch_data_dict.get("nodes", {}).pop(key, None)
                 if self.validate_switch_data("ikfk switch"):
                     # enable if data is complete
                     self._swtich_btn.setEnabled(True)
@@ -1376,6 +1637,7 @@ class SpaceSwitchTool(QtWidgets.QDialog):
             self._space_switch_data_dict[key] = ""
         else: # controls for ik/fk switch
             self._ikfk_switch_data_dict[key] = ""
+            self._ikfk_switch_data_dict.pop("calibration", None)
         double_warning(
             "Invalid selection!\n--- please select {} ---".format(key)
         )
@@ -1403,10 +1665,7 @@ class SpaceSwitchTool(QtWidgets.QDialog):
 
     def validate_switch_data(self, switch_mode="space switch", data=None):
         """Validates all required data right before executing the
-        space_switch / ikfk_switch method.
-
-        TODO: need to have a more thorough check to see if all keys & values
-              are correct (right now it does not do that)
+        space_switch / ikfk_switch method, see engine.validate_switch_data.
 
         Args:
             data (dict): option for checking imported dictionary data
@@ -1417,51 +1676,10 @@ class SpaceSwitchTool(QtWidgets.QDialog):
         # check for input arg
         if switch_mode == "space switch":
             switch_data = data or self._space_switch_data_dict
-            std_keys = ["mode", "target control", "source space",
-                        "target space"]
-            attr_keys = ["source space", "target space"]
         else: # switch_mode == "ikfk switch"
             switch_data = data or self._ikfk_switch_data_dict
-            std_keys = ["mode", "shoulder joint", "elbow joint", "wrist joint",
-                        "fk shoulder", "fk elbow", "fk wrist", "fk switch",
-                        "fk visibility", "ik elbow", "ik wrist", "ik switch",
-                        "ik visibility"]
-            attr_keys = ["fk switch", "ik switch"] # TODO: future optional visibility switch, ignore for now
-                         # "fk visibility", "ik visibility" <-- ignore these for now
-
-        # check if the keys are correct!
-        if (not set(switch_data.keys()) == set(std_keys)):
-            return False
-
-        for key, value in switch_data.iteritems():
-            if not value: # check if any user input is empty
-                return False
-
-            if key in attr_keys:
-                if isinstance(value, list) and len(value) == 2:
-                    node, attr = value[0].split(".")
-                    if not cmds.objExists(node): # check if object still exists
-                        return False
-                    # check if attribute still exists
-                    if not cmds.attributeQuery(attr, node=node, exists=True):
-                        return False
-                else:
-                    return False
-            else:
-                if isinstance(value, basestring):
-                    if key == "mode":
-                        if value not in ["space switch", "ikfk switch"]:
-                            return False
-
-                    else: # key is a control
-                        # check if the control still exist in the scene
-                        if not cmds.objExists(value):
-                            return False
-                else:
-                    return False
 
-        # all user inputs are still valid
-        return True
+        return engine.validate_switch_data(switch_data, switch_mode)
 
     def _check_fk_rotate_order(self, shoulder_jnt, elbow_jnt, wrist_jnt,
                                fk_shoulder, fk_elbow, fk_wrist):
@@ -1517,7 +1735,9 @@ class SpaceSwitchTool(QtWidgets.QDialog):
         elif self._tabs.currentWidget() is self._ik_fk_switch_tab:
             self.ikfk_switch()
         else: # self._tabs.currentWidget() is self._main_switch_tab
-            if self._selected_item:
+            if len(self._file_list_widget.selectedItems()) > 1:
+                self.run_selected()
+            elif self._selected_item:
                 name = self._selected_item.text()
                 data = self._file_list_items[name]
                 if data["mode"] == "space switch":
@@ -1527,14 +1747,73 @@ class SpaceSwitchTool(QtWidgets.QDialog):
             else:
                 double_warning("Please select a list item first!")
 
+    def get_bake_engine(self):
+        """Returns the engine that bakes space switches every frame, see
+        engine.execute_plans.
+
+        Returns:
+            str: one of engine.BAKE_ENGINES.
+        """
+        if (self._everyFrame_radbtn.isChecked()
+                and self._bake_results_chkbx.isChecked()):
+            return engine.NATIVE_ENGINE
+
+        return engine.PYTHON_ENGINE
+
+    def get_transform_mode(self):
+        """Returns how the controls are posed while switching, see
+        engine.execute_plans.
+
+        Returns:
+            str: one of switch_plan.TRANSFORM_MODES.
+        """
+        if self._api_transforms_chkbx.isChecked():
+            return switch_plan.API_TRANSFORMS
+
+        return switch_plan.CMDS_TRANSFORMS
+
+    @switch_profile.profiled("planning")
+    def build_switch_plan(self, mode, ctls, direction=None):
+        """Compiles the plan of a switch from the options set in the UI, see
+        space_switch_plan.plan_switch. Does not change the scene.
+
+        Args:
+            mode (str): "space switch" or "ikfk switch".
+            ctls (list): controls whose keys decide the frames to switch on.
+            direction (str|None): "ikfk" or "fkik" for ikfk switch.
+
+        Returns:
+            dict: the plan.
+
+        Raises:
+            ValueError: if there is nothing to bake.
+        """
+        if self._currentFrame_radbtn.isChecked():
+            bake_mode = switch_plan.CURRENT_FRAME
+        elif self._bakeKeyframes_radbtn.isChecked():
+            bake_mode = switch_plan.BAKE_KEYFRAMES
+        else: # self._everyFrame_radbtn_radbtn.isChecked()
+            bake_mode = switch_plan.BAKE_EVERY_FRAME
+
+        keyframes = cmds.keyframe(ctls, query=True, timeChange=True) or []
+        time_range = None
+        if self._set_time_range_chkbx.isChecked():
+            time_range = (int(self._start_frame_field.text()),
+                          int(self._end_frame_field.text()))
+        elif bake_mode == switch_plan.BAKE_EVERY_FRAME:
+            time_range = get_timeline_range()[:2]
+
+        return switch_plan.plan_switch(mode, bake_mode, keyframes,
+                                       cmds.currentTime(query=True),
+                                       time_range, direction)
+
+    @switch_profile.profiled("space_switch")
     def space_switch(self):
         """Executes the main space switch operation using internal data.
 
         TODO: check what happen if user have other space switch in between
               the set time range.
 
-        TODO: too long at the moment, figure out a way to break this method up.
-
         TODO: need to check rotate order, otherwise bad!
         """
         # check internal data to make sure user did not remove or rename stuffs
@@ -1546,156 +1825,26 @@ class SpaceSwitchTool(QtWidgets.QDialog):
             )
             return
 
-        cmds.undoInfo(openChunk=True)
+        # decide what to key before touching the scene
+        try:
+            plan = self.build_switch_plan(
+                "space switch", [self._space_switch_data_dict["target control"]]
+            )
+        except ValueError, e:
+            double_warning(str(e))
+            return
+
+        with switch_profile.phase("undo"):
+            cmds.undoInfo(openChunk=True)
         lock_viewport()
         # huge try block is used here to take care of undo chunk
         # TODO: replace it using decorator
-        try: 
-            current_frame = cmds.currentTime(query=True)
-            ctl = self._space_switch_data_dict["target control"]
-            source_space = self._space_switch_data_dict["source space"][0]
-            source_value = self._space_switch_data_dict["source space"][1]
-            target_space = self._space_switch_data_dict["target space"][0]
-            target_value = self._space_switch_data_dict["target space"][1]
-
-            if self._currentFrame_radbtn.isChecked():
-                self.set_space_switch(current_frame, ctl,
-                                      source_space, source_value,
-                                      target_space, target_value,)
-            else:
-                range_start = int(self._start_frame_field.text())
-                range_end = int(self._end_frame_field.text())
-                keyframes = cmds.keyframe(ctl, query=True, timeChange=True)
-                if keyframes is None:
-                    keyframes = [] # set to empty list instead
-                keyframes = list(set(keyframes)) # rid of duplicates
-                keyframes.sort()
-
-                if self._bakeKeyframes_radbtn.isChecked():
-                    ref_keys = keyframes[:] # save if for reference
-                    if self._set_time_range_chkbx.isChecked():
-                        # only get the keys within set range
-                        new_keys = []
-                        for k in keyframes:
-                            if range_start <= k <= range_end:
-                                new_keys.append(k)
-                        keyframes = new_keys
-
-                    if not keyframes:
-                        double_warning("No keys to bake!")
-                        raise Exception # escape the block
-
-                    matrixData = []
-                    for key in keyframes:
-                        cmds.currentTime(key, edit=True)
-                        cmds.setAttr(source_space, source_value)
-                        cmds.setKeyframe(source_space)
-                        pos, rot = get_world_matrix(ctl)
-                        matrixData.append((pos, rot))
-
-                    # check if closing swap will run
-                    if len(keyframes) > 1 and keyframes[-1] < ref_keys[-1]:
-                        cmds.currentTime(keyframes[-1], edit=True)
-                        end_pos, end_rot = get_world_matrix(ctl)
-                        
-                        # this may or may not be key so we have to be sure
-                        # go to previous frame of the closing switch
-                        # and save data
-                        cmds.currentTime(keyframes[-1] - 1, edit=True)
-                        prev_pos, prev_rot = get_world_matrix(ctl)
-
-
-                    if keyframes[0] > ref_keys[0]:
-                        self.set_space_switch(keyframes[0], ctl,
-                                              source_space, source_value,
-                                              target_space, target_value,)
-                        
-                        # remove first keyframe from data
-                        keyframes = keyframes[1:]
-                        matrixData = matrixData[1:]
-
-                    # make sure keyframes is not emptied from the first check
-                    if keyframes and keyframes[-1] < ref_keys[-1]:
-                        # flip target and source to close chunk
-                        # cannot use set_space_switch method since
-                        # current matrix has already been changed
-                        cmds.currentTime(keyframes[-1], edit=True)
-                        cmds.setAttr(source_space, source_value)
-                        cmds.setKeyframe(source_space)
-                        apply_world_matrix(ctl, end_pos, end_rot)
-                        create_transform_keys(objects=[ctl],
-                                              tx=True, ty=True, tz=True,
-                                              rx=True, ry=True, rz=True)
-
-                        # set key for the frame before
-                        cmds.currentTime(keyframes[-1] - 1, edit=True)
-                        cmds.setAttr(target_space, target_value)
-                        cmds.setKeyframe(target_space)
-                        apply_world_matrix(ctl, prev_pos, prev_rot)
-                        create_transform_keys(objects=[ctl],
-                                              tx=True, ty=True, tz=True,
-                                              rx=True, ry=True, rz=True)
-
-                        # remove last keyframe from data
-                        keyframes = keyframes[:-1]
-                        matrixData = matrixData[:-1]
-
-                    # anything right on top or outside will run regularly
-                    # anything on the insde will make a set_space_switch
-                    # inside or outside refers to the outermost two keys
-                    for i, key in enumerate(keyframes):
-                        cmds.currentTime(key, edit=True)
-                        cmds.setAttr(target_space, target_value)
-                        cmds.setKeyframe(target_space)
-                        pos, rot = matrixData[i]
-                        apply_world_matrix(ctl, pos, rot)
-                        create_transform_keys(objects=[ctl],
-                                              tx=True, ty=True, tz=True,
-                                              rx=True, ry=True, rz=True)
-
-                # section for 'bake every frame'
-                # TODO: check situations when keyframes is [] or 1-2 items
-                else: # self._everyFrame_radbtn_radbtn.isChecked()
-                    if not self._set_time_range_chkbx.isChecked():
-                        range_start, range_end, frame_range = (
-                            get_timeline_range()
-                        )
-                    time_range = range(int(range_start),
-                                       int(range_end) + 1)
-
-                    # time_range size will always be 2 or more,
-                    # so skip checking
-                    matrixData = []
-                    for key in time_range:
-                        cmds.currentTime(key, edit=True)
-                        cmds.setAttr(source_space, source_value)
-                        cmds.setKeyframe(source_space)
-                        pos, rot = get_world_matrix(ctl)
-                        matrixData.append((pos, rot))
-
-                    if keyframes[0] < time_range[0]:
-                        self.set_space_switch(time_range[0], ctl,
-                                              source_space, source_value,
-                                              target_space, target_value,)
-                        time_range = time_range[1:]
-                        matrixData = matrixData[1:]
-
-                    if keyframes[-1] > time_range[-1]:
-                        self.set_space_switch(time_range[-1], ctl,
-                                              target_space, target_value,
-                                              source_space, source_value,)
-                        time_range = time_range[:-1]
-                        matrixData = matrixData[:-1]
-
-                    for i, key in enumerate(time_range):
-                        cmds.currentTime(key, edit=True)
-                        cmds.setAttr(target_space, target_value)
-                        cmds.setKeyframe(target_space)
-                        pos, rot = matrixData[i]
-                        apply_world_matrix(ctl, pos, rot)
-                        create_transform_keys(objects=[ctl],
-                                              tx=True, ty=True, tz=True,
-                                              rx=True, ry=True, rz=True)
+        try:
+            with engine.PerformanceContext(**self.performance_settings):
+                current_frame = cmds.currentTime(query=True)
+                engine.execute_plan(self._space_switch_data_dict, plan,
+                                    bake_engine=self.get_bake_engine(),
+                                    transform_mode=self.get_transform_mode())
 
                 # return to current frame
                 cmds.currentTime(current_frame, edit=True)
@@ -1707,50 +1856,15 @@ class SpaceSwitchTool(QtWidgets.QDialog):
 
         finally: # clean up
             unlock_viewport()
-            cmds.undoInfo(closeChunk=True)
-
-    def set_space_switch(self, frame, ctl, source_space, source_value,
-                         target_space, target_value):
-        """Used when the keyframe needs to make a transition from source space
-        to target space.
-
-        Args:
-            frame (int|float): frame number where the switch will be made.
-            ctl (str): control used for space switch operation.
-            source_space (str): an attribute represents space to switch from.
-            source_value (type): value in source space attribute,
-                                 type depends on the rig used.
-            target_space (str): an attribute represents space to switch to.
-            target_value (type): value in target space attribute,
-                                 type depends on the rig used.
-        """
-        # get current frame's matrix
-        cmds.currentTime(frame, edit=True)
-        pos, rot = get_world_matrix(ctl)
-
-        # go to previous frame and key
-        prev_frame = frame - 1.0
-        cmds.currentTime(prev_frame, edit=True)
-        cmds.setAttr(source_space, source_value)
-        cmds.setKeyframe(source_space)
-        create_transform_keys(objects=[ctl], tx=True, ty=True,
-                              tz=True, rx=True, ry=True, rz=True)
-
-        # return to given frame and apply original matrix
-        cmds.currentTime(frame, edit=True)
-        cmds.setAttr(target_space, target_value)
-        cmds.setKeyframe(target_space)
-        apply_world_matrix(ctl, pos, rot)
-        create_transform_keys(objects=[ctl], tx=True, ty=True, tz=True,
-                              rx=True, ry=True, rz=True)
+            with switch_profile.phase("undo"):
+                cmds.undoInfo(closeChunk=True)
 
+    @switch_profile.profiled("ikfk_switch")
     def ikfk_switch(self):
         """Decides which ikfk operation to wrong based on user settings.
 
         TODO: check what happen if user have other space switch in between
               the set time range.
-
-        TODO: too long at the moment, figure out a way to break this method up.
         """
         # check internal data to make sure user did not remove or rename stuffs
         # from the scene randomly 
@@ -1762,366 +1876,59 @@ class SpaceSwitchTool(QtWidgets.QDialog):
             return
 
         # TODO: any vis attr should be extra since some rigs already include that in the switch attr
-        current_frame = cmds.currentTime(query=True)
-        prev_frame = current_frame - 1.0
-        shoulder_jnt = self._ikfk_switch_data_dict["shoulder joint"]
-        elbow_jnt = self._ikfk_switch_data_dict["elbow joint"]
-        wrist_jnt = self._ikfk_switch_data_dict["wrist joint"]
-        fk_shoulder = self._ikfk_switch_data_dict["fk shoulder"]
-        fk_elbow = self._ikfk_switch_data_dict["fk elbow"]
-        fk_wrist = self._ikfk_switch_data_dict["fk wrist"]
-        fk_switch_attr = self._ikfk_switch_data_dict["fk switch"][0]
-        fk_switch_value = self._ikfk_switch_data_dict["fk switch"][1]
-        fk_vis_attr = self._ikfk_switch_data_dict["fk visibility"][0]
-        fk_vis_value = self._ikfk_switch_data_dict["fk visibility"][1]
-        ik_elbow = self._ikfk_switch_data_dict["ik elbow"]
-        ik_wrist = self._ikfk_switch_data_dict["ik wrist"]
-        ik_switch_attr = self._ikfk_switch_data_dict["ik switch"][0]
-        ik_switch_value = self._ikfk_switch_data_dict["ik switch"][1]
-        ik_vis_attr = self._ikfk_switch_data_dict["ik visibility"][0]
-        ik_vis_value = self._ikfk_switch_data_dict["ik visibility"][1]
+        data = self._ikfk_switch_data_dict
 
         # get the flag: True --> ikfk, False --> fkik
         flag = self._ik_to_fk_radbtn.isChecked()
         if flag: # ikfk
             # check rotate order of the fk controls
-            response = self._check_fk_rotate_order(shoulder_jnt, elbow_jnt,
-                                                   wrist_jnt, fk_shoulder,
-                                                   fk_elbow, fk_wrist)
+            response = self._check_fk_rotate_order(
+                data["shoulder joint"], data["elbow joint"],
+                data["wrist joint"], data["fk shoulder"], data["fk elbow"],
+                data["fk wrist"]
+            )
             if response is False:
                 # forfeit operation (fix rotate order first)
                 return
-            ctls = [ik_elbow, ik_wrist]
-
-        else: # fkik
-            ctls = [fk_shoulder, fk_elbow, fk_wrist]
 
-        # get_ik_to_fk_switch(shoulder_jnt, elbow_jnt, wrist_jnt)
-        # set_ik_to_fk_switch(fk_shoulder, fk_elbow, fk_wrist,
-        #                     should_rot, elbow_rot, wrist_rot, fk_switch_attr,
-        #                     fk_switch_value, fk_vis_attr, fk_vis_value,
-        #                     ik_vis_attr, ik_vis_value, frame, prev_frame=None)
-
-        # get_fk_to_ik_switch(shoulder_jnt, elbow_jnt, wrist_jnt,
-        #                     ik_wrist)
-
-        # set_fk_to_ik_switch(ik_wrist, ik_elbow, wrist_pos, wrist_rot,
-        #                     elbow_pos, ik_switch_attr, ik_switch_value,
-        #                     fk_vis_attr, fk_vis_value, ik_vis_attr,
-        #                     ik_vis_value, frame, prev_frame=None)
+        # decide what to key before touching the scene
+        direction = "ikfk" if flag else "fkik"
+        try:
+            plan = self.build_switch_plan(
+                "ikfk switch", switch_plan.get_switch_controls(data, direction),
+                direction
+            )
+        except ValueError, e:
+            double_warning(str(e))
+            return
 
-        cmds.undoInfo(openChunk=True)
+        with switch_profile.phase("undo"):
+            cmds.undoInfo(openChunk=True)
         lock_viewport()
         # huge try block is used here to take care of undo chunk
         # TODO: replace it using decorator
-        try: 
-            if self._currentFrame_radbtn.isChecked():
-                # doing one frame switch operation
-                self.set_ikfk_switch(flag, shoulder_jnt, elbow_jnt, wrist_jnt,
-                                     fk_shoulder, fk_elbow, fk_wrist,
-                                     fk_switch_attr, fk_switch_value,
-                                     fk_vis_attr, fk_vis_value, ik_vis_attr,
-                                     ik_vis_value, ik_switch_attr,
-                                     ik_switch_value, ik_wrist, ik_elbow,
-                                     current_frame, prev_frame)
-
-            else:
-                range_start = int(self._start_frame_field.text())
-                range_end = int(self._end_frame_field.text())
-                keyframes = cmds.keyframe(ctls, query=True, timeChange=True)
-                if keyframes is None:
-                    keyframes = [] # set to empty list instead
-                keyframes = list(set(keyframes)) # rid of duplicates
-                keyframes.sort()
-
-                if self._bakeKeyframes_radbtn.isChecked(): # bake at keyframes
-                    ref_keys = keyframes[:] # save if for reference
-                    if self._set_time_range_chkbx.isChecked():
-                        # only get the keys within set range
-                        new_keys = []
-                        for k in keyframes:
-                            if range_start <= k <= range_end:
-                                new_keys.append(k)
-                        keyframes = new_keys
-
-                    if not keyframes:
-                        double_warning("No keys to bake!")
-                        # raise Exception # escape the block
-                        return # for now
-
-                    # gathering data
-                    matrixData = []
-                    for key in keyframes:
-                        cmds.currentTime(key, edit=True)
-                        # cmds.setAttr(source_space, source_value)
-                        # cmds.setKeyframe(source_space)
-                        data = self.get_ikfk_data(flag, shoulder_jnt,
-                                                  elbow_jnt, wrist_jnt,
-                                                  ik_wrist, ik_switch_attr,
-                                                  ik_switch_value)
-                        matrixData.append(data)
-
-                    # check if closing swap will run, if so, go reverse direction
-                    if len(keyframes) > 1 and keyframes[-1] < ref_keys[-1]:
-                        cmds.currentTime(keyframes[-1], edit=True)
-                        end_data = self.get_ikfk_data(not flag, shoulder_jnt,
-                                                      elbow_jnt, wrist_jnt,
-                                                      ik_wrist, ik_switch_attr,
-                                                      ik_switch_value)
-                        
-                        # the previous frame will get screwed up when the previous
-                        # "keyframe" is set (unless the previous frame itself is a keyframe)
-                        # so we go to the previous frame of the closing switch and save data
-                        cmds.currentTime(keyframes[-1] - 1, edit=True)
-                        prev_data = self.get_ikfk_data(flag, shoulder_jnt,
-                                                       elbow_jnt, wrist_jnt,
-                                                       ik_wrist, ik_switch_attr,
-                                                       ik_switch_value)
-                                        
-                    # operation begins!
-                    # start with first key, make a simple in place switch (but NOPE)
-                    if keyframes[0] > ref_keys[0]:
-                        # WHY is it messing up!!! Somehow the value has been changed in FK --> IK
-                        # most likely due to annoying wrist rotation problem and the hack I did
-                        # (but may also happen to IK --> FK?)
-                        # (dunno, just messed up after matrixData was gathered)
-                        # we will use the matrixData instead, but this is a mystery :(
-                        
-                        # TODO: there are serious issues related to the flip problem,
-                        #       study more vector math to figure this out
-                        
-                        # self.set_ikfk_switch(flag, shoulder_jnt, elbow_jnt,
-                        #                      wrist_jnt, fk_shoulder, fk_elbow,
-                        #                      fk_wrist, fk_switch_attr,
-                        #                      fk_switch_value, fk_vis_attr,
-                        #                      fk_vis_value, ik_vis_attr,
-                        #                      ik_vis_value, ik_switch_attr,
-                        #                      ik_switch_value, ik_wrist,
-                        #                      ik_elbow, keyframes[0],
-                        #                      keyframes[0] - 1)
-
-                        if flag: # ikfk
-                            should_rot, elbow_rot, wrist_rot = matrixData[0]
-                            self.set_ik_to_fk_switch(fk_shoulder, fk_elbow,
-                                                fk_wrist, should_rot,
-                                                elbow_rot, wrist_rot,
-                                                fk_switch_attr,
-                                                fk_switch_value, fk_vis_attr,
-                                                fk_vis_value, ik_vis_attr,
-                                                ik_vis_value, keyframes[0],
-                                                keyframes[0] - 1)                        
-
-                        else: # fkik
-                            wrist_pos, wrist_rot, elbow_pos = matrixData[0]
-                            self.set_fk_to_ik_switch(ik_wrist, ik_elbow, wrist_pos,
-                                                wrist_rot, elbow_pos,
-                                                ik_switch_attr,
-                                                ik_switch_value, fk_vis_attr,
-                                                fk_vis_value, ik_vis_attr,
-                                                ik_vis_value, keyframes[0],
-                                                keyframes[0] - 1)
-
-                        # remove first keyframe from data
-                        keyframes = keyframes[1:]
-                        matrixData = matrixData[1:]
-
-                    # next, do the end frame, apply the end_data and prev_data
-                    # make sure the list was not emptied after removing the
-                    # first key frame (in case of 1 frame switch)
-                    if keyframes and keyframes[-1] < ref_keys[-1]:
-                        # flip target and source to close chunk
-                        # cannot use set_space_switch method since
-                        # current matrix has already been changed so restore them
-                        if flag: # ikfk
-                            wrist_pos, wrist_rot, elbow_pos = end_data
-                            self.set_fk_to_ik_switch(ik_wrist, ik_elbow, wrist_pos,
-                                                wrist_rot, elbow_pos,
-                                                ik_switch_attr,
-                                                ik_switch_value, fk_vis_attr,
-                                                fk_vis_value, ik_vis_attr,
-                                                ik_vis_value, keyframes[-1])
-
-                            should_rot, elbow_rot, wrist_rot = prev_data
-                            self.set_ik_to_fk_switch(fk_shoulder, fk_elbow,
-                                                fk_wrist, should_rot,
-                                                elbow_rot, wrist_rot,
-                                                fk_switch_attr,
-                                                fk_switch_value, fk_vis_attr,
-                                                fk_vis_value, ik_vis_attr,
-                                                ik_vis_value, keyframes[-1] - 1)                        
-
-                        else: # fkik
-                            should_rot, elbow_rot, wrist_rot = end_data
-                            self.set_ik_to_fk_switch(fk_shoulder, fk_elbow,
-                                                fk_wrist, should_rot,
-                                                elbow_rot, wrist_rot,
-                                                fk_switch_attr,
-                                                fk_switch_value, fk_vis_attr,
-                                                fk_vis_value, ik_vis_attr,
-                                                ik_vis_value, keyframes[-1])
-
-                            wrist_pos, wrist_rot, elbow_pos = prev_data
-                            self.set_fk_to_ik_switch(ik_wrist, ik_elbow, wrist_pos,
-                                                wrist_rot, elbow_pos,
-                                                ik_switch_attr,
-                                                ik_switch_value, fk_vis_attr,
-                                                fk_vis_value, ik_vis_attr,
-                                                ik_vis_value, keyframes[-1] - 1)
-
-                        # remove last keyframe from data
-                        keyframes = keyframes[:-1]
-                        matrixData = matrixData[:-1]
-
-                    # anything right on top or outside will run regularly
-                    # anything on the insde will make a set_space_switch
-                    # inside or outside refers to the outermost two keys
-                    for i, key in enumerate(keyframes):
-                        if flag: # ikfk
-                            should_rot, elbow_rot, wrist_rot = matrixData[i]
-                            self.set_ik_to_fk_switch(fk_shoulder, fk_elbow,
-                                                fk_wrist, should_rot,
-                                                elbow_rot, wrist_rot,
-                                                fk_switch_attr,
-                                                fk_switch_value, fk_vis_attr,
-                                                fk_vis_value, ik_vis_attr,
-                                                ik_vis_value, key)                        
-
-                        else: # fkik
-                            wrist_pos, wrist_rot, elbow_pos = matrixData[i]
-                            self.set_fk_to_ik_switch(ik_wrist, ik_elbow, wrist_pos,
-                                                wrist_rot, elbow_pos,
-                                                ik_switch_attr,
-                                                ik_switch_value, fk_vis_attr,
-                                                fk_vis_value, ik_vis_attr,
-                                                ik_vis_value, key)
-
-                # section for 'bake every frame'
-                # TODO: check situations when keyframes is [] or 1-2 items
-                else: # self._everyFrame_radbtn_radbtn.isChecked()
-                    if not self._set_time_range_chkbx.isChecked():
-                        range_start, range_end, frame_range = (
-                            get_timeline_range()
-                        )
-                    time_range = range(int(range_start),
-                                       int(range_end) + 1)
-
-                    # time_range size will always be 2 or more so skip checking
-                    # gathering data
-                    matrixData = []
-                    for frame in time_range:
-                        cmds.currentTime(frame, edit=True)
-                        data = self.get_ikfk_data(flag, shoulder_jnt,
-                                                  elbow_jnt, wrist_jnt,
-                                                  ik_wrist, ik_switch_attr,
-                                                  ik_switch_value)
-                        matrixData.append(data)
-
-                    # check if closing swap will run, if so, go reverse direction
-                    # time_range size will always be 2 or more so skip checking
-                    # since it is bake every frame, no need to do the frame before
-                    if keyframes[-1] > time_range[-1]:
-                        cmds.currentTime(time_range[-1], edit=True)
-                        end_data = self.get_ikfk_data(not flag, shoulder_jnt,
-                                                      elbow_jnt, wrist_jnt,
-                                                      ik_wrist, ik_switch_attr,
-                                                      ik_switch_value)
-
-                    # operation begins!
-                    if keyframes[0] < time_range[0]:
-                        # set a simple in place switch on the first frame
-                        # does NOT work, same issue as above, values broken
-                        # after gathering matrix data :(
-
-                        # self.set_ikfk_switch(flag, shoulder_jnt, elbow_jnt,
-                        #                      wrist_jnt, fk_shoulder, fk_elbow,
-                        #                      fk_wrist, fk_switch_attr,
-                        #                      fk_switch_value, fk_vis_attr,
-                        #                      fk_vis_value, ik_vis_attr,
-                        #                      ik_vis_value, ik_switch_attr,
-                        #                      ik_switch_value, ik_wrist,
-                        #                      ik_elbow, time_range[0],
-                        #                      time_range[0] - 1)
-
-                        if flag: # ikfk
-                            should_rot, elbow_rot, wrist_rot = matrixData[0]
-                            self.set_ik_to_fk_switch(fk_shoulder, fk_elbow,
-                                                fk_wrist, should_rot,
-                                                elbow_rot, wrist_rot,
-                                                fk_switch_attr,
-                                                fk_switch_value, fk_vis_attr,
-                                                fk_vis_value, ik_vis_attr,
-                                                ik_vis_value, time_range[0],
-                                                time_range[0] - 1)                        
-
-                        else: # fkik
-                            wrist_pos, wrist_rot, elbow_pos = matrixData[0]
-                            self.set_fk_to_ik_switch(ik_wrist, ik_elbow, wrist_pos,
-                                                wrist_rot, elbow_pos,
-                                                ik_switch_attr,
-                                                ik_switch_value, fk_vis_attr,
-                                                fk_vis_value, ik_vis_attr,
-                                                ik_vis_value, time_range[0],
-                                                time_range[0] - 1)
-
-                        time_range = time_range[1:]
-                        matrixData = matrixData[1:]
-
-                    if keyframes[-1] > time_range[-1]:
-                        # reverse for the end frame
-                        # does NOT work, same issue as above, values broken
-                        # after gathering matrix data :(
-                        # self.set_ikfk_switch(not flag, shoulder_jnt, elbow_jnt,
-                        #                      wrist_jnt, fk_shoulder, fk_elbow,
-                        #                      fk_wrist, fk_switch_attr,
-                        #                      fk_switch_value, fk_vis_attr,
-                        #                      fk_vis_value, ik_vis_attr,
-                        #                      ik_vis_value, ik_switch_attr,
-                        #                      ik_switch_value, ik_wrist,
-                        #                      ik_elbow, time_range[-1],
-                        #                      time_range[-1] - 1)
-
-                        # since it is bake every frame, no need to do the frame before
-                        if flag: # ikfk
-                            wrist_pos, wrist_rot, elbow_pos = end_data
-                            self.set_fk_to_ik_switch(ik_wrist, ik_elbow, wrist_pos,
-                                                wrist_rot, elbow_pos,
-                                                ik_switch_attr,
-                                                ik_switch_value, fk_vis_attr,
-                                                fk_vis_value, ik_vis_attr,
-                                                ik_vis_value, time_range[-1])                       
-
-                        else: # fkik
-                            should_rot, elbow_rot, wrist_rot = end_data
-                            self.set_ik_to_fk_switch(fk_shoulder, fk_elbow,
-                                                fk_wrist, should_rot,
-                                                elbow_rot, wrist_rot,
-                                                fk_switch_attr,
-                                                fk_switch_value, fk_vis_attr,
-                                                fk_vis_value, ik_vis_attr,
-                                                ik_vis_value, time_range[-1]) 
-
-                        time_range = time_range[:-1]
-                        matrixData = matrixData[:-1]
-
-                    for i, key in enumerate(time_range):
-                        if flag: # ikfk
-                            should_rot, elbow_rot, wrist_rot = matrixData[i]
-                            self.set_ik_to_fk_switch(fk_shoulder, fk_elbow,
-                                                fk_wrist, should_rot,
-                                                elbow_rot, wrist_rot,
-                                                fk_switch_attr,
-                                                fk_switch_value, fk_vis_attr,
-                                                fk_vis_value, ik_vis_attr,
-                                                ik_vis_value, key)                        
-
-                        else: # fkik
-                            wrist_pos, wrist_rot, elbow_pos = matrixData[i]
-                            self.set_fk_to_ik_switch(ik_wrist, ik_elbow, wrist_pos,
-                                                wrist_rot, elbow_pos,
-                                                ik_switch_attr,
-                                                ik_switch_value, fk_vis_attr,
-                                                fk_vis_value, ik_vis_attr,
-                                                ik_vis_value, key)
+        try:
+            with engine.PerformanceContext(**self.performance_settings):
+                current_frame = cmds.currentTime(query=True)
+
+                name = None
+                if (self._tabs.currentWidget() is self._main_switch_tab
+                        and self._selected_item):
+                    name = self._selected_item.text()
+                    stored = engine.is_ikfk_calibration(
+                        self._file_list_items[name].get("calibration")
+                    )
+
+                # joint to control offsets, measured once per rig
+                calibration = engine.get_ikfk_calibration(data)
+                if name:
+                    # keep it with the list item and its preset file
+                    self._file_list_items[name]["calibration"] = calibration
+                    if not stored:
+                        self._save_item_calibration(name)
+
+                engine.execute_plan(data, plan, calibration=calibration,
+                                    transform_mode=self.get_transform_mode())
 
                 # return to current frame
                 cmds.currentTime(current_frame, edit=True)
@@ -2133,227 +1940,102 @@ class SpaceSwitchTool(QtWidgets.QDialog):
 
         finally: # clean up
             unlock_viewport()
-            cmds.undoInfo(closeChunk=True)
+            with switch_profile.phase("undo"):
+                cmds.undoInfo(closeChunk=True)
+
+    @switch_profile.profiled("run_selected")
+    def run_selected(self):
+        """Executes every selected list item as one job: all the presets are
+        planned first, then sampled in a shared pass and keyed in a shared
+        write, inside a single undo chunk. IK/FK items use the direction set
+        by the ikfk radio buttons.
+        """
+        items = self._file_list_widget.selectedItems()
+        if not items:
+            double_warning("Please select a list item first!")
+            return
 
-    def get_ik_to_fk_switch(self, shoulder_jnt, elbow_jnt, wrist_jnt):
-        """Executes the main ik --> fk switch operation using internal data.
+        # get the flag: True --> ikfk, False --> fkik
+        flag = self._ik_to_fk_radbtn.isChecked()
 
-        TODO: some rigs have separate visibility control (like FS rigs), some incorporate
-              in the ikfk switch (like Caroline, and max I guess, which has both options),
-              so far we make it work for Caronline, but need to think of a solution for this.
-        """
-        # get joint position and rotation in world space
-        shoulder_pos, should_rot = get_world_matrix(shoulder_jnt)
-        elbow_pos, elbow_rot = get_world_matrix(elbow_jnt)
-        wrist_pos, wrist_rot = get_world_matrix(wrist_jnt)
-
-        return should_rot, elbow_rot, wrist_rot # position not needed for FK
-
-    def set_ik_to_fk_switch(self, fk_shoulder, fk_elbow, fk_wrist,
-                            should_rot, elbow_rot, wrist_rot, fk_switch_attr,
-                            fk_switch_value, fk_vis_attr, fk_vis_value,
-                            ik_vis_attr, ik_vis_value, frame, prev_frame=None):
-        """Executes the main ik --> fk switch operation using internal data.
-
-        TODO: some rigs have separate visibility control (like FS rigs), some incorporate
-              in the ikfk switch (like Caroline, and max I guess, which has both options),
-              so far we make it work for Caronline, but need to think of a solution for this.
-        """
-        if prev_frame:
-            # go to previous frame and hold down the value        
-            cmds.currentTime(prev_frame, edit=True)
-            for fk in [fk_shoulder, fk_elbow, fk_wrist]:
-                # hold down previous position     
-                create_transform_keys(objects=[fk], rx=True, ry=True, rz=True)
-            cmds.setKeyframe(fk_switch_attr)
-            # cmds.setKeyframe(fk_vis_attr)
-            # cmds.setKeyframe(ik_vis_attr)
-
-        # return to given frame
-        cmds.currentTime(frame, edit=True)
-        cmds.setAttr(fk_switch_attr, fk_switch_value)
-        cmds.setKeyframe(fk_switch_attr)
-        # cmds.setAttr(fk_vis_attr, int(fk_vis_value))
-        # cmds.setKeyframe(fk_vis_attr)
-        # cmds.setAttr(ik_vis_attr, int(ik_vis_value)) # does not work for some set up like Caroline
-        # cmds.setKeyframe(ik_vis_attr)
-        for fk, value in [[fk_shoulder, should_rot], [fk_elbow, elbow_rot],
-                          [fk_wrist, wrist_rot]]:
-            # apply in world space
-            cmds.xform(fk, rotation=value, worldSpace=True)
-            create_transform_keys(objects=[fk], rx=True, ry=True, rz=True)
-
-    def get_fk_to_ik_switch(self, shoulder_jnt, elbow_jnt, wrist_jnt,
-                            ik_wrist, ik_switch_attr, ik_switch_value):
-        """Executes the main fk --> ik switch operation using internal data.
-
-        TODO: for some rigs (max), the wrist flips when doing FK --> IK, and
-              for some weird reason, apply matrix twice fixes it (close enough).
-              best to find out what happen here
-
-        TODO: some rigs have separate visibility control (like FS rigs), some incorporate
-              in the ikfk switch (like Caroline, and max I guess, which has both options),
-              so far we make it work for Caronline, but need to think of a solution for this.
-        """
-        # get joint position and rotation in world space
-        orig_shoulder_pos, orig_should_rot = get_world_matrix(shoulder_jnt)
-        orig_elbow_pos, orig_elbow_rot = get_world_matrix(elbow_jnt)
-        orig_wrist_pos, orig_wrist_rot = get_world_matrix(wrist_jnt)
-        orig_switch_value = cmds.getAttr(ik_switch_attr)
-
-        # this should have been easy using xform, but it is NOT
-        # new way of getting wrist matrix (use constraint over xform, which does NOT work)
-        wrist_pos, wrist_rot = constrain_move_key(wrist_jnt, ik_wrist,
-                                                  'parentConstraint') # up until this point, works for Caroline
-        
-        # we should be done with the wrist by now, but NOPE
-        # for some weird reason the wrist will flip when this matrix is applied
-        # try it!
-        cmds.setAttr(ik_switch_attr, ik_switch_value) # set to ik space 
-        apply_world_matrix(ik_wrist, wrist_pos, wrist_rot) # apply in world space
-
-        # but executing the constrain_move_key twice fixed it! (flip it back?)
-        # (ACTUALLY not twice, but undefined number of times depending on the rigs) 
-        # this happened mostly for advanced skeleton rigs (worked just fine on Caroline)
-        # unpredictable results for not only different rigs, but also the same rig (arm and leg)
-
-        # Let us do it x3 for now (worked for Yoyo, but not Nan's legs)
-        #----------------------------------------------------------------------------
-        # get joint position and rotation in world space, again
-        wrist_pos, wrist_rot = constrain_move_key(wrist_jnt, ik_wrist,
-                                                  'parentConstraint')
-        apply_world_matrix(ik_wrist, wrist_pos, wrist_rot) # apply in world space again
-
-
-        # get joint position and rotation in world space, again
-        wrist_pos, wrist_rot = constrain_move_key(wrist_jnt, ik_wrist,
-                                                  'parentConstraint')
-        apply_world_matrix(ik_wrist, wrist_pos, wrist_rot) # apply in world space again
-        #----------------------------------------------------------------------------
-        # TODO: find out why. Could it be rotate order?
-        # TODO: most likely due to unclean joints (with nasty rotation values)
-
-        # restore original matrix
-        apply_world_matrix(ik_wrist, orig_wrist_pos, orig_wrist_rot)
-        cmds.setAttr(ik_switch_attr, orig_switch_value) # set back to fk space
-
-        # vector math for elbow position
-        shoulder_jnt_vector = om.MVector(orig_shoulder_pos)
-        elbow_jnt_vector = om.MVector(orig_elbow_pos)
-        wrist_jnt_vector = om.MVector(orig_wrist_pos)
-        midpoint_vector = ((wrist_jnt_vector - shoulder_jnt_vector) * 0.5
-                           + shoulder_jnt_vector)
-        aim_vector = ((elbow_jnt_vector - midpoint_vector) * 4
-                      + midpoint_vector)
-        new_elbow_pos = [aim_vector.x, aim_vector.y, aim_vector.z]
-
-        # return the values from wrist and elbow
-        return wrist_pos, wrist_rot, new_elbow_pos
-
-    def set_fk_to_ik_switch(self, ik_wrist, ik_elbow, wrist_pos, wrist_rot,
-                            elbow_pos, ik_switch_attr, ik_switch_value,
-                            fk_vis_attr, fk_vis_value, ik_vis_attr,
-                            ik_vis_value, frame, prev_frame=None):
-        """Executes the main fk --> ik switch operation using internal data.
-
-        TODO: for some rigs (max), the wrist flips when doing FK --> IK, and
-              for some weird reason, apply matrix twice fixes it (close enough).
-              best to find out what happen here
-
-        TODO: some rigs have separate visibility control (like FS rigs), some incorporate
-              in the ikfk switch (like Caroline, and max I guess, which has both options),
-              so far we make it work for Caronline, but need to think of a solution for this.
-        """
-        if prev_frame:        
-            # go to previous frame and hold down the value           
-            cmds.currentTime(prev_frame, edit=True)
-            create_transform_keys(objects=[ik_wrist],
-                                  tx=True, ty=True, tz=True,
-                                  rx=True, ry=True, rz=True)   
-            create_transform_keys(objects=[ik_elbow],
-                                  tx=True, ty=True, tz=True)
-            cmds.setKeyframe(ik_switch_attr)
-            # cmds.setKeyframe(ik_vis_attr)
-            # cmds.setKeyframe(fk_vis_attr)
-
-        # return to given frame
-        cmds.currentTime(frame, edit=True)
-        cmds.setAttr(ik_switch_attr, ik_switch_value)
-        cmds.setKeyframe(ik_switch_attr)
-        # cmds.setAttr(ik_vis_attr, int(ik_vis_value))
-        # cmds.setKeyframe(ik_vis_attr)
-        # cmds.setAttr(fk_vis_attr, int(fk_vis_value)) # does not work for some set up like Caroline
-        # cmds.setKeyframe(fk_vis_attr)
-        
-        # process wrist
-        apply_world_matrix(ik_wrist, wrist_pos, wrist_rot) # apply in world space         
-        create_transform_keys(objects=[ik_wrist],
-                              tx=True, ty=True, tz=True,
-                              rx=True, ry=True, rz=True)
-
-        # process elbow
-        cmds.xform(ik_elbow, translation=elbow_pos, worldSpace=True)
-        create_transform_keys(objects=[ik_elbow],
-                              tx=True, ty=True, tz=True)
-
-    def get_ikfk_data(self, flag, shoulder_jnt, elbow_jnt, wrist_jnt, ik_wrist, 
-                      ik_switch_attr, ik_switch_value):
-        """Decides which ikfk operation to wrong based on user settings.
+        # check and plan every preset before touching the scene
+        jobs = []
+        for item in items:
+            name = item.text()
+            data = self._file_list_items[name]
+            if not self.validate_switch_data(data["mode"], data):
+                double_warning("{} is no longer valid!\nPlease review the "
+                               "preset and the scene.".format(name))
+                return
 
-        TODO: check what happen if user have other space switch in between
-              the set time range.
+            direction = None
+            if data["mode"] == "ikfk switch":
+                direction = "ikfk" if flag else "fkik"
+            if direction == "ikfk":
+                response = self._check_fk_rotate_order(
+                    data["shoulder joint"], data["elbow joint"],
+                    data["wrist joint"], data["fk shoulder"],
+                    data["fk elbow"], data["fk wrist"]
+                )
+                if response is False:
+                    # forfeit operation (fix rotate order first)
+                    return
 
-        TODO: too long at the moment, figure out a way to break this method up.
-        """
-        if flag: # ikfk
-            should_rot, elbow_rot, wrist_rot = (
-                self.get_ik_to_fk_switch(shoulder_jnt, elbow_jnt,
-                                         wrist_jnt)
+            try:
+                plan = self.build_switch_plan(
+                    data["mode"],
+                    switch_plan.get_switch_controls(data, direction),
+                    direction
+                )
+            except ValueError, e:
+                double_warning("{}: {}".format(name, str(e)))
+                return
+            jobs.append((data, plan))
+
+        # ikfk presets calibrated by this run are saved back to their file
+        uncalibrated = [
+            item.text() for item in items
+            if self._file_list_items[item.text()]["mode"] == "ikfk switch"
+            and not engine.is_ikfk_calibration(
+                self._file_list_items[item.text()].get("calibration")
             )
-            return should_rot, elbow_rot, wrist_rot
-        
-        else: # fkik
-            wrist_pos, wrist_rot, elbow_pos = (
-                self.get_fk_to_ik_switch(shoulder_jnt, elbow_jnt, wrist_jnt,
-                                         ik_wrist, ik_switch_attr,
-                                         ik_switch_value)
+        ]
+
+        with switch_profile.phase("undo"):
+            cmds.undoInfo(openChunk=True)
+        lock_viewport()
+        # huge try block is used here to take care of undo chunk
+        # TODO: replace it using decorator
+        try:
+            with engine.PerformanceContext(**self.performance_settings):
+                current_frame = cmds.currentTime(query=True)
+                # ikfk calibrations are stored back in the list items
+                engine.execute_plans(jobs,
+                                     bake_engine=self.get_bake_engine(),
+                                     transform_mode=self.get_transform_mode())
+                for name in uncalibrated:
+                    if engine.is_ikfk_calibration(
+                            self._file_list_items[name].get("calibration")):
+                        self._save_item_calibration(name)
+
+                # return to current frame
+                cmds.currentTime(current_frame, edit=True)
+
+        except Exception, e:
+            double_warning(
+                "There is an Error in try block!\n{}".format(str(e))
             )
-            return wrist_pos, wrist_rot, elbow_pos
-
-    def set_ikfk_switch(self, flag, shoulder_jnt, elbow_jnt, wrist_jnt,
-                        fk_shoulder, fk_elbow, fk_wrist, fk_switch_attr,
-                        fk_switch_value, fk_vis_attr, fk_vis_value,
-                        ik_vis_attr, ik_vis_value, ik_switch_attr,
-                        ik_switch_value, ik_wrist, ik_elbow, frame,
-                        prev_frame):
-        """Decides which ikfk operation to wrong based on user settings.
 
-        TODO: check what happen if user have other space switch in between
-              the set time range.
+        finally: # clean up
+            unlock_viewport()
+            with switch_profile.phase("undo"):
+                cmds.undoInfo(closeChunk=True)
 
-        TODO: too long at the moment, figure out a way to break this method up.
+    def closeEvent(self, event):
+        """Removes the matrix cache callbacks when the UI closes.
         """
-        if flag: # ikfk
-            should_rot, elbow_rot, wrist_rot = self.get_ik_to_fk_switch(
-                shoulder_jnt, elbow_jnt, wrist_jnt
-            )
-            # print should_rot, elbow_rot, wrist_rot
-            self.set_ik_to_fk_switch(fk_shoulder, fk_elbow, fk_wrist,
-                                     should_rot, elbow_rot, wrist_rot,
-                                     fk_switch_attr, fk_switch_value,
-                                     fk_vis_attr, fk_vis_value, ik_vis_attr,
-                                     ik_vis_value, frame, prev_frame)
-        else: # fkik
-            wrist_pos, wrist_rot, elbow_pos = self.get_fk_to_ik_switch(
-                shoulder_jnt, elbow_jnt, wrist_jnt, ik_wrist, ik_switch_attr,
-                ik_switch_value
-            )
-            # print wrist_pos, wrist_rot, elbow_pos
-            self.set_fk_to_ik_switch(ik_wrist, ik_elbow, wrist_pos, wrist_rot,
-                                     elbow_pos, ik_switch_attr,
-                                     ik_switch_value, fk_vis_attr,
-                                     fk_vis_value, ik_vis_attr, ik_vis_value,
-                                     frame, prev_frame)
+        engine.release_matrix_cache()
+        super(SpaceSwitchTool, self).closeEvent(event)
 
     def mouseReleaseEvent(self, event):
         """Makes sure when user clicks on the UI it will set UI in focus.
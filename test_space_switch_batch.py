@@ -0,0 +1,108 @@
+"""
+MODULE: test_space_switch_batch
+
+Tests of the space_switch_batch command line, run end to end on memory
+scenes, see space_switch_backend, so they do not need Maya:
+
+    python -m pytest test_space_switch_batch.py
+
+CLASSES:
+    MemoryBatchTest: switches memory scene files through main.
+"""
+
+__author__ = "Te Ling (Danny) Hsu"
+__copyright__ = "Copyright (c) 2020 Te Ling (Danny) Hsu"
+__license__ = "MIT License"
+__version__ = "1.0.0"
+
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+import space_switch_batch as batch
+import space_switch_engine as engine
+import space_switch_backend as switch_backend
+import space_switch_benchmark as benchmark
+
+FRAMES = 30
+
+
+class MemoryBatchTest(unittest.TestCase):
+    """Switches memory scene files through space_switch_batch.main.
+    """
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        scene = switch_backend.use_memory()
+        self.presets = benchmark.build_rigs(2, 1, 0, FRAMES)[0]
+        self.scene_path = os.path.join(self.folder, "rig.json")
+        scene.file(rename=self.scene_path)
+        scene.file(save=True, force=True)
+
+        self.preset_paths = []
+        for index, preset in enumerate(self.presets):
+            path = os.path.join(self.folder, "space{}.json".format(index))
+            with open(path, "w") as out_file:
+                json.dump(preset, out_file)
+            self.preset_paths.append(path)
+
+    def tearDown(self):
+        engine.release_matrix_cache()
+        shutil.rmtree(self.folder)
+
+    def run_batch(self, *args):
+        """Runs the command line on the memory backend.
+        """
+        args = list(args)
+        for path in self.preset_paths:
+            args.extend(["--preset", path])
+
+        return batch.main(args + ["--backend", "memory"])
+
+    def get_space_keys(self, path):
+        """Opens a memory scene and returns the space keys of every preset.
+        """
+        scene = switch_backend.use_memory()
+        scene.file(path, open=True, force=True)
+
+        return [scene.keyframe(preset["source space"][0], query=True,
+                               valueChange=True) or []
+                for preset in self.presets]
+
+    def test_switch_scene(self):
+        """The switched scene is saved next to the original, which is left
+        as it was.
+        """
+        before = self.get_space_keys(self.scene_path)
+        self.assertEqual(self.run_batch(
+            self.scene_path, "--bake-mode", "bake keyframes"
+        ), 0)
+
+        after = self.get_space_keys(os.path.join(self.folder,
+                                                 "rig_switched.json"))
+        self.assertEqual(self.get_space_keys(self.scene_path), before)
+        for preset, values in zip(self.presets, after):
+            self.assertIn(preset["target space"][1], values)
+
+    def test_dry_run(self):
+        """A dry run saves nothing.
+        """
+        self.assertEqual(self.run_batch(self.scene_path, "--dry-run"), 0)
+        self.assertFalse(os.path.exists(os.path.join(self.folder,
+                                                     "rig_switched.json")))
+
+    def test_maya_scene(self):
+        """Maya scene files cannot be opened in memory, the scene fails and
+        the others are still switched.
+        """
+        maya_scene = os.path.join(self.folder, "shot.ma")
+        with open(maya_scene, "w") as out_file:
+            out_file.write("//Maya ASCII 2020 scene\n")
+
+        self.assertEqual(self.run_batch(maya_scene, self.scene_path), 1)
+        self.assertTrue(os.path.exists(os.path.join(self.folder,
+                                                    "rig_switched.json")))
+
+if __name__ == "__main__":
+    unittest.main()
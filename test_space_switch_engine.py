@@ -0,0 +1,226 @@
+"""
+MODULE: test_space_switch_engine
+
+Tests of space_switch_engine run on the memory backend, see
+space_switch_backend, so they do not need Maya:
+
+    python -m pytest test_space_switch_engine.py
+
+CLASSES:
+    MatrixCacheTest: checks what the shared MatrixCache keeps between runs.
+    IkfkSwitchTest: checks the ikfk switches on the memory scene's ik.
+    IkfkCalibrationTest: checks the poses ikfk offsets are measured on.
+"""
+
+__author__ = "Te Ling (Danny) Hsu"
+__copyright__ = "Copyright (c) 2020 Te Ling (Danny) Hsu"
+__license__ = "MIT License"
+__version__ = "1.0.0"
+
+import unittest
+
+import space_switch_plan as switch_plan
+import space_switch_engine as engine
+import space_switch_backend as switch_backend
+import space_switch_benchmark as benchmark
+
+FRAMES = 30
+JOINTS = ("shoulder joint", "elbow joint", "wrist joint")
+
+
+class MatrixCacheTest(unittest.TestCase):
+    """Checks what the shared MatrixCache keeps between switches.
+    """
+    def setUp(self):
+        self.scene = switch_backend.use_memory()
+        self.cache = engine.get_matrix_cache()
+        self.presets = benchmark.build_rigs(2, 2, 0, FRAMES)[0]
+        self.times = list(range(1, FRAMES + 1))
+        # keys every rig once, later switches only edit their curves
+        self.switch(self.presets)
+
+    def tearDown(self):
+        engine.release_matrix_cache()
+
+    def switch(self, presets):
+        """Switches presets every frame, with the shared cache.
+        """
+        engine.execute_plans(benchmark.plan_presets(
+            presets, switch_plan.BAKE_EVERY_FRAME, (1, FRAMES)
+        ))
+
+    def sample(self, preset, cache=None):
+        """Samples the world matrices of a preset's control.
+        """
+        pair = (preset["target control"], "worldMatrix")
+        return engine.sample_matrices([pair], self.times,
+                                           cache=cache)[pair]
+
+    def get_keys(self):
+        """Returns the keys of every switched control.
+        """
+        keys = []
+        for preset in self.presets:
+            for attr in ("space", "translateX", "rotateY"):
+                keys.append(self.scene.getAttr("{}_{}.keyTimeValue".format(
+                    preset["target control"], attr
+                )))
+
+        return keys
+
+    def test_second_run_hits(self):
+        """Switching one rig keeps the cached matrices of the other one.
+        """
+        first = self.sample(self.presets[0])
+        self.switch(self.presets[1:])
+
+        hits = self.cache.hits
+        second = self.sample(self.presets[0])
+        self.assertEqual(self.cache.hits - hits, FRAMES)
+        self.assertEqual(second, first)
+
+    def test_upstream_set_drops(self):
+        """Setting an attribute on a space target, which is not a parent of
+        the control, drops the control's matrices.
+        """
+        first = self.sample(self.presets[0])
+        self.scene.setAttr("space0_space1.translateX", 5.0)
+
+        misses = self.cache.misses
+        second = self.sample(self.presets[0])
+        self.assertEqual(self.cache.misses - misses, FRAMES)
+        self.assertNotEqual(second, first)
+        self.assertEqual(second, self.sample(self.presets[0], cache=False))
+
+    def test_repeated_switch(self):
+        """Switching twice with the cache keys the same values as without it.
+        """
+        self.switch(self.presets)
+        cached = self.get_keys()
+
+        engine.release_matrix_cache()
+        self.scene = switch_backend.use_memory()
+        self.presets = benchmark.build_rigs(2, 2, 0, FRAMES)[0]
+        self.switch(self.presets)
+        self.switch(self.presets)
+        self.assertEqual(self.get_keys(), cached)
+
+
+class IkfkSwitchTest(unittest.TestCase):
+    """Checks that baking ikfk switches every frame keeps the joints of a
+    chain in place, on the two-bone ik of the memory scene.
+    """
+    def setUp(self):
+        self.scene = switch_backend.use_memory()
+        self.preset = benchmark.build_rigs(0, 0, 1, FRAMES)[1][0]
+
+    def tearDown(self):
+        engine.release_matrix_cache()
+
+    def get_matrices(self):
+        """Returns the world matrices of the joints on every frame.
+        """
+        return [[self.scene.getAttr(
+            "{}.worldMatrix".format(self.preset[joint]), time=time
+        ) for joint in JOINTS] for time in range(1, FRAMES + 1)]
+
+    def switch(self, direction):
+        """Switches the chain every frame and returns the joint matrices from
+        before and after.
+        """
+        before = self.get_matrices()
+        engine.execute_plans(benchmark.plan_presets(
+            [self.preset], switch_plan.BAKE_EVERY_FRAME, (1, FRAMES),
+            direction
+        ))
+
+        return before, self.get_matrices()
+
+    def assert_matrices_equal(self, first, second, indices=range(16)):
+        """Compares the given values of the joint matrices.
+        """
+        for frame, other_frame in zip(first, second):
+            for matrix, other in zip(frame, other_frame):
+                for index in indices:
+                    self.assertAlmostEqual(matrix[index], other[index])
+
+    def test_ik_to_fk(self):
+        """The fk controls take the pose of the ik chain.
+        """
+        before, after = self.switch("ikfk")
+        self.assertEqual(self.scene.getAttr(
+            self.preset["fk switch"][0], time=FRAMES
+        ), 0.0)
+        self.assert_matrices_equal(before, after)
+
+    def test_fk_to_ik(self):
+        """The ik controls put the joints back on their positions. The fk
+        keys of the benchmark chain bend its elbow the other way from the
+        pose the handle was created in, which the rotate plane solver only
+        reaches by rolling the bones, so their orientations differ.
+        """
+        before, after = self.switch("fkik")
+        self.assertEqual(self.scene.getAttr(
+            self.preset["ik switch"][0], time=FRAMES
+        ), 1.0)
+        self.assert_matrices_equal(before, after, range(12, 15))
+
+
+class IkfkCalibrationTest(unittest.TestCase):
+    """Checks that ikfk offsets are only measured on poses where the ik chain
+    reaches its ik wrist control.
+    """
+    def setUp(self):
+        self.scene = switch_backend.use_memory()
+        self.preset = benchmark.build_rigs(0, 0, 1, FRAMES)[1][0]
+        self.key_times = self.scene.keyframe(self.preset["ik wrist"],
+                                             query=True, timeChange=True)
+
+    def tearDown(self):
+        engine.release_matrix_cache()
+
+    def out_of_reach(self, time):
+        """Keys the ik wrist control out of the reach of the chain.
+        """
+        self.scene.setKeyframe(self.preset["ik wrist"],
+                               attribute="translateX", time=time,
+                               value=20.0)
+
+    def test_reached_pose(self):
+        """The chain reaches the control on its keys, the ik wrist sits on
+        the wrist joint.
+        """
+        self.assertIsNone(engine.check_ikfk_pose(self.preset))
+        offset = engine.calibrate_ikfk(self.preset)["ik wrist"]
+        for value in offset[12:15]:
+            self.assertAlmostEqual(value, 0.0)
+
+    def test_out_of_reach(self):
+        """Out of reach on the current frame, the offsets are measured on the
+        next key that is reached and the current frame is kept.
+        """
+        self.scene.currentTime(self.key_times[1], edit=True)
+        expected = engine.calibrate_ikfk(self.preset)
+
+        self.scene.currentTime(self.key_times[0], edit=True)
+        self.out_of_reach(self.key_times[0])
+        self.assertIsNotNone(engine.check_ikfk_pose(self.preset))
+        calibration = engine.calibrate_ikfk(self.preset)
+        self.assertEqual(self.scene.currentTime(query=True),
+                         self.key_times[0])
+        for ctl_key, offset in expected.items():
+            for value, other in zip(calibration[ctl_key], offset):
+                self.assertAlmostEqual(value, other)
+
+    def test_never_reached(self):
+        """Out of reach on every key, nothing is measured.
+        """
+        for time in self.key_times:
+            self.out_of_reach(time)
+        current_time = self.scene.currentTime(query=True)
+        with self.assertRaises(ValueError):
+            engine.calibrate_ikfk(self.preset)
+        self.assertEqual(self.scene.currentTime(query=True), current_time)
+
+if __name__ == "__main__":
+    unittest.main()
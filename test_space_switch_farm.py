@@ -0,0 +1,97 @@
+"""
+MODULE: test_space_switch_farm
+
+Tests of space_switch_farm, its workers are fake mayapy scripts or
+space_switch_batch on the memory backend, so they do not need Maya:
+
+    python -m pytest test_space_switch_farm.py
+
+CLASSES:
+    RunJobTest: checks which exit codes of a worker are retried.
+"""
+
+__author__ = "Te Ling (Danny) Hsu"
+__copyright__ = "Copyright (c) 2020 Te Ling (Danny) Hsu"
+__license__ = "MIT License"
+__version__ = "1.0.0"
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+import space_switch_farm as farm
+
+# stands in for mayapy, exits with the code given as the scene or kills
+# itself with the given signal
+FAKE_MAYAPY = """#!{python}
+import os
+import sys
+
+scene = sys.argv[2]
+if scene.startswith("signal"):
+    os.kill(os.getpid(), int(scene[len("signal"):]))
+sys.exit(int(scene))
+"""
+
+RETRIES = 2
+
+
+@unittest.skipIf(os.name == "nt", "needs POSIX signals")
+class RunJobTest(unittest.TestCase):
+    """Checks which exit codes of a worker are retried by run_job.
+    """
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.mayapy = os.path.join(self.folder, "mayapy")
+        with open(self.mayapy, "w") as out_file:
+            out_file.write(FAKE_MAYAPY.format(python=sys.executable))
+        os.chmod(self.mayapy, 0o755)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def run_job(self, scene, batch_args=(), mayapy=None):
+        """Runs one job with the fake mayapy.
+        """
+        return farm.run_job(scene, list(batch_args), mayapy or self.mayapy,
+                            RETRIES)
+
+    def test_exit_codes(self):
+        """Workers that exit on their own run once, whatever their code.
+        """
+        for returncode in (farm.SUCCESS, farm.FAILURE, farm.USAGE_ERROR, 3):
+            result = self.run_job(str(returncode))
+            self.assertEqual(result["returncode"], returncode)
+            self.assertEqual(result["attempts"], 1, returncode)
+
+    def test_crashes(self):
+        """Workers killed by a signal, directly or through a shell, are
+        started again until they run out of retries.
+        """
+        for scene, returncode in (("signal9", -9), ("137", 137)):
+            result = self.run_job(scene)
+            self.assertEqual(result["returncode"], returncode)
+            self.assertEqual(result["attempts"], RETRIES + 1, scene)
+
+    def test_batch_usage_error(self):
+        """Options refused by space_switch_batch are reported without
+        retrying.
+        """
+        result = self.run_job(os.path.join(self.folder, "shot.json"),
+                              ["--backend", "memory", "--bake-mode", "nope"],
+                              sys.executable)
+        self.assertEqual(result["returncode"], farm.USAGE_ERROR)
+        self.assertEqual(result["attempts"], 1)
+        self.assertIn("--bake-mode", result["output"])
+
+    def test_missing_mayapy(self):
+        """A mayapy that cannot be started is not retried.
+        """
+        result = self.run_job("0", mayapy=os.path.join(self.folder, "nope"))
+        self.assertIsNone(result["returncode"])
+        self.assertEqual(result["attempts"], 1)
+
+if __name__ == "__main__":
+    unittest.main()
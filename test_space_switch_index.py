@@ -0,0 +1,134 @@
+"""
+MODULE: test_space_switch_index
+
+Tests of space_switch_index, they do not need Maya:
+
+    python -m pytest test_space_switch_index.py
+
+CLASSES:
+    UpdateIndexTest: checks which files a refresh parses and saves.
+"""
+
+__author__ = "Te Ling (Danny) Hsu"
+__copyright__ = "Copyright (c) 2020 Te Ling (Danny) Hsu"
+__license__ = "MIT License"
+__version__ = "1.0.0"
+
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+import space_switch_index as switch_index
+
+# modification time given to the files, so edits always change it
+MTIME = 1589000000.0
+
+
+class UpdateIndexTest(unittest.TestCase):
+    """Checks that update_index only parses and saves what changed.
+    """
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.index_path = os.path.join(self.folder, switch_index.INDEX_FILE)
+        self.write("head.json", {"mode": "space switch",
+                                 "target control": "head_ctl"})
+        self.write("arm_L.json", {"mode": "ikfk switch",
+                                  "wrist joint": "wrist_L_jnt"})
+        self.write("notes.json", ["not", "a", "preset"])
+        self.index = switch_index.update_index(self.folder)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def write(self, file_name, data, mtime=MTIME):
+        """Writes a JSON file with the given modification time.
+        """
+        path = os.path.join(self.folder, file_name)
+        with open(path, "w") as out_file:
+            json.dump(data, out_file)
+        os.utime(path, (mtime, mtime))
+
+    def update(self):
+        """Updates the saved index, returns it and the files passed to the
+        callback.
+        """
+        seen = []
+        index = switch_index.update_index(
+            self.folder, callback=lambda file_name, entry: seen.append(
+                file_name
+            )
+        )
+
+        return index, seen
+
+    def test_first_scan(self):
+        """Every preset is parsed and the index is saved.
+        """
+        self.assertEqual(switch_index.load_index(self.folder), self.index)
+        files = self.index["files"]
+        self.assertEqual(sorted(files), ["arm_L.json", "head.json",
+                                         "notes.json"])
+        self.assertEqual(files["head.json"]["mode"], "space switch")
+        self.assertEqual(files["arm_L.json"]["mode"], "ikfk switch")
+        self.assertIsNone(files["notes.json"]["mode"])
+        self.assertIsNone(files["notes.json"]["data"])
+
+    def test_unchanged(self):
+        """Files with the same stamp are not parsed again and the index file
+        is not rewritten.
+        """
+        # same size and time, only a parse would see the new target
+        self.write("head.json", {"mode": "space switch",
+                                 "target control": "neck_ctl"})
+        os.utime(self.index_path, (MTIME, MTIME))
+        with open(self.index_path) as in_file:
+            saved = in_file.read()
+
+        index, seen = self.update()
+        self.assertEqual(seen, ["arm_L.json", "head.json", "notes.json"])
+        self.assertEqual(index["files"]["head.json"]["data"]
+                         ["target control"], "head_ctl")
+        self.assertEqual(os.path.getmtime(self.index_path), MTIME)
+        with open(self.index_path) as in_file:
+            self.assertEqual(in_file.read(), saved)
+
+    def test_modified(self):
+        """Files whose time or size changed are parsed again and saved.
+        """
+        self.write("head.json", {"mode": "space switch",
+                                 "target control": "neck_ctl"},
+                   MTIME + 10.0)
+        self.write("notes.json", {"mode": "ikfk switch",
+                                  "wrist joint": "wrist_R_jnt"})
+
+        index = self.update()[0]
+        self.assertEqual(index["files"]["head.json"]["data"]
+                         ["target control"], "neck_ctl")
+        self.assertEqual(index["files"]["head.json"]["mtime"], MTIME + 10.0)
+        self.assertEqual(index["files"]["notes.json"]["mode"], "ikfk switch")
+        self.assertEqual(switch_index.load_index(self.folder), index)
+
+    def test_deleted(self):
+        """Deleted files leave the index and the saved index.
+        """
+        os.remove(os.path.join(self.folder, "arm_L.json"))
+
+        index, seen = self.update()
+        self.assertEqual(seen, ["head.json", "notes.json"])
+        self.assertNotIn("arm_L.json", index["files"])
+        self.assertNotIn("arm_L.json",
+                         switch_index.load_index(self.folder)["files"])
+
+    def test_broken_index(self):
+        """A broken index file is ignored and rebuilt.
+        """
+        with open(self.index_path, "w") as out_file:
+            out_file.write("{broken")
+
+        self.assertEqual(self.update()[0], self.index)
+        self.assertEqual(switch_index.load_index(self.folder), self.index)
+
+if __name__ == "__main__":
+    unittest.main()
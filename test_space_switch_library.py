@@ -0,0 +1,160 @@
+"""
+MODULE: test_space_switch_library
+
+Tests of space_switch_library, they do not need Maya:
+
+    python -m pytest test_space_switch_library.py
+
+CLASSES:
+    PresetLibraryTest: checks the records and tables of contents of a library.
+"""
+
+__author__ = "Te Ling (Danny) Hsu"
+__copyright__ = "Copyright (c) 2020 Te Ling (Danny) Hsu"
+__license__ = "MIT License"
+__version__ = "1.0.0"
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import space_switch_library as switch_library
+
+
+def _space_preset(control):
+    """Returns a space switch preset of the given control.
+    """
+    return {"mode": "space switch",
+            "target control": control,
+            "source space": ["{}_space.space".format(control), 0],
+            "target space": ["{}_space.space".format(control), 1]}
+
+
+def _ikfk_preset(side):
+    """Returns an ikfk switch preset of the given side.
+    """
+    return {"mode": "ikfk switch",
+            "shoulder joint": "shoulder_{}_jnt".format(side),
+            "elbow joint": "elbow_{}_jnt".format(side),
+            "wrist joint": "wrist_{}_jnt".format(side)}
+
+
+class PresetLibraryTest(unittest.TestCase):
+    """Checks that the presets of a library survive appends, removals,
+    compaction and reopening.
+    """
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.path = os.path.join(self.folder,
+                                 "char{}".format(switch_library.LIBRARY_EXT))
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def build(self):
+        """Adds, replaces and removes presets, returns what is left.
+        """
+        library = switch_library.PresetLibrary(self.path)
+        library.add("head", _space_preset("head_ctl"))
+        library.add_many([("arm_L", _ikfk_preset("L")),
+                          ("arm_R", _ikfk_preset("R"))])
+        library.add("head", _space_preset("neck_ctl")) # replaced
+        library.remove("arm_R")
+
+        return {"head": _space_preset("neck_ctl"),
+                "arm_L": _ikfk_preset("L")}
+
+    def assert_presets(self, library, expected):
+        """Compares the presets, names and modes of a library.
+        """
+        self.assertEqual(library.names(), sorted(expected))
+        self.assertEqual(dict(library.get_all()), expected)
+        for name, data in expected.items():
+            self.assertEqual(library.get(name), data)
+            self.assertEqual(library.get_mode(name), data["mode"])
+
+    def test_add_replace_remove(self):
+        """The library and a reopened one see the latest presets.
+        """
+        expected = self.build()
+        self.assert_presets(switch_library.PresetLibrary(self.path),
+                            expected)
+        self.assertEqual(switch_library.PresetLibrary(self.path).names(
+            "ikfk switch"
+        ), ["arm_L"])
+
+    def test_append_only(self):
+        """Replacing and removing only appends, the dead records stay in the
+        file until it is compacted.
+        """
+        library = switch_library.PresetLibrary(self.path)
+        library.add("head", _space_preset("head_ctl"))
+        with open(self.path, "rb") as in_file:
+            before = in_file.read()
+
+        library.add("head", _space_preset("neck_ctl"))
+        library.remove("head")
+        with open(self.path, "rb") as in_file:
+            after = in_file.read()
+        self.assertEqual(after[switch_library.HEADER_SIZE:len(before)],
+                         before[switch_library.HEADER_SIZE:])
+        self.assertFalse("head" in switch_library.PresetLibrary(self.path))
+
+    def test_compact(self):
+        """Compacting shrinks the file and keeps the same presets, before
+        and after reopening.
+        """
+        expected = self.build()
+        size = os.path.getsize(self.path)
+        library = switch_library.PresetLibrary(self.path)
+        library.compact()
+
+        self.assertLess(os.path.getsize(self.path), size)
+        self.assertFalse(os.path.exists("{}.tmp".format(self.path)))
+        self.assert_presets(library, expected)
+        self.assert_presets(switch_library.PresetLibrary(self.path),
+                            expected)
+
+    def test_compact_empty(self):
+        """A library whose presets were all removed compacts to an empty
+        one.
+        """
+        library = switch_library.PresetLibrary(self.path)
+        library.add("head", _space_preset("head_ctl"))
+        library.remove("head")
+        library.compact()
+        self.assertEqual(len(switch_library.PresetLibrary(self.path)), 0)
+
+    def test_not_a_preset(self):
+        """Data without a switch mode is refused and nothing is written.
+        """
+        library = switch_library.PresetLibrary(self.path)
+        with self.assertRaises(ValueError):
+            library.add("head", {"target control": "head_ctl"})
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_bad_magic(self):
+        """A file that does not start with the magic is not a library.
+        """
+        self.build()
+        with open(self.path, "r+b") as out_file:
+            out_file.write(b"NOTALIB1")
+        with self.assertRaises(ValueError):
+            switch_library.PresetLibrary(self.path)
+
+    def test_truncated(self):
+        """Files cut in the header or in the table of contents are refused.
+        """
+        self.build()
+        with open(self.path, "rb") as in_file:
+            content = in_file.read()
+
+        for size in (0, switch_library.HEADER_SIZE - 1, len(content) - 2):
+            with open(self.path, "wb") as out_file:
+                out_file.write(content[:size])
+            with self.assertRaises(ValueError, msg=str(size)):
+                switch_library.PresetLibrary(self.path)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,178 @@
+"""
+MODULE: test_space_switch_math
+
+Tests of space_switch_math, they do not need Maya:
+
+    python -m pytest test_space_switch_math.py
+
+CLASSES:
+    EulerTest: checks the euler conversions against each other.
+    SolveLocalTest: checks the offline local transform solver.
+"""
+
+__author__ = "Te Ling (Danny) Hsu"
+__copyright__ = "Copyright (c) 2020 Te Ling (Danny) Hsu"
+__license__ = "MIT License"
+__version__ = "1.0.0"
+
+import random
+import unittest
+
+import space_switch_math as switch_math
+
+IDENTITY = switch_math.euler_to_matrix([0.0, 0.0, 0.0])
+
+
+def _pure_python(function, *args, **kwargs):
+    """Runs a function of space_switch_math without NumPy.
+    """
+    np = switch_math.np
+    switch_math.np = None
+    try:
+        return function(*args, **kwargs)
+    finally:
+        switch_math.np = np
+
+
+class EulerTest(unittest.TestCase):
+    """Checks the euler conversions against each other.
+    """
+    def assert_same_matrix(self, matrix, other):
+        """Compares two matrices value by value.
+        """
+        for value, other_value in zip(matrix, other):
+            self.assertAlmostEqual(value, other_value)
+
+    def test_round_trip(self):
+        """A matrix built from angles gives back angles of the same matrix,
+        and the same angles when the middle axis is within 90 degrees.
+        """
+        rotation = [30.0, -45.0, 60.0]
+        for rotate_order in range(len(switch_math.ROTATE_ORDERS)):
+            matrix = switch_math.euler_to_matrix(rotation, rotate_order)
+            angles = switch_math.matrix_to_euler(matrix, rotate_order)
+            for angle, expected in zip(angles, rotation):
+                self.assertAlmostEqual(angle, expected)
+
+            rotation_far = [150.0, 120.0, -100.0]
+            matrix = switch_math.euler_to_matrix(rotation_far, rotate_order)
+            self.assert_same_matrix(switch_math.euler_to_matrix(
+                switch_math.matrix_to_euler(matrix, rotate_order),
+                rotate_order
+            ), matrix)
+
+    def test_scaled_matrix(self):
+        """The scale of a matrix is ignored.
+        """
+        matrix = switch_math.euler_to_matrix([10.0, 20.0, 30.0])
+        for row, scale in enumerate((2.0, 0.5, 3.0)):
+            matrix[row * 4:row * 4 + 3] = [value * scale for value
+                                           in matrix[row * 4:row * 4 + 3]]
+        for angle, expected in zip(switch_math.matrix_to_euler(matrix),
+                                   (10.0, 20.0, 30.0)):
+            self.assertAlmostEqual(angle, expected)
+
+
+class SolveLocalTest(unittest.TestCase):
+    """Checks the offline local transform solver, with and without NumPy.
+    """
+    def solve(self, *args, **kwargs):
+        """Solves with NumPy when it is there, checks that pure python gives
+        the same result and returns it.
+        """
+        result = switch_math.solve_local_transforms(*args, **kwargs)
+        expected = _pure_python(switch_math.solve_local_transforms, *args,
+                                **kwargs)
+        self.assertEqual(len(result), len(expected))
+        for (translate, rotate), (other_translate, other_rotate) in zip(
+                result, expected):
+            for value, other in zip(list(translate) + list(rotate),
+                                    list(other_translate)
+                                    + list(other_rotate)):
+                self.assertAlmostEqual(value, other)
+
+        return result
+
+    def test_parent(self):
+        """The parent inverse matrix is taken out of the world matrix.
+        """
+        parent = switch_math.transform_to_matrix([1.0, 2.0, 3.0],
+                                                 [0.0, 90.0, 0.0])
+        local = switch_math.transform_to_matrix([4.0, 0.0, 0.0],
+                                                [15.0, 25.0, 35.0])
+        world = switch_math.multiply_matrices(local, parent)
+        translate, rotate = self.solve(
+            [world], [switch_math.invert_matrix(parent)]
+        )[0]
+        for value, expected in zip(list(translate) + list(rotate),
+                                   (4.0, 0.0, 0.0, 15.0, 25.0, 35.0)):
+            self.assertAlmostEqual(value, expected)
+
+    def test_rotate_axis_joint_orient(self):
+        """Rotate axis and joint orient are taken out of the rotation, the
+        way a joint builds its matrix from them.
+        """
+        rotate_axis = [5.0, -10.0, 20.0]
+        joint_orient = [0.0, 30.0, -15.0]
+        rotation = [40.0, 10.0, -25.0]
+        for rotate_order in range(len(switch_math.ROTATE_ORDERS)):
+            world = switch_math.multiply_matrices(
+                switch_math.multiply_matrices(
+                    switch_math.euler_to_matrix(rotate_axis),
+                    switch_math.euler_to_matrix(rotation, rotate_order)
+                ),
+                switch_math.euler_to_matrix(joint_orient)
+            )
+            rotate = self.solve([world], [IDENTITY], rotate_order,
+                                rotate_axis, joint_orient)[0][1]
+            for value, expected in zip(rotate, rotation):
+                self.assertAlmostEqual(value, expected)
+
+    def test_whole_turns(self):
+        """Rotations stay within 180 degrees of the reference.
+        """
+        rotate = self.solve([switch_math.euler_to_matrix([0.0, 0.0, 10.0])],
+                            [IDENTITY], reference=[0.0, 0.0, 350.0])[0][1]
+        self.assertAlmostEqual(rotate[2], 370.0)
+
+    def test_middle_axis_past_90(self):
+        """The middle axis goes past 90 degrees without the other axes
+        flipping by 180.
+        """
+        angles = (80.0, 85.0, 90.5, 95.0, 100.0)
+        for rotate_order in range(len(switch_math.ROTATE_ORDERS)):
+            second = "xyz".index(
+                switch_math.ROTATE_ORDERS[rotate_order][1]
+            )
+            rotations = []
+            for angle in angles:
+                rotation = [10.0, 20.0, 30.0]
+                rotation[second] = angle
+                rotations.append(rotation)
+            result = self.solve(
+                [switch_math.euler_to_matrix(rotation, rotate_order)
+                 for rotation in rotations],
+                [IDENTITY] * len(rotations), rotate_order,
+                reference=rotations[0]
+            )
+            for (translate, rotate), rotation in zip(result, rotations):
+                for value, expected in zip(rotate, rotation):
+                    self.assertAlmostEqual(value, expected)
+
+    def test_reference_kept(self):
+        """Random rotations come back as themselves when they are their own
+        reference.
+        """
+        generator = random.Random(7)
+        for _ in range(100):
+            rotate_order = generator.randrange(len(switch_math.ROTATE_ORDERS))
+            rotation = [generator.uniform(-180.0, 180.0) for _ in range(3)]
+            rotate = self.solve(
+                [switch_math.euler_to_matrix(rotation, rotate_order)],
+                [IDENTITY], rotate_order, reference=rotation
+            )[0][1]
+            for value, expected in zip(rotate, rotation):
+                self.assertAlmostEqual(value, expected)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,156 @@
+"""
+MODULE: test_space_switch_plan
+
+Tests of space_switch_plan, they do not need Maya:
+
+    python -m pytest test_space_switch_plan.py
+
+CLASSES:
+    PlanSwitchTest: checks the plans compiled for each bake mode.
+"""
+
+__author__ = "Te Ling (Danny) Hsu"
+__copyright__ = "Copyright (c) 2020 Te Ling (Danny) Hsu"
+__license__ = "MIT License"
+__version__ = "1.0.0"
+
+import unittest
+
+import space_switch_plan as switch_plan
+
+HOLD = switch_plan.HOLD
+SWITCH = switch_plan.SWITCH
+REVERSE = switch_plan.REVERSE
+
+# (description, plan_switch keyword arguments, (action, frame) operations)
+PLAN_CASES = (
+    ("current frame", {
+        "bake_mode": switch_plan.CURRENT_FRAME, "current_frame": 12
+    }, [(HOLD, 11), (SWITCH, 12)]),
+    ("current frame ignores keys", {
+        "bake_mode": switch_plan.CURRENT_FRAME, "current_frame": 5,
+        "keyframes": [1, 20], "time_range": (10, 15)
+    }, [(HOLD, 4), (SWITCH, 5)]),
+
+    ("keyframes, every key", {
+        "bake_mode": switch_plan.BAKE_KEYFRAMES, "keyframes": [1, 10, 20]
+    }, [(SWITCH, 1), (SWITCH, 10), (SWITCH, 20)]),
+    ("keyframes, duplicate and unsorted keys", {
+        "bake_mode": switch_plan.BAKE_KEYFRAMES, "keyframes": [20, 1, 10, 1]
+    }, [(SWITCH, 1), (SWITCH, 10), (SWITCH, 20)]),
+    ("keyframes, range inside the keys", {
+        "bake_mode": switch_plan.BAKE_KEYFRAMES,
+        "keyframes": [1, 10, 20, 30], "time_range": (5, 25)
+    }, [(HOLD, 9), (SWITCH, 10), (SWITCH, 19), (REVERSE, 20)]),
+    ("keyframes, range over the last keys", {
+        "bake_mode": switch_plan.BAKE_KEYFRAMES,
+        "keyframes": [1, 10, 20], "time_range": (5, 40)
+    }, [(HOLD, 9), (SWITCH, 10), (SWITCH, 20)]),
+    ("keyframes, range over the first keys", {
+        "bake_mode": switch_plan.BAKE_KEYFRAMES,
+        "keyframes": [1, 10, 20], "time_range": (-5, 15)
+    }, [(SWITCH, 1), (SWITCH, 9), (REVERSE, 10)]),
+    ("keyframes, single key in range", {
+        "bake_mode": switch_plan.BAKE_KEYFRAMES,
+        "keyframes": [1, 10, 20], "time_range": (5, 15)
+    }, [(HOLD, 9), (SWITCH, 10)]),
+    ("keyframes, single key", {
+        "bake_mode": switch_plan.BAKE_KEYFRAMES, "keyframes": [7]
+    }, [(SWITCH, 7)]),
+
+    ("every frame, no keys", {
+        "bake_mode": switch_plan.BAKE_EVERY_FRAME, "time_range": (1, 3)
+    }, [(SWITCH, 1), (SWITCH, 2), (SWITCH, 3)]),
+    ("every frame, keys inside the range", {
+        "bake_mode": switch_plan.BAKE_EVERY_FRAME, "keyframes": [1, 3],
+        "time_range": (1, 3)
+    }, [(SWITCH, 1), (SWITCH, 2), (SWITCH, 3)]),
+    ("every frame, keys around the range", {
+        "bake_mode": switch_plan.BAKE_EVERY_FRAME, "keyframes": [0, 10],
+        "time_range": (2, 4)
+    }, [(HOLD, 1), (SWITCH, 2), (SWITCH, 3), (REVERSE, 4)]),
+    ("every frame, float range", {
+        "bake_mode": switch_plan.BAKE_EVERY_FRAME, "time_range": (1.0, 2.0)
+    }, [(SWITCH, 1), (SWITCH, 2)]),
+)
+
+# (description, plan_switch keyword arguments) that cannot be planned
+INVALID_CASES = (
+    ("unknown bake mode", {"bake_mode": "bake sometimes"}),
+    ("current frame missing", {"bake_mode": switch_plan.CURRENT_FRAME}),
+    ("no keys", {"bake_mode": switch_plan.BAKE_KEYFRAMES}),
+    ("no keys in range", {
+        "bake_mode": switch_plan.BAKE_KEYFRAMES, "keyframes": [1, 10],
+        "time_range": (2, 9)
+    }),
+    ("range missing", {
+        "bake_mode": switch_plan.BAKE_EVERY_FRAME, "keyframes": [1, 10]
+    }),
+    ("unknown ikfk direction", {
+        "mode": "ikfk switch", "bake_mode": switch_plan.CURRENT_FRAME,
+        "current_frame": 1, "direction": "up"
+    }),
+)
+
+
+class PlanSwitchTest(unittest.TestCase):
+    """Checks the operations and sample times of plan_switch.
+    """
+    def plan(self, kwargs):
+        """Plans a space switch, unless the arguments give another mode.
+        """
+        kwargs = dict(kwargs)
+        return switch_plan.plan_switch(kwargs.pop("mode", "space switch"),
+                                       **kwargs)
+
+    def test_operations(self):
+        """Each bake mode holds, switches and reverses on the frames of its
+        case.
+        """
+        for description, kwargs, expected in PLAN_CASES:
+            plan = self.plan(kwargs)
+            self.assertEqual([(operation["action"], operation["frame"])
+                              for operation in plan["operations"]],
+                             expected, description)
+
+    def test_sample_times(self):
+        """Switches sample the frame they key, holds sample nothing.
+        """
+        for description, kwargs, expected in PLAN_CASES:
+            plan = self.plan(kwargs)
+            for operation in plan["operations"]:
+                if operation["action"] == HOLD:
+                    self.assertNotIn("sample", operation, description)
+                else:
+                    self.assertEqual(operation["sample"], operation["frame"],
+                                     description)
+            self.assertEqual(plan["sample times"], sorted(set(
+                frame for action, frame in expected if action != HOLD
+            )), description)
+
+    def test_invalid(self):
+        """Missing options and empty ranges raise a ValueError.
+        """
+        for description, kwargs in INVALID_CASES:
+            with self.assertRaises(ValueError, msg=description):
+                self.plan(kwargs)
+
+    def test_ikfk_direction(self):
+        """IK/FK plans keep their direction, space switch plans have none.
+        """
+        kwargs = {"bake_mode": switch_plan.CURRENT_FRAME, "current_frame": 1}
+        self.assertEqual(switch_plan.plan_switch(
+            "ikfk switch", direction="fkik", **kwargs
+        )["direction"], "fkik")
+        self.assertIsNone(self.plan(kwargs)["direction"])
+
+    def test_estimate_cost(self):
+        """The reverse at the end of a chunk counts as a switch.
+        """
+        plan = self.plan(PLAN_CASES[4][1])
+        self.assertEqual(switch_plan.estimate_cost(plan),
+                         {"samples": 3, "switches": 3, "holds": 1,
+                          "keyed frames": 4})
+
+if __name__ == "__main__":
+    unittest.main()